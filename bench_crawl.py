@@ -0,0 +1,212 @@
+"""端到端爬取基準測試（本地替身網站，不連線 kkday.com）
+
+啟動 fixture_site 替身網站，以 KKdayFlightScraper（single）或 KKdayMultiScraper（multi）
+實際開瀏覽器爬取合成商品，輸出每分鐘商品數、每個選項/月份秒數、解析時間與瀏覽器啟動時間。
+
+用法: python bench_crawl.py [--mode single|multi] [--products 4] [--options 2] [--months 3]
+                            [--latency-ms 50] [--flake-rate 0.2] [--json] [--output bench.json]
+                            [--baseline bench.json --tolerance 0.25]
+
+指定 --baseline 時與先前的結果比較，每分鐘商品數或每月秒數退步超過 tolerance 會以代碼 1 結束。
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from calendar_parser import get_backend
+from crawl_profiles import default_config_path, get_profile
+from fixture_site import FixtureConfig, start_fixture_server
+from main import KKdayFlightScraper, KKdayMultiScraper, product_id_from_url
+from metrics import Metrics
+
+# 與基準比較的指標，True 表示數值越大越好
+TRACKED_METRICS = {'products_per_min': True, 's_per_month': False}
+
+
+class TimedParser:
+    """包裝日曆解析後端，累計呼叫次數與耗時（可跨執行緒共用）"""
+
+    def __init__(self, backend='auto'):
+        self.backend = get_backend(backend)
+        self.calls = 0
+        self.total_ms = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, html):
+        start = time.perf_counter()
+        try:
+            return self.backend(html)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self.calls += 1
+                self.total_ms += elapsed
+
+
+def product_urls(base_url, products, layout):
+    """產生替身商品 URL；mixed 交錯有選擇按鈕與直接顯示日曆兩種頁面"""
+    urls = []
+    for i in range(products):
+        url = f"{base_url}/zh-tw/product/{900000 + i}"
+        if layout == 'direct' or (layout == 'mixed' and i % 2):
+            url += "?options=0"
+        urls.append(url)
+    return urls
+
+
+def measure_startup(headless):
+    """量測一次瀏覽器啟動（含反偵測設定）的秒數"""
+    start = time.perf_counter()
+    driver = KKdayFlightScraper.launch_driver(headless=headless)
+    elapsed = time.perf_counter() - start
+    driver.quit()
+    return elapsed
+
+
+def run_single(urls, profile, parser, metrics):
+    """以單一瀏覽器依序爬取，回傳 (選項數, 月份數, 資料列數)"""
+    driver = KKdayFlightScraper.launch_driver(headless=profile.headless)
+    options = months_crawled = rows = 0
+    # 與 multi 模式相同，所有 URL 共用一份依設定檔逾時上限的 AdaptiveTimeouts
+    kwargs = profile.scraper_kwargs()
+    try:
+        for url in urls:
+            scraper = KKdayFlightScraper(url, driver=driver, parser_backend=parser,
+                                         selector_cache=None, metrics=metrics, **kwargs)
+            scraper.run()
+            options += len({record.option_id for record in scraper.records})
+            months_crawled += len({(record.option_id, record.date.year, record.date.month)
+                                   for record in scraper.records})
+            rows += len(scraper.records)
+    finally:
+        driver.quit()
+    return options, months_crawled, rows
+
+
+def run_multi(urls, profile, parser, metrics):
+    """以 KKdayMultiScraper 並行爬取，從串流輸出的 JSONL 統計選項與月份"""
+    scraper = KKdayMultiScraper(urls, parser_backend=parser, **profile.multi_kwargs())
+    scraper.metrics = metrics
+    scraper.run()
+    options = months_crawled = rows = 0
+    for product_id in {product_id_from_url(url) for url in urls}:
+        try:
+            product_rows = list(scraper.output_stream.read_rows(product_id))
+        except FileNotFoundError:
+            continue
+        options += len({row['title'] for row in product_rows})
+        months_crawled += len({(row['title'], str(row['date'])[:7]) for row in product_rows})
+        rows += len(product_rows)
+    return options, months_crawled, rows
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """回傳退步超過 tolerance 的指標說明"""
+    regressions = []
+    for metric, higher_is_better in TRACKED_METRICS.items():
+        old, new = baseline.get(metric), results.get(metric)
+        if not old or new is None:
+            continue
+        change = (old - new) / old if higher_is_better else (new - old) / old
+        if change > tolerance:
+            regressions.append(f"{metric}: {old:.3f} -> {new:.3f} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端爬取基準測試（本地替身網站）")
+    parser.add_argument('--mode', choices=['single', 'multi'], default='single')
+    parser.add_argument('--products', type=int, default=4)
+    parser.add_argument('--options', type=int, default=2, help="有選擇按鈕的頁面的選項數")
+    parser.add_argument('--months', type=int, default=3, help="每個選項的月份數")
+    parser.add_argument('--layout', choices=['mixed', 'select', 'direct'], default='mixed')
+    parser.add_argument('--workers', type=int, help="multi 模式的並行數（預設依設定檔）")
+    parser.add_argument('--profile', default='fixture/fast', help="爬蟲設定檔，預設關閉所有人為延遲")
+    parser.add_argument('--config', default=default_config_path(), help="設定檔（.toml 或 .json）")
+    parser.add_argument('--latency-ms', type=int, default=50, help="日曆 API 的回應延遲")
+    parser.add_argument('--jitter-ms', type=int, default=20)
+    parser.add_argument('--modal-delay-ms', type=int, default=100)
+    parser.add_argument('--flake-rate', type=float, default=0.2, help="不穩定彈窗的比例")
+    parser.add_argument('--headed', action='store_true', help="顯示瀏覽器視窗（預設無頭）")
+    parser.add_argument('--json', action='store_true', help="輸出 JSON 結果")
+    parser.add_argument('--output', help="將 JSON 結果寫入檔案")
+    parser.add_argument('--baseline', help="先前的 JSON 結果，用於偵測效能退步")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    headless = not args.headed
+    # 替身網站在最後一個月停用下個月按鈕，月份數由替身網站設定決定
+    profile = get_profile(args.profile, args.config, workers=args.workers, headless=headless,
+                          window=f"{args.months}m", output_formats=['jsonl'])
+    config = FixtureConfig(max_months=args.months, options=args.options,
+                           page_latency_ms=args.latency_ms, api_latency_ms=args.latency_ms,
+                           latency_jitter_ms=args.jitter_ms, modal_delay_ms=args.modal_delay_ms,
+                           modal_flake_rate=args.flake_rate)
+    server, base_url = start_fixture_server(config)
+    urls = product_urls(base_url, args.products, args.layout)
+    timed_parser = TimedParser()
+    metrics = Metrics()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        # Excel/JSONL/日誌等輸出寫在暫存目錄，不污染工作目錄
+        os.chdir(workdir)
+        try:
+            startup_s = measure_startup(profile.headless)
+            start = time.perf_counter()
+            if args.mode == 'single':
+                options, months, rows = run_single(urls, profile, timed_parser, metrics)
+            else:
+                options, months, rows = run_multi(urls, profile, timed_parser, metrics)
+            elapsed = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+            server.shutdown()
+            server.server_close()
+
+    results = {
+        'mode': args.mode,
+        'products': len(urls),
+        'options_crawled': options,
+        'months_crawled': months,
+        'rows': rows,
+        'elapsed_s': elapsed,
+        'products_per_min': len(urls) / elapsed * 60 if elapsed else None,
+        's_per_option': elapsed / options if options else None,
+        's_per_month': elapsed / months if months else None,
+        'parse_calls': timed_parser.calls,
+        'parse_ms_total': timed_parser.total_ms,
+        'parse_ms_per_month': timed_parser.total_ms / timed_parser.calls if timed_parser.calls else None,
+        'browser_startup_s': startup_s,
+        # 各階段（開頁、選項、月份、彈窗、存檔…）的耗時與逾時/重試計數
+        'phases': metrics.snapshot()['phases'],
+        'counters': metrics.snapshot()['counters'],
+        'config': vars(args),
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print(f"{results['products']} 個商品 / {options} 個選項 / {months} 個月份，共 {elapsed:.1f} 秒")
+        for name in ('products_per_min', 's_per_option', 's_per_month', 'parse_ms_per_month', 'browser_startup_s'):
+            value = results[name]
+            print(f"{name:20s} {value:10.3f}" if value is not None else f"{name:20s} {'-':>10s}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_with_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print("效能退步: " + "; ".join(regressions), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""日曆解析微基準測試
+
+比較舊做法（整頁 page_source + html.parser，每格 select_one 兩次）
+與新做法（只解析 table.date-table 子樹，使用可用的最快後端）的每月解析時間。
+
+用法: python bench_parse.py [--repeat 20] [--filler 4000] [--json]
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from calendar_parser import NO_PRICE, available_backends, get_backend, parse_calendar
+
+
+def build_calendar_table(days=31, seed=0):
+    """產生一個月份的合成日曆表格"""
+    rng = random.Random(seed)
+    cells = []
+    for day in range(1, days + 1):
+        if rng.random() > 0.3:
+            price = f"<div class=\"price\">TWD {rng.randint(1000, 30000):,}</div>" if rng.random() > 0.1 else ""
+            cells.append(f"<td class=\"cell-date selectable\"><div class=\"date-num\">{day}</div>{price}</td>")
+        else:
+            cells.append(f"<td class=\"cell-date disabled\"><div class=\"date-num\">{day}</div></td>")
+    rows = ["<tr>" + "".join(cells[i:i + 7]) + "</tr>" for i in range(0, len(cells), 7)]
+    return "<table class=\"date-table\"><tbody>" + "".join(rows) + "</tbody></table>"
+
+
+def build_product_page(table_html, filler=4000):
+    """產生一個模擬 KKday 商品頁的完整 HTML（大量非日曆內容）"""
+    cards = "".join(
+        f"<div class=\"kk-card\"><img src=\"/img/{i}.jpg\"><span class=\"kk-u-text-h6\">推薦商品 {i}</span>"
+        f"<p>描述文字 {'lorem ipsum ' * 5}</p></div>"
+        for i in range(filler)
+    )
+    script = "<script>window.__STATE__ = " + json.dumps({"items": list(range(filler))}) + ";</script>"
+    return (
+        "<html><head><title>KKday</title>" + script + "</head><body>"
+        + cards
+        + "<div class=\"option-booking\"><div class=\"current-month\">2026年12月</div>"
+        + table_html + "</div>"
+        + cards
+        + "</body></html>"
+    )
+
+
+def parse_full_page_legacy(page_html):
+    """舊做法：整頁 html.parser，每格重複 select_one('div.price')"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page_html, 'html.parser')
+    current_month_elem = soup.select_one("div.current-month")
+    current_month = current_month_elem.text.strip() if current_month_elem else "未知月份"
+    return [
+        {
+            'date': f"{current_month} {cell.select_one('div.date-num').text.strip()}日",
+            'price': cell.select_one('div.price').text.strip() if cell.select_one('div.price') else NO_PRICE
+        }
+        for cell in soup.select("td.cell-date.selectable")
+    ]
+
+
+def time_call(func, repeat):
+    """回傳每次呼叫的耗時（毫秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日曆解析微基準測試")
+    parser.add_argument('--repeat', type=int, default=20, help="每種做法重複次數")
+    parser.add_argument('--filler', type=int, default=4000, help="頁面中非日曆元素的數量")
+    parser.add_argument('--json', action='store_true', help="輸出 JSON 結果")
+    args = parser.parse_args()
+
+    table_html = build_calendar_table()
+    page_html = build_product_page(table_html, args.filler)
+    backends = available_backends()
+
+    results = {
+        'page_bytes': len(page_html),
+        'table_bytes': len(table_html),
+        'ms_per_month': {},
+    }
+    if 'bs4' in backends:
+        expected = parse_full_page_legacy(page_html)
+        samples = time_call(lambda: parse_full_page_legacy(page_html), args.repeat)
+        results['ms_per_month']['legacy_full_page_bs4'] = statistics.median(samples)
+    else:
+        expected = None
+
+    for name in backends:
+        # 以原始 (日期數字, 價格文字) 比對，確認與舊做法擷取到相同的格子
+        cells = [(f"2026年12月 {num}日", price) for num, price in get_backend(name)(table_html)]
+        if expected is not None and cells != [(r['date'], r['price']) for r in expected]:
+            raise SystemExit(f"{name} 的解析結果與舊做法不一致")
+        samples = time_call(lambda: parse_calendar(table_html, "2026年12月", name), args.repeat)
+        results['ms_per_month'][f'table_subtree_{name}'] = statistics.median(samples)
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    print(f"頁面大小: {results['page_bytes']:,} bytes，日曆子樹: {results['table_bytes']:,} bytes")
+    for name, ms in results['ms_per_month'].items():
+        print(f"{name:32s} {ms:10.3f} ms/月")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""啟動時間基準測試：冷啟動與熱啟動
+
+量測項目:
+- 載入 main 模組的時間（另量測 pandas 的載入時間，現已延後到輸出 Excel 時才載入）
+- 原本的啟動方式（每次由 undetected_chromedriver 下載修補 chromedriver、建構 UserAgent）
+- 快速啟動的冷啟動（空快取：修補 chromedriver、建立設定檔範本與 User-Agent 清單）
+- 快速啟動的熱啟動（使用快取）
+
+用法: python bench_startup.py [--repeat 3] [--headed] [--json]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+IMPORT_PROBE = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+
+
+def import_seconds(module):
+    """在新的直譯器中量測載入模組的秒數"""
+    output = subprocess.run([sys.executable, '-c', IMPORT_PROBE.format(module=module)],
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def launch_seconds(**kwargs):
+    """量測一次瀏覽器啟動到可用的秒數"""
+    from main import KKdayFlightScraper
+
+    start = time.perf_counter()
+    driver = KKdayFlightScraper.launch_driver(**kwargs)
+    elapsed = time.perf_counter() - start
+    driver.quit()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="啟動時間基準測試")
+    parser.add_argument('--repeat', type=int, default=3, help="熱啟動與原本啟動方式的重複次數")
+    parser.add_argument('--headed', action='store_true', help="顯示瀏覽器視窗（預設無頭）")
+    parser.add_argument('--json', action='store_true', help="輸出 JSON 結果")
+    args = parser.parse_args()
+
+    headless = not args.headed
+    results = {
+        'import_main_s': import_seconds('main'),
+        'import_pandas_s': import_seconds('pandas'),
+    }
+    results['legacy_launch_s'] = statistics.median(
+        launch_seconds(headless=headless) for _ in range(args.repeat))
+    # 使用暫存的快取目錄，確保第一次是冷啟動且不影響平常使用的快取
+    with tempfile.TemporaryDirectory() as cache_dir:
+        results['fast_cold_launch_s'] = launch_seconds(headless=headless, fast_start=True, cache_dir=cache_dir)
+        results['fast_warm_launch_s'] = statistics.median(
+            launch_seconds(headless=headless, fast_start=True, cache_dir=cache_dir) for _ in range(args.repeat))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, seconds in results.items():
+        print(f"{name:22s} {seconds:8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
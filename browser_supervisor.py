@@ -0,0 +1,339 @@
+"""瀏覽器生命週期管理
+
+長時間使用的 Chrome 記憶體會持續成長，偶爾也會卡住。BrowserSupervisor 追蹤每個 driver
+服務的頁數、Chrome 行程樹的 RSS 與回應延遲，超過門檻或被看門狗判定卡住時回收該瀏覽器，
+並清除殘留的 chrome / chromedriver 行程。有 psutil 時使用 psutil，否則在 Linux 上讀取 /proc。
+"""
+import logging
+import os
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _proc_children_map():
+    """從 /proc 建立 父行程 -> 子行程 對照"""
+    children = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                # 第二欄行程名稱可能含空白，以最後一個 ')' 之後的欄位為準
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(name))
+    return children
+
+
+def process_tree(root_pids):
+    """回傳 root_pids 及其所有子孫行程的 pid"""
+    root_pids = [pid for pid in root_pids if pid]
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        pids = set()
+        for pid in root_pids:
+            try:
+                process = psutil.Process(pid)
+                pids.add(pid)
+                pids.update(child.pid for child in process.children(recursive=True))
+            except psutil.Error:
+                continue
+        return pids
+    if not os.path.isdir('/proc'):
+        return set()
+    children = _proc_children_map()
+    pids, stack = set(), list(root_pids)
+    while stack:
+        pid = stack.pop()
+        if pid in pids or not os.path.exists(f'/proc/{pid}'):
+            continue
+        pids.add(pid)
+        stack.extend(children.get(pid, []))
+    return pids
+
+
+def rss_bytes(pids):
+    """行程常駐記憶體總和；無法取得時回傳 None"""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    total = 0
+    found = False
+    for pid in pids:
+        try:
+            if psutil is not None:
+                total += psutil.Process(pid).memory_info().rss
+            else:
+                with open(f'/proc/{pid}/statm') as f:
+                    total += int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+            found = True
+        except Exception:
+            continue
+    return total if found else None
+
+
+def process_name(pid):
+    """行程名稱；行程不存在時回傳 None"""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    try:
+        if psutil is not None:
+            return psutil.Process(pid).name()
+        with open(f'/proc/{pid}/comm') as f:
+            return f.read().strip()
+    except Exception:
+        return None
+
+
+def kill_pids(pids):
+    """強制結束仍存在的 chrome / chromedriver 行程，回傳實際結束的數量
+
+    只結束名稱含 chrom 的行程，避免 pid 被重複使用時誤殺其他程式。
+    """
+    killed = 0
+    for pid in pids:
+        name = process_name(pid)
+        if pid == os.getpid() or name is None or 'chrom' not in name.lower():
+            continue
+        try:
+            os.kill(pid, getattr(signal, 'SIGKILL', signal.SIGTERM))
+            killed += 1
+        except (OSError, ProcessLookupError):
+            continue
+    return killed
+
+
+def driver_root_pids(driver):
+    """chromedriver 行程與 undetected_chromedriver 另外啟動的 Chrome 主行程"""
+    pids = []
+    service = getattr(driver, 'service', None)
+    process = getattr(service, 'process', None)
+    if process is not None:
+        pids.append(process.pid)
+    browser_pid = getattr(driver, 'browser_pid', None)
+    if browser_pid:
+        pids.append(browser_pid)
+    return pids
+
+
+def call_with_timeout(func, timeout):
+    """在背景執行緒呼叫 func，逾時回傳 (False, None)；呼叫卡住的 WebDriver 時避免連帶卡住"""
+    result = {}
+
+    def target():
+        try:
+            result['value'] = func()
+        except Exception as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        return False, None
+    if 'error' in result:
+        raise result['error']
+    return True, result.get('value')
+
+
+class DriverStats:
+    """單一瀏覽器的使用統計"""
+
+    def __init__(self, driver_id, root_pids):
+        self.driver_id = driver_id
+        self.root_pids = root_pids
+        self.known_pids = set(root_pids)
+        self.launched_at = time.monotonic()
+        self.pages_served = 0
+        self.rss_bytes = None
+        self.latency_ms = None
+        self.busy_since = None
+        # 爬蟲最後一次回報進度（每個選項/月份）的時間，看門狗以此判斷是否卡住
+        self.last_heartbeat = None
+
+    def as_dict(self):
+        return {
+            'driver_id': self.driver_id,
+            'pages_served': self.pages_served,
+            'age_s': round(time.monotonic() - self.launched_at, 1),
+            'rss_mb': round(self.rss_bytes / 2 ** 20, 1) if self.rss_bytes is not None else None,
+            'latency_ms': round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            'processes': len(self.known_pids),
+            'busy': self.busy_since is not None,
+        }
+
+
+class BrowserSupervisor:
+    """追蹤瀏覽器健康狀態，決定何時回收；看門狗會強制結束卡住的瀏覽器"""
+
+    def __init__(self, max_pages=50, max_rss_mb=1500, max_latency_s=10, probe_timeout=15,
+                 hang_timeout=900, watchdog_interval=30, metrics=None):
+        # 服務 max_pages 個頁面後回收，避免長時間累積的記憶體與狀態
+        self.max_pages = max_pages
+        self.max_rss_bytes = max_rss_mb * 2 ** 20 if max_rss_mb else None
+        self.max_latency_ms = max_latency_s * 1000 if max_latency_s else None
+        # 健康檢查的 execute_script 超過 probe_timeout 秒視為卡住
+        self.probe_timeout = probe_timeout
+        # 佔用中的瀏覽器超過 hang_timeout 秒沒有進度回報（heartbeat）時，看門狗會強制結束它
+        self.hang_timeout = hang_timeout
+        self.watchdog_interval = watchdog_interval
+        self.metrics = metrics
+        self._stats = {}  # id(driver) -> DriverStats
+        self._drivers = {}  # id(driver) -> driver
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._stop = threading.Event()
+        self._watchdog = None
+        self.recycles = {}
+
+    def register(self, driver):
+        """登記新啟動的瀏覽器"""
+        root_pids = driver_root_pids(driver)
+        with self._lock:
+            self._next_id += 1
+            stats = DriverStats(self._next_id, root_pids)
+            self._stats[id(driver)] = stats
+            self._drivers[id(driver)] = driver
+        stats.known_pids.update(process_tree(root_pids))
+        return stats
+
+    def stats_for(self, driver):
+        with self._lock:
+            return self._stats.get(id(driver))
+
+    def mark_busy(self, driver):
+        stats = self.stats_for(driver)
+        if stats is not None:
+            stats.busy_since = stats.last_heartbeat = time.monotonic()
+
+    def heartbeat(self, driver):
+        """爬蟲仍在進行（每個選項/月份呼叫一次）；商品選項很多時整個 URL 可能遠超過 hang_timeout"""
+        stats = self.stats_for(driver)
+        if stats is not None and stats.busy_since is not None:
+            stats.last_heartbeat = time.monotonic()
+
+    def record_page(self, driver):
+        """一個 URL 處理完畢"""
+        stats = self.stats_for(driver)
+        if stats is not None:
+            stats.pages_served += 1
+            stats.busy_since = stats.last_heartbeat = None
+
+    def probe(self, driver):
+        """量測回應延遲與行程樹記憶體，回傳 False 表示瀏覽器已卡住"""
+        stats = self.stats_for(driver)
+        if stats is None:
+            return True
+        start = time.perf_counter()
+        try:
+            responsive, _ = call_with_timeout(lambda: driver.execute_script("return 1"), self.probe_timeout)
+        except Exception:
+            responsive = False
+        if responsive:
+            stats.latency_ms = (time.perf_counter() - start) * 1000
+        pids = process_tree(stats.root_pids)
+        stats.known_pids.update(pids)
+        stats.rss_bytes = rss_bytes(pids)
+        self.publish(stats)
+        return responsive
+
+    def recycle_reason(self, driver):
+        """檢查瀏覽器是否需要回收，回傳原因或 None"""
+        stats = self.stats_for(driver)
+        if stats is None:
+            return None
+        if not self.probe(driver):
+            return 'hung'
+        if self.max_pages and stats.pages_served >= self.max_pages:
+            return 'pages'
+        if self.max_rss_bytes and stats.rss_bytes is not None and stats.rss_bytes > self.max_rss_bytes:
+            return 'memory'
+        if self.max_latency_ms and stats.latency_ms is not None and stats.latency_ms > self.max_latency_ms:
+            return 'latency'
+        return None
+
+    def retire(self, driver, reason='closed'):
+        """關閉瀏覽器並清除它留下的所有行程"""
+        with self._lock:
+            stats = self._stats.pop(id(driver), None)
+            self._drivers.pop(id(driver), None)
+            if reason != 'closed':
+                self.recycles[reason] = self.recycles.get(reason, 0) + 1
+        if reason != 'closed':
+            logger.info(f"回收瀏覽器（原因: {reason}）")
+            if self.metrics is not None:
+                self.metrics.inc('browser_recycles', reason=reason)
+        try:
+            call_with_timeout(driver.quit, self.probe_timeout)
+        except Exception:
+            pass
+        if stats is not None:
+            stats.known_pids.update(process_tree(stats.root_pids))
+            killed = kill_pids(stats.known_pids)
+            if killed:
+                logger.info(f"已清除 {killed} 個殘留的 chrome/chromedriver 行程")
+                if self.metrics is not None:
+                    self.metrics.inc('orphan_processes_killed', killed)
+            if self.metrics is not None:
+                self.metrics.set_gauge('browser_rss_bytes', None, driver=stats.driver_id)
+                self.metrics.set_gauge('browser_pages_served', None, driver=stats.driver_id)
+                self.metrics.set_gauge('browser_latency_ms', None, driver=stats.driver_id)
+
+    def publish(self, stats):
+        if self.metrics is None:
+            return
+        if stats.rss_bytes is not None:
+            self.metrics.set_gauge('browser_rss_bytes', stats.rss_bytes, driver=stats.driver_id)
+        self.metrics.set_gauge('browser_pages_served', stats.pages_served, driver=stats.driver_id)
+        if stats.latency_ms is not None:
+            self.metrics.set_gauge('browser_latency_ms', round(stats.latency_ms, 1), driver=stats.driver_id)
+
+    def stats(self):
+        """所有瀏覽器的統計與回收次數，用來估算每台主機可以跑幾個 worker"""
+        with self._lock:
+            drivers = [stats.as_dict() for stats in self._stats.values()]
+            recycles = dict(self.recycles)
+        known_rss = [d['rss_mb'] for d in drivers if d['rss_mb'] is not None]
+        return {
+            'drivers': drivers,
+            'recycles': recycles,
+            'total_rss_mb': round(sum(known_rss), 1) if known_rss else None,
+        }
+
+    def start_watchdog(self):
+        """背景檢查太久沒有進度的瀏覽器，強制結束它的行程讓卡住的 WebDriver 呼叫拋出例外"""
+        if self._watchdog is not None:
+            return
+
+        def watch():
+            while not self._stop.wait(self.watchdog_interval):
+                now = time.monotonic()
+                with self._lock:
+                    hung = [(self._drivers[key], stats) for key, stats in self._stats.items()
+                            if stats.last_heartbeat is not None and now - stats.last_heartbeat > self.hang_timeout]
+                for driver, stats in hung:
+                    logger.warning(f"瀏覽器 {stats.driver_id} 已超過 {self.hang_timeout} 秒沒有進度，強制結束")
+                    if self.metrics is not None:
+                        self.metrics.inc('browser_watchdog_kills')
+                    stats.busy_since = stats.last_heartbeat = None
+                    kill_pids(process_tree(stats.root_pids) | stats.known_pids)
+
+        self._watchdog = threading.Thread(target=watch, daemon=True)
+        self._watchdog.start()
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            drivers = list(self._drivers.values())
+        for driver in drivers:
+            self.retire(driver)
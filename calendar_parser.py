@@ -0,0 +1,239 @@
+"""日曆表格解析
+
+只解析 table.date-table 子樹（由瀏覽器以 outerHTML 取得），
+並依安裝情況選用 selectolax > lxml > BeautifulSoup 後端；
+另提供把網路回應中的日曆 JSON 轉成相同格式的函數。
+
+解析結果是 (datetime.date, 價格整數或 None, 幣別) 的 tuple，
+日期與價格在擷取當下就轉成正確型別。
+"""
+
+import re
+from datetime import date
+
+CELL_CLASSES = ('cell-date', 'selectable')
+NO_PRICE = "無價格"
+
+
+def _has_class_xpath(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def parse_with_selectolax(html):
+    """使用 selectolax 的 lexbor（C 解析器）後端解析"""
+    from selectolax.lexbor import LexborHTMLParser
+
+    cells = []
+    for cell in LexborHTMLParser(html).css("td.cell-date.selectable"):
+        num = cell.css_first("div.date-num")
+        price = cell.css_first("div.price")
+        cells.append((
+            num.text().strip() if num is not None else "",
+            price.text().strip() if price is not None else NO_PRICE
+        ))
+    return cells
+
+
+def parse_with_lxml(html):
+    """使用 lxml（libxml2）解析，以 XPath 取代 CSS 選擇器避免額外依賴 cssselect"""
+    import lxml.html
+
+    root = lxml.html.fromstring(html)
+    cell_xpath = "//td[{} and {}]".format(*(_has_class_xpath(c) for c in CELL_CLASSES))
+    num_xpath = f".//div[{_has_class_xpath('date-num')}]"
+    price_xpath = f".//div[{_has_class_xpath('price')}]"
+
+    cells = []
+    for cell in root.xpath(cell_xpath):
+        num = cell.xpath(num_xpath)
+        price = cell.xpath(price_xpath)
+        cells.append((
+            num[0].text_content().strip() if num else "",
+            price[0].text_content().strip() if price else NO_PRICE
+        ))
+    return cells
+
+
+def parse_with_bs4(html):
+    """使用 BeautifulSoup 內建 html.parser 解析（純 Python，作為最後備援）"""
+    from bs4 import BeautifulSoup
+
+    cells = []
+    for cell in BeautifulSoup(html, 'html.parser').select("td.cell-date.selectable"):
+        num = cell.select_one('div.date-num')
+        price = cell.select_one('div.price')
+        cells.append((
+            num.text.strip() if num is not None else "",
+            price.text.strip() if price is not None else NO_PRICE
+        ))
+    return cells
+
+
+BACKENDS = {
+    'selectolax': (parse_with_selectolax, 'selectolax.lexbor'),
+    'lxml': (parse_with_lxml, 'lxml.html'),
+    'bs4': (parse_with_bs4, 'bs4'),
+}
+
+
+def available_backends():
+    """列出目前環境可用的解析後端（依速度排序）"""
+    import importlib
+
+    names = []
+    for name, (_, module) in BACKENDS.items():
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def get_backend(name='auto'):
+    """取得解析函數，auto 時選用最快的可用後端"""
+    if name == 'auto':
+        names = available_backends()
+        if not names:
+            raise ImportError("沒有可用的 HTML 解析後端（selectolax / lxml / bs4）")
+        name = names[0]
+    if name not in BACKENDS:
+        raise ValueError(f"未知的解析後端: {name}")
+    return BACKENDS[name][0]
+
+
+MONTH_NAMES = {
+    name: number
+    for number, names in enumerate([
+        ('jan', 'january'), ('feb', 'february'), ('mar', 'march'), ('apr', 'april'),
+        ('may',), ('jun', 'june'), ('jul', 'july'), ('aug', 'august'),
+        ('sep', 'sept', 'september'), ('oct', 'october'), ('nov', 'november'), ('dec', 'december'),
+    ], start=1)
+    for name in names
+}
+NUMERIC_MONTH_PATTERN = re.compile(r'(\d{4})\s*[年/.-]\s*(\d{1,2})')
+NAMED_MONTH_PATTERN = re.compile(r'([A-Za-z]+)\.?\s+(\d{4})')
+
+# 價格前後的幣別符號，對應到 ISO 幣別代碼
+CURRENCY_SYMBOLS = {
+    'NT$': 'TWD', 'HK$': 'HKD', 'US$': 'USD', 'S$': 'SGD', 'RM': 'MYR',
+    '¥': 'JPY', '￥': 'JPY', '₩': 'KRW', '฿': 'THB', '€': 'EUR', '£': 'GBP', '$': 'USD',
+}
+CURRENCY_CODE_PATTERN = re.compile(r'\b([A-Z]{3})\b')
+
+
+def parse_month_label(text):
+    """把 2026年12月 / 2026/12 / December 2026 之類的月份文字轉成 (年, 月)，無法解析時回傳 None"""
+    text = text or ""
+    match = NUMERIC_MONTH_PATTERN.search(text)
+    if match:
+        return int(match.group(1)), int(match.group(2))
+    match = NAMED_MONTH_PATTERN.search(text)
+    if match and match.group(1).lower() in MONTH_NAMES:
+        return int(match.group(2)), MONTH_NAMES[match.group(1).lower()]
+    return None
+
+
+def parse_price(text, default_currency=""):
+    """把 1,234 / TWD 1,234 / NT$1,234 之類的價格轉成 (整數價格, 幣別)，沒有價格時價格為 None"""
+    if text is None or isinstance(text, bool):
+        return None, default_currency
+    if isinstance(text, (int, float)):
+        return int(round(text)), default_currency
+
+    text = text.strip()
+    currency = default_currency
+    code = CURRENCY_CODE_PATTERN.search(text)
+    if code:
+        currency = code.group(1)
+    else:
+        for symbol, symbol_code in CURRENCY_SYMBOLS.items():
+            if symbol in text:
+                currency = symbol_code
+                break
+
+    digits = re.sub(r'[^\d.]', '', text)
+    if not digits.strip('.'):
+        return None, currency
+    try:
+        return int(round(float(digits))), currency
+    except ValueError:
+        # 例如 1.234.567 這種以點分隔千位的格式
+        return None, currency
+
+
+def parse_calendar(html, current_month, backend='auto'):
+    """解析日曆表格 HTML，回傳 (date, price, currency) 列表；月份無法解析時回傳空列表"""
+    parse = get_backend(backend) if isinstance(backend, str) else backend
+    year_month = parse_month_label(current_month)
+    if year_month is None:
+        return []
+    year, month = year_month
+
+    entries = []
+    for num, price_text in parse(html):
+        if not num.isdigit():
+            continue
+        price, currency = parse_price(None if price_text == NO_PRICE else price_text)
+        entries.append((date(year, month, int(num)), price, currency))
+    return entries
+
+
+# ---- 從網路回應的 JSON 建立記錄 ----
+
+DATE_KEYS = ('date', 'day', 'go_date', 'sale_date', 'travel_date', 'start_date')
+PRICE_KEYS = ('price', 'sale_price', 'display_price', 'min_price', 'b2c_price', 'amount')
+CURRENCY_KEYS = ('currency', 'currency_code', 'currency_type')
+AVAILABLE_KEYS = ('is_available', 'available', 'selectable', 'is_sale')
+DATE_PATTERN = re.compile(r'^(\d{4})-?(\d{2})-?(\d{2})')
+
+
+def _currency_of(node, default=""):
+    return next((node[k] for k in CURRENCY_KEYS if isinstance(node.get(k), str)), default)
+
+
+def _price_entry(node):
+    """若 dict 看起來是一天的價格資料，回傳 (date, price, currency)
+
+    只有日期欄位還不夠（例如外層的 start_date），必須同時帶有價格或可售狀態欄位才算一天。
+    """
+    if not any(k in node for k in PRICE_KEYS + AVAILABLE_KEYS):
+        return None
+    date_value = next((node[k] for k in DATE_KEYS if isinstance(node.get(k), str)), None)
+    if date_value is None:
+        return None
+    match = DATE_PATTERN.match(date_value)
+    if not match:
+        return None
+    for key in AVAILABLE_KEYS:
+        if key in node and not node[key]:
+            return None
+    currency = _currency_of(node)
+    price = next((node[k] for k in PRICE_KEYS if k in node), None)
+    if isinstance(price, dict):
+        # 例如 {"price": {"amount": 1234, "currency": "TWD"}}
+        currency = _currency_of(price, currency)
+        price = next((price[k] for k in PRICE_KEYS if k in price), None)
+    price, currency = parse_price(price, currency)
+    try:
+        day = date(*(int(g) for g in match.groups()))
+    except ValueError:
+        return None
+    return day, price, currency
+
+
+def records_from_calendar_json(payload):
+    """遍歷任意結構的日曆 JSON，轉成 (date, price, currency) 列表（依日期排序並去重）"""
+    found = {}
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            entry = _price_entry(node)
+            if entry is not None:
+                found.setdefault(entry[0], entry)
+                continue
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return [found[day] for day in sorted(found)]
@@ -0,0 +1,106 @@
+"""可續傳的爬取斷點（SQLite）
+
+以 (run_id, url, 選項序號, 月份序號) 為單位記錄已完成的資料列，
+重新啟動時略過已完成的單位，只重做缺少的部分。
+"""
+import json
+import sqlite3
+import threading
+from datetime import date, datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS month_units (
+    run_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    option_index INTEGER NOT NULL,
+    month_index INTEGER NOT NULL,
+    option_title TEXT,
+    month_label TEXT,
+    rows_json TEXT NOT NULL,
+    completed_at TEXT NOT NULL,
+    PRIMARY KEY (run_id, url, option_index, month_index)
+);
+CREATE TABLE IF NOT EXISTS option_units (
+    run_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    option_index INTEGER NOT NULL,
+    option_title TEXT,
+    completed_at TEXT NOT NULL,
+    PRIMARY KEY (run_id, url, option_index)
+);
+CREATE TABLE IF NOT EXISTS url_units (
+    run_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    completed_at TEXT NOT NULL,
+    PRIMARY KEY (run_id, url)
+);
+"""
+
+
+class CheckpointStore:
+    """執行緒安全的斷點紀錄；同一個 run_id 重新執行時會續傳"""
+
+    def __init__(self, path='checkpoints.db', run_id=None):
+        # 預設以日期作為 run_id，當天重啟會續傳，隔天則重新爬取
+        self.run_id = run_id or date.today().isoformat()
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def _now(self):
+        return datetime.now().isoformat(timespec='seconds')
+
+    def _query(self, sql, params):
+        with self._lock:
+            return self.conn.execute(sql, (self.run_id,) + params).fetchall()
+
+    def _write(self, sql, params):
+        with self._lock:
+            self.conn.execute(sql, (self.run_id,) + params)
+
+    def is_url_done(self, url):
+        return bool(self._query("SELECT 1 FROM url_units WHERE run_id = ? AND url = ?", (url,)))
+
+    def mark_url_done(self, url, row_count):
+        self._write("INSERT OR REPLACE INTO url_units VALUES (?, ?, ?, ?)", (url, row_count, self._now()))
+
+    def is_option_done(self, url, option_index):
+        return bool(self._query(
+            "SELECT 1 FROM option_units WHERE run_id = ? AND url = ? AND option_index = ?",
+            (url, option_index)))
+
+    def mark_option_done(self, url, option_index, option_title):
+        self._write("INSERT OR REPLACE INTO option_units VALUES (?, ?, ?, ?, ?)",
+                    (url, option_index, option_title, self._now()))
+
+    def month_rows(self, url, option_index, month_index):
+        """已完成月份的資料列，尚未完成時回傳 None"""
+        rows = self._query(
+            "SELECT rows_json FROM month_units "
+            "WHERE run_id = ? AND url = ? AND option_index = ? AND month_index = ?",
+            (url, option_index, month_index))
+        return json.loads(rows[0][0]) if rows else None
+
+    def save_month(self, url, option_index, month_index, option_title, rows):
+        """記錄一個完成的月份（沒有可用日期也要記錄，避免重做）"""
+        month_label = str(rows[0]['date'])[:7] if rows else ''
+        self._write("INSERT OR REPLACE INTO month_units VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (url, option_index, month_index, option_title, month_label,
+                     json.dumps(rows, ensure_ascii=False, default=str), self._now()))
+
+    def option_rows(self, url, option_index):
+        """某個選項所有已完成月份的資料列（依月份順序）"""
+        rows = []
+        for (rows_json,) in self._query(
+                "SELECT rows_json FROM month_units WHERE run_id = ? AND url = ? AND option_index = ? "
+                "ORDER BY month_index", (url, option_index)):
+            rows.extend(json.loads(rows_json))
+        return rows
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,217 @@
+"""具名的爬取設定檔
+
+把原本寫死在 main.py 的 worker 數、動作間隔、隨機延遲、逾時、日期範圍與輸出方式集中成 CrawlProfile。
+內建 default（與原本的行為相同）與 fixture/fast（本地替身網站用，關閉所有人為延遲），
+也可從 TOML 或 JSON 設定檔載入，extends 指定要沿用的設定檔：
+
+    [profiles.gentle]
+    extends = "default"
+    workers = 2
+    min_action_interval = 2.0
+    delays = { url = [10, 20] }
+    window = "next 60 days"
+    output_formats = ["jsonl", "parquet"]
+"""
+import json
+import os
+from dataclasses import dataclass, field, fields
+
+from resilience import AdaptiveTimeouts
+
+# 各處的隨機延遲範圍（秒）；(0, 0) 表示不延遲
+DEFAULT_DELAYS = {
+    'page': (3, 7),       # 打開頁面並模擬瀏覽之後
+    'option': (2, 4),     # 選項列表載入後（每個選項之間由 pacer 控制間隔）
+    'click': (0.5, 1.5),  # 以滑鼠點擊元素前後
+    'url': (3, 5),        # 兩個 URL 之間
+}
+
+DEFAULT_BASE_URL = "https://www.kkday.com/zh-tw/product/{product_id}"
+
+
+@dataclass
+class CrawlProfile:
+    name: str = 'default'
+    # 以商品編號產生 URL 的範本
+    base_url: str = DEFAULT_BASE_URL
+    workers: int = 3
+    option_concurrency: int = 1
+    min_action_interval: float = 1.0
+    action_jitter: float = 0.5
+    delays: dict = field(default_factory=lambda: dict(DEFAULT_DELAYS))
+    # 打開頁面後隨機捲動與移動滑鼠
+    human_behavior: bool = True
+    # 覆寫 resilience.DEFAULT_TIMEOUTS 的等待上限（秒）
+    timeouts: dict = field(default_factory=dict)
+    window: str = '3m'
+    # 商品編號 -> 日期範圍
+    horizons: dict = field(default_factory=dict)
+    extraction_mode: str = 'dom'
+    http_fast_path: bool = True
+    block_resources: bool = True
+    headless: bool = False
+    fast_start: bool = False
+    output_dir: str = 'output'
+    output_formats: list = None
+    export_excel: bool = True
+    checkpoint_path: str = None
+    history_path: str = None
+    snapshot_dir: str = None
+    selector_cache_path: str = 'selector_cache.db'
+    metrics_log_path: str = 'metrics.jsonl'
+    metrics_path: str = 'metrics.prom'
+    metrics_port: int = None
+
+    def product_url(self, product_id):
+        return self.base_url.format(product_id=product_id)
+
+    def scraper_kwargs(self):
+        """KKdayFlightScraper 的參數；每次呼叫建立新的 AdaptiveTimeouts，要跨 URL 累積延遲樣本時重複使用同一份"""
+        return {
+            'timeouts': AdaptiveTimeouts(self.timeouts),
+            'extraction_mode': self.extraction_mode,
+            'option_concurrency': self.option_concurrency,
+            'min_action_interval': self.min_action_interval,
+            'action_jitter': self.action_jitter,
+            'delays': self.delays,
+            'human_behavior': self.human_behavior,
+            'headless': self.headless,
+            'fast_start': self.fast_start,
+            'export_excel': self.export_excel,
+            'crawl_window': self.window,
+        }
+
+    def multi_kwargs(self):
+        """KKdayMultiScraper 的參數"""
+        return {
+            'max_workers': self.workers,
+            'option_concurrency': self.option_concurrency,
+            'min_action_interval': self.min_action_interval,
+            'action_jitter': self.action_jitter,
+            'delays': self.delays,
+            'human_behavior': self.human_behavior,
+            'timeout_defaults': self.timeouts,
+            'crawl_window': self.window,
+            'horizons': self.horizons,
+            'extraction_mode': self.extraction_mode,
+            'http_fast_path': self.http_fast_path,
+            'resource_filter': None if self.block_resources else False,
+            'headless': self.headless,
+            'fast_start': self.fast_start,
+            'output_dir': self.output_dir,
+            'output_formats': self.output_formats,
+            'export_excel': self.export_excel,
+            'checkpoint_path': self.checkpoint_path,
+            'history_path': self.history_path,
+            'snapshot_dir': self.snapshot_dir,
+            'selector_cache_path': self.selector_cache_path,
+            'metrics_log_path': self.metrics_log_path,
+            'metrics_path': self.metrics_path,
+            'metrics_port': self.metrics_port,
+        }
+
+
+BUILTIN_PROFILES = {
+    'default': {},
+    # 本地替身網站的基準測試與測試：不模擬人為行為、不延遲、不寫持久化的快取與指標檔
+    'fixture/fast': {
+        'base_url': "http://127.0.0.1:8765/zh-tw/product/{product_id}",
+        'workers': 2,
+        'min_action_interval': 0.0,
+        'action_jitter': 0.0,
+        'delays': {kind: (0, 0) for kind in DEFAULT_DELAYS},
+        'human_behavior': False,
+        'timeouts': {'page_load': 10, 'modal': 2},
+        'http_fast_path': False,
+        'headless': True,
+        'fast_start': True,
+        'output_formats': ['jsonl'],
+        'export_excel': False,
+        'selector_cache_path': None,
+        'metrics_log_path': None,
+        'metrics_path': None,
+    },
+}
+
+FIELD_NAMES = {f.name for f in fields(CrawlProfile)}
+
+
+def read_config(path):
+    """讀取設定檔中的 profiles 區段（.toml 或 .json）"""
+    if path.endswith('.toml'):
+        import tomllib
+
+        with open(path, 'rb') as f:
+            config = tomllib.load(f)
+    else:
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+    return config.get('profiles', config)
+
+
+def load_profiles(path=None):
+    """內建設定檔加上設定檔中的設定檔（同名時覆寫），回傳 {名稱: 設定}"""
+    profiles = {name: dict(settings) for name, settings in BUILTIN_PROFILES.items()}
+    if path:
+        profiles.update(read_config(path))
+    return profiles
+
+
+def _resolve(name, profiles, seen=()):
+    if name not in profiles:
+        raise ValueError(f"未知的設定檔: {name}（可用: {', '.join(sorted(profiles))}）")
+    if name in seen:
+        raise ValueError(f"設定檔 extends 形成循環: {' -> '.join(seen + (name,))}")
+    settings = dict(profiles[name])
+    parent = settings.pop('extends', None)
+    base = _resolve(parent, profiles, seen + (name,)) if parent else {}
+    # delays 與 timeouts 只覆寫指定的項目
+    for key in ('delays', 'timeouts', 'horizons'):
+        if key in settings and key in base:
+            settings[key] = {**base[key], **settings[key]}
+    return {**base, **settings}
+
+
+def get_profile(name='default', path=None, **overrides):
+    """取得設定檔；overrides 中值為 None 的項目忽略（方便直接傳入命令列參數）"""
+    settings = _resolve(name, load_profiles(path))
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    unknown = set(settings) - FIELD_NAMES
+    if unknown:
+        raise ValueError(f"設定檔 {name} 有未知的設定: {', '.join(sorted(unknown))}")
+    settings['name'] = name
+    settings['delays'] = {kind: tuple(value) for kind, value in {**DEFAULT_DELAYS, **settings.get('delays', {})}.items()}
+    return CrawlProfile(**settings)
+
+
+def parse_product_ids(spec):
+    """把 137240-137260,139665 之類的寫法展開成商品編號列表"""
+    ids = []
+    for part in str(spec).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = (int(p) for p in part.split('-', 1))
+            ids.extend(str(i) for i in range(start, end + 1))
+        else:
+            ids.append(part)
+    return ids
+
+
+def read_url_file(path):
+    """每行一個 URL 或商品編號，忽略空行與 # 註解"""
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+
+def resolve_urls(profile, items):
+    """把 URL 或商品編號轉成 URL，保持順序並去除重複"""
+    urls = [item if '://' in item else profile.product_url(item) for item in items]
+    return list(dict.fromkeys(urls))
+
+
+def default_config_path():
+    """未指定 --config 時使用目前目錄的 crawl_profiles.toml（存在時）"""
+    path = os.environ.get('KKDAY_PROFILES', 'crawl_profiles.toml')
+    return path if os.path.exists(path) else None
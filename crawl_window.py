@@ -0,0 +1,147 @@
+"""爬取的日期範圍
+
+CrawlWindow 描述要收集的日期區間（含頭尾）。navigate_through_months 依此略過區間外的月份、
+在區間結束後停止翻頁，網路模式下還可以直接改寫日曆 API 的月份參數取得需要的月份。
+
+可接受的寫法：
+- "next 30 days" / "30d" / 30           今天起 30 天
+- "next 3 months" / "3m"                本月與之後 3 個月
+- "2026-12-20..2027-01-05"              指定日期
+- "2026-12..2027-02"                    指定月份（含整個月）
+"""
+import calendar
+import re
+from datetime import date, timedelta
+
+DAYS_PATTERN = re.compile(r'^(?:next\s+)?(\d+)\s*(?:d|days?)?$', re.I)
+MONTHS_PATTERN = re.compile(r'^(?:next\s+)?(\d+)\s*(?:m|months?)$', re.I)
+MONTH_PATTERN = re.compile(r'^(\d{4})-(\d{1,2})$')
+
+
+def add_months(year_month, months):
+    """(年, 月) 加上 months 個月"""
+    year, month = year_month
+    index = year * 12 + month - 1 + months
+    return index // 12, index % 12 + 1
+
+
+def months_between(start, end):
+    """從 (年, 月) start 到 end 相差幾個月"""
+    return (end[0] * 12 + end[1]) - (start[0] * 12 + start[1])
+
+
+def month_end(year, month):
+    return date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _parse_bound(text, end=False):
+    """解析 YYYY-MM-DD 或 YYYY-MM（end 時取該月最後一天）"""
+    text = text.strip()
+    match = MONTH_PATTERN.match(text)
+    if match:
+        year, month = int(match.group(1)), int(match.group(2))
+        return month_end(year, month) if end else date(year, month, 1)
+    return date.fromisoformat(text)
+
+
+class CrawlWindow:
+    """要收集的日期區間 [start, end]"""
+
+    def __init__(self, start, end):
+        if end < start:
+            raise ValueError(f"日期範圍結束 {end} 早於開始 {start}")
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def next_days(cls, days, today=None):
+        today = today or date.today()
+        return cls(today, today + timedelta(days=max(1, days) - 1))
+
+    @classmethod
+    def next_months(cls, months, today=None):
+        """本月（今天起）與之後 months 個月，與原本 months_ahead 的範圍相同"""
+        today = today or date.today()
+        return cls(today, month_end(*add_months((today.year, today.month), months)))
+
+    @classmethod
+    def parse(cls, spec, today=None):
+        """把上述寫法轉成 CrawlWindow；spec 為 None 時回傳 None"""
+        if spec is None or isinstance(spec, cls):
+            return spec
+        if isinstance(spec, int):
+            return cls.next_days(spec, today)
+        text = str(spec).strip()
+        if '..' in text:
+            start, end = text.split('..', 1)
+            return cls(_parse_bound(start), _parse_bound(end, end=True))
+        match = MONTHS_PATTERN.match(text)
+        if match:
+            return cls.next_months(int(match.group(1)), today)
+        match = DAYS_PATTERN.match(text)
+        if match:
+            return cls.next_days(int(match.group(1)), today)
+        raise ValueError(f"無法解析日期範圍: {spec!r}")
+
+    def months(self):
+        """區間涵蓋的所有 (年, 月)"""
+        months = []
+        current, last = (self.start.year, self.start.month), (self.end.year, self.end.month)
+        while current <= last:
+            months.append(current)
+            current = add_months(current, 1)
+        return months
+
+    def contains(self, day):
+        return self.start <= day <= self.end
+
+    def covers(self, year_month):
+        return (self.start.year, self.start.month) <= year_month <= (self.end.year, self.end.month)
+
+    def is_before(self, year_month):
+        """整個月份都在區間開始之前"""
+        return year_month < (self.start.year, self.start.month)
+
+    def is_after(self, year_month):
+        """整個月份都在區間結束之後"""
+        return year_month > (self.end.year, self.end.month)
+
+    def filter(self, entries):
+        """只保留區間內的 (date, price, currency)"""
+        return [entry for entry in entries if self.contains(entry[0])]
+
+    def __str__(self):
+        return f"{self.start.isoformat()}..{self.end.isoformat()}"
+
+    def __repr__(self):
+        return f"CrawlWindow({self})"
+
+
+def month_request_url(url, from_month, to_month):
+    """把日曆 API 網址中 from_month 的月份參數改成 to_month，無法安全改寫時回傳 None
+
+    支援 month=2026-10 這類月份參數，以及以月初/月底表示的 start_date/end_date。
+    """
+    year, month = from_month
+    key = f"{year:04d}-{month:02d}"
+    if key not in url:
+        return None
+    new_year, new_month = to_month
+    new_key = f"{new_year:04d}-{new_month:02d}"
+    first, last = f"{key}-01", month_end(year, month).isoformat()
+
+    def rewrite(match):
+        text = match.group(0)
+        if len(text) == len(key):
+            return new_key
+        if text == first:
+            return f"{new_key}-01"
+        if text == last:
+            return month_end(new_year, new_month).isoformat()
+        raise ValueError(text)
+
+    try:
+        return re.sub(re.escape(key) + r'(?:-\d{2})?(?!\d)', rewrite, url)
+    except ValueError:
+        # 月中的日期參數無法判斷要改成哪一天
+        return None
@@ -0,0 +1,119 @@
+"""快速啟動：快取已修補的 chromedriver、瀏覽器設定檔範本與 User-Agent 清單
+
+undetected_chromedriver 未指定 driver 路徑時，每次啟動都會下載並修補一份新的 chromedriver；
+fake_useragent 每次建構 UserAgent() 都要載入資料，甚至可能連網。這裡把三者都快取在磁碟上：
+
+- 已修補的 chromedriver 固定放在快取目錄，之後的啟動直接使用
+- 首次啟動後的瀏覽器設定檔保存為範本，每次啟動複製一份（略過快取目錄）
+- User-Agent 清單存成 JSON，之後不再載入 fake_useragent
+"""
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+
+DEFAULT_CACHE_DIR = os.environ.get('KKDAY_CACHE_DIR') or os.path.join(
+    os.path.expanduser('~'), '.cache', 'kkday_scraper')
+
+# 無法取得 fake_useragent 資料時使用
+FALLBACK_USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/124.0.0.0 Safari/537.36",
+]
+
+# 複製設定檔範本時略過的目錄與鎖定檔（可重建的快取，複製它們只會拖慢啟動）
+PROFILE_SKIP = shutil.ignore_patterns('Cache', 'Code Cache', 'GPUCache', 'ShaderCache', 'GrShaderCache',
+                                      'Service Worker', 'Crashpad', 'Singleton*', '*.log')
+
+_lock = threading.Lock()
+_user_agents = {}  # 快取目錄 -> User-Agent 清單
+
+
+def cached_user_agents(cache_dir=DEFAULT_CACHE_DIR, sample_size=50):
+    """讀取快取的 User-Agent 清單；不存在時由 fake_useragent 產生一次並寫入快取（依快取目錄分別記住）"""
+    with _lock:
+        if cache_dir in _user_agents:
+            return _user_agents[cache_dir]
+        path = os.path.join(cache_dir, 'user_agents.json')
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                _user_agents[cache_dir] = json.load(f)
+            return _user_agents[cache_dir]
+        try:
+            from fake_useragent import UserAgent
+
+            ua = UserAgent()
+            agents = sorted({ua.random for _ in range(sample_size)})
+        except Exception as e:
+            # 內建清單不寫入快取，下次仍會嘗試產生
+            print(f"無法產生 User-Agent 清單，使用內建清單: {e}")
+            _user_agents[cache_dir] = list(FALLBACK_USER_AGENTS)
+            return _user_agents[cache_dir]
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(agents, f, ensure_ascii=False, indent=2)
+        _user_agents[cache_dir] = agents
+        return agents
+
+
+def random_user_agent(cache_dir=DEFAULT_CACHE_DIR):
+    return random.choice(cached_user_agents(cache_dir))
+
+
+def patched_driver_path(cache_dir=DEFAULT_CACHE_DIR):
+    """回傳快取中已修補的 chromedriver 路徑，不存在時下載並修補一次"""
+    name = 'chromedriver.exe' if os.name == 'nt' else 'chromedriver'
+    path = os.path.join(cache_dir, name)
+    with _lock:
+        if not os.path.exists(path):
+            from webdriver_manager.chrome import ChromeDriverManager
+
+            os.makedirs(cache_dir, exist_ok=True)
+            shutil.copy2(ChromeDriverManager().install(), path)
+        import undetected_chromedriver as uc
+
+        # 已修補的檔案會被 Patcher 直接略過
+        uc.Patcher(executable_path=path).auto()
+    return path
+
+
+def profile_template_dir(cache_dir=DEFAULT_CACHE_DIR):
+    return os.path.join(cache_dir, 'profile_template')
+
+
+def has_profile_template(cache_dir=DEFAULT_CACHE_DIR):
+    return os.path.isdir(profile_template_dir(cache_dir))
+
+
+def save_profile_template(user_data_dir, cache_dir=DEFAULT_CACHE_DIR):
+    """把一個已完成首次啟動的設定檔保存為範本（瀏覽器關閉後呼叫）"""
+    template = profile_template_dir(cache_dir)
+    with _lock:
+        if os.path.isdir(template) or not os.path.isdir(user_data_dir):
+            return
+        staging = tempfile.mkdtemp(prefix='profile_template.', dir=cache_dir)
+        shutil.copytree(user_data_dir, os.path.join(staging, 'profile'), ignore=PROFILE_SKIP)
+        os.replace(os.path.join(staging, 'profile'), template)
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def clone_profile(cache_dir=DEFAULT_CACHE_DIR):
+    """複製設定檔範本到新的暫存目錄；沒有範本時回傳空的暫存目錄"""
+    target = tempfile.mkdtemp(prefix='kkday-profile-')
+    template = profile_template_dir(cache_dir)
+    if os.path.isdir(template):
+        shutil.copytree(template, target, ignore=PROFILE_SKIP, dirs_exist_ok=True)
+    return target
+
+
+def clear_cache(cache_dir=DEFAULT_CACHE_DIR):
+    """清除快取（量測冷啟動用）"""
+    with _lock:
+        _user_agents.pop(cache_dir, None)
+        shutil.rmtree(cache_dir, ignore_errors=True)
@@ -0,0 +1,292 @@
+"""本地替身網站：提供商品頁與錄製的日曆 JSON，用於離線測試與效能基準
+
+用法: python fixture_site.py --port 8765 --recorded-dir recorded/ --options 3 --latency-ms 50
+
+錄製檔命名為 <product_id>_<YYYY-MM>.json；找不到時會產生合成資料。
+商品頁: http://127.0.0.1:8765/zh-tw/product/<product_id>
+--options 0 為直接顯示日曆的頁面，大於 0 為有選擇按鈕、以彈窗顯示日曆的頁面；
+個別頁面可用 ?options=N 覆寫。
+"""
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PRODUCT_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Fixture {product_id}</title>
+<style>.modal {{ position: fixed; inset: 0; background: rgba(0,0,0,.4); }}
+.modal-dialog {{ margin: 40px auto; width: 600px; background: #fff; }}</style>
+</head>
+<body>
+<h1 class="product-name">替身商品 {product_id}</h1>
+<div id="content"></div>
+<script>
+var productId = {product_id_json};
+var startMonth = {start_month_json};
+var maxMonths = {max_months};
+var optionCount = {options};
+var modalDelayMs = {modal_delay_ms};
+var modalFlakeRate = {modal_flake_rate};
+var seed = {seed};
+var query = new URLSearchParams(location.search);
+if (query.has('options')) optionCount = parseInt(query.get('options'), 10);
+var offset = 0;
+var currentOption = 0;
+
+// 以商品與開啟次數決定彈窗是否不穩定，同樣的設定每次結果相同
+function flaky(key) {{
+  var h = seed;
+  for (var i = 0; i < key.length; i++) h = (h * 31 + key.charCodeAt(i)) >>> 0;
+  return (h % 1000) / 1000 < modalFlakeRate;
+}}
+
+var CALENDAR_HTML =
+  '<div class="calendar">' +
+  '<div class="change-month prev-month">&lt;</div>' +
+  '<div class="current-month"></div>' +
+  '<div class="change-month next-month">&gt;</div>' +
+  '<div class="calendar-body"></div>' +
+  '</div>';
+
+function monthKey(off) {{
+  var parts = startMonth.split('-');
+  var d = new Date(parseInt(parts[0], 10), parseInt(parts[1], 10) - 1 + off, 1);
+  return d.getFullYear() + '-' + ('0' + (d.getMonth() + 1)).slice(-2);
+}}
+
+function render(key, payload) {{
+  var parts = key.split('-');
+  document.querySelector('div.current-month').textContent =
+    parseInt(parts[0], 10) + '年' + parseInt(parts[1], 10) + '月';
+  var items = (payload.data && payload.data.items) || [];
+  var html = '<table class="date-table"><tbody><tr>';
+  items.forEach(function(item, i) {{
+    var day = parseInt(item.date.slice(8, 10), 10);
+    var cls = item.is_available ? 'cell-date selectable' : 'cell-date disabled';
+    var price = item.is_available && item.price != null
+      ? '<div class="price">' + item.price.toLocaleString('en-US') + '</div>' : '';
+    html += '<td class="' + cls + '"><div class="date-num">' + day + '</div>' + price + '</td>';
+    if (i % 7 === 6) html += '</tr><tr>';
+  }});
+  html += '</tr></tbody></table>';
+  document.querySelector('div.calendar-body').innerHTML = html;
+  var next = document.querySelector('div.change-month.next-month');
+  next.className = offset + 1 >= maxMonths
+    ? 'change-month next-month disabled' : 'change-month next-month';
+}}
+
+function load() {{
+  var key = monthKey(offset);
+  fetch('/api/calendar?product=' + productId + '&option=' + currentOption + '&month=' + key)
+    .then(function(r) {{ return r.json(); }})
+    .then(function(payload) {{ render(key, payload); }});
+}}
+
+function bindCalendar() {{
+  offset = 0;
+  document.querySelector('div.change-month.next-month').addEventListener('click', function() {{
+    if (this.classList.contains('disabled')) return;
+    offset += 1;
+    load();
+  }});
+  load();
+}}
+
+function closeModal(modal, delayMs) {{
+  setTimeout(function() {{ modal.remove(); }}, delayMs);
+}}
+
+// 開啟選項的預訂彈窗；不穩定的彈窗會延遲出現、隱藏關閉按鈕或延遲關閉
+function openModal(index) {{
+  var old = document.getElementById('booking-modal');
+  if (old) old.remove();
+  currentOption = index;
+  var unstable = flaky(productId + ':' + index);
+  var modal = document.createElement('div');
+  modal.id = 'booking-modal';
+  modal.className = 'modal';
+  modal.innerHTML =
+    '<div class="modal-dialog"><div class="modal-content">' +
+    '<button class="modal-close"' + (unstable ? ' style="display:none"' : '') + '>×</button>' +
+    CALENDAR_HTML + '</div></div>';
+  modal.querySelector('button.modal-close').addEventListener('click', function() {{
+    closeModal(modal, 0);
+  }});
+  modal.addEventListener('click', function(e) {{
+    if (e.target === modal) closeModal(modal, unstable ? 500 : 0);
+  }});
+  setTimeout(function() {{
+    document.body.appendChild(modal);
+    bindCalendar();
+  }}, unstable ? modalDelayMs * 2 : modalDelayMs);
+}}
+
+var content = document.getElementById('content');
+if (optionCount > 0) {{
+  var html = '';
+  for (var i = 0; i < optionCount; i++) {{
+    html += '<div class="option-head"><span class="kk-u-text-h6">替身方案 ' + (i + 1) + '</span>' +
+      '<button class="kk-button select-option" data-index="' + i + '">選擇</button></div>';
+  }}
+  content.innerHTML = html;
+  Array.prototype.forEach.call(document.querySelectorAll('button.select-option'), function(button) {{
+    button.addEventListener('click', function() {{ openModal(parseInt(this.dataset.index, 10)); }});
+  }});
+}} else {{
+  content.innerHTML = '<div class="option-booking">' +
+    '<span class="kk-u-text-h6">替身商品 ' + productId + '</span>' + CALENDAR_HTML + '</div>';
+  bindCalendar();
+}}
+</script>
+</body></html>
+"""
+
+
+def synthetic_month(product_id, month_key, option_index=0):
+    """產生合成的日曆 JSON，同樣的參數總是回傳同樣的資料"""
+    year, month = (int(p) for p in month_key.split('-'))
+    rng = random.Random(f"{product_id}-{option_index}-{month_key}" if option_index else f"{product_id}-{month_key}")
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    days = (next_month - date(year, month, 1)).days
+    items = []
+    for day in range(1, days + 1):
+        available = rng.random() > 0.3
+        items.append({
+            'date': f"{year:04d}-{month:02d}-{day:02d}",
+            'price': rng.randint(20, 300) * 100 if available else None,
+            'currency': 'TWD',
+            'is_available': available
+        })
+    return {'data': {'month': month_key, 'items': items}}
+
+
+class FixtureConfig:
+    """替身網站設定"""
+
+    def __init__(self, recorded_dir=None, start_month=None, max_months=6, options=0,
+                 page_latency_ms=0, api_latency_ms=0, latency_jitter_ms=0,
+                 modal_delay_ms=0, modal_flake_rate=0.0, seed=0):
+        self.recorded_dir = recorded_dir
+        self.start_month = start_month or date.today().strftime('%Y-%m')
+        self.max_months = max_months
+        # 0: 直接顯示日曆；N: N 個選項，各自以彈窗顯示日曆
+        self.options = options
+        # 注入的回應延遲（毫秒），每次再加上 0~latency_jitter_ms 的隨機抖動
+        self.page_latency_ms = page_latency_ms
+        self.api_latency_ms = api_latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        # 彈窗延遲出現的時間，以及不穩定彈窗（加倍延遲、隱藏關閉按鈕、延遲關閉）的比例
+        self.modal_delay_ms = modal_delay_ms
+        self.modal_flake_rate = modal_flake_rate
+        self.seed = seed
+
+    def calendar_payload(self, product_id, month_key, option_index=0):
+        """優先讀取錄製的 JSON，沒有時產生合成資料"""
+        if self.recorded_dir:
+            path = os.path.join(self.recorded_dir, f"{product_id}_{month_key}.json")
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    return json.load(f)
+        return synthetic_month(product_id, month_key, option_index)
+
+    def delay(self, latency_ms):
+        """模擬網路延遲"""
+        if latency_ms or self.latency_jitter_ms:
+            time.sleep((latency_ms + random.uniform(0, self.latency_jitter_ms)) / 1000)
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    config = FixtureConfig()
+
+    def log_message(self, format, *args):
+        # 避免每個請求都輸出到 stderr
+        pass
+
+    def send_body(self, body, content_type, status=200):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        product_match = re.match(r'^/(?:[\w-]+/)?product/(\w+)/?$', parsed.path)
+        if product_match:
+            product_id = product_match.group(1)
+            self.config.delay(self.config.page_latency_ms)
+            page = PRODUCT_PAGE.format(
+                product_id=product_id,
+                product_id_json=json.dumps(product_id),
+                start_month_json=json.dumps(self.config.start_month),
+                max_months=self.config.max_months,
+                options=self.config.options,
+                modal_delay_ms=self.config.modal_delay_ms,
+                modal_flake_rate=self.config.modal_flake_rate,
+                seed=self.config.seed
+            )
+            self.send_body(page, 'text/html; charset=utf-8')
+        elif parsed.path == '/api/calendar':
+            query = parse_qs(parsed.query)
+            product_id = query.get('product', [''])[0]
+            month_key = query.get('month', [self.config.start_month])[0]
+            option_index = int(query.get('option', ['0'])[0])
+            self.config.delay(self.config.api_latency_ms)
+            payload = self.config.calendar_payload(product_id, month_key, option_index)
+            self.send_body(json.dumps(payload, ensure_ascii=False), 'application/json; charset=utf-8')
+        else:
+            self.send_body('not found', 'text/plain', status=404)
+
+
+def create_fixture_server(config=None, host='127.0.0.1', port=0):
+    """建立套用指定設定的替身網站伺服器；port=0 代表自動選擇"""
+    handler = type('ConfiguredFixtureHandler', (FixtureHandler,), {'config': config or FixtureConfig()})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def start_fixture_server(config=None, host='127.0.0.1', port=0):
+    """在背景執行緒啟動替身網站，回傳 (server, base_url)"""
+    server = create_fixture_server(config, host, port)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KKday 本地替身網站")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--recorded-dir', help="錄製的日曆 JSON 目錄")
+    parser.add_argument('--start-month', help="第一個月份，格式 YYYY-MM")
+    parser.add_argument('--max-months', type=int, default=6)
+    parser.add_argument('--options', type=int, default=0, help="選項數，0 表示直接顯示日曆")
+    parser.add_argument('--page-latency-ms', type=int, default=0)
+    parser.add_argument('--latency-ms', type=int, default=0, help="日曆 API 的回應延遲")
+    parser.add_argument('--jitter-ms', type=int, default=0)
+    parser.add_argument('--modal-delay-ms', type=int, default=0)
+    parser.add_argument('--modal-flake-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    config = FixtureConfig(args.recorded_dir, args.start_month, args.max_months, args.options,
+                           args.page_latency_ms, args.latency_ms, args.jitter_ms,
+                           args.modal_delay_ms, args.modal_flake_rate, args.seed)
+    server = create_fixture_server(config, args.host, args.port)
+    print(f"替身網站已啟動: http://{args.host}:{args.port}/zh-tw/product/<id>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
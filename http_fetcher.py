@@ -0,0 +1,101 @@
+"""不開瀏覽器的 HTTP 快速路徑
+
+以連線池化的 requests.Session 抓取商品頁，若首個 HTML 回應已內嵌商品/選項狀態
+（例如 __NEXT_DATA__ 或 window.__INIT_STATE__），直接轉成與
+navigate_through_months 相同格式的記錄；否則回傳 None 交給瀏覽器流程。
+"""
+import json
+import re
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from calendar_parser import records_from_calendar_json
+from records import OptionCatalog, make_records, to_rows
+
+TITLE_KEYS = ('title', 'name', 'pkg_name', 'package_name', 'option_name', 'prod_name')
+
+JSON_SCRIPT_PATTERN = re.compile(
+    r'<script[^>]+type=["\']application/(?:ld\+)?json["\'][^>]*>(.*?)</script>', re.S | re.I)
+WINDOW_STATE_PATTERN = re.compile(
+    r'window\.(__[A-Z0-9_]+__|[A-Za-z_]*[Ss]tate)\s*=\s*(\{.*?\})\s*;?\s*</script>', re.S)
+
+DEFAULT_HEADERS = {
+    'User-Agent': ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                   '(KHTML, like Gecko) Chrome/124.0 Safari/537.36'),
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7',
+}
+
+
+def extract_embedded_state(html):
+    """取出頁面中所有內嵌的 JSON 狀態"""
+    payloads = []
+    blobs = JSON_SCRIPT_PATTERN.findall(html) + [m[1] for m in WINDOW_STATE_PATTERN.findall(html)]
+    for blob in blobs:
+        try:
+            payloads.append(json.loads(blob))
+        except ValueError:
+            continue
+    return payloads
+
+
+def options_from_state(node):
+    """從狀態中找出 (選項標題, [(date, price, currency), ...]) 列表，以最內層帶標題且含價格日曆的節點為一個選項"""
+    if isinstance(node, list):
+        found = []
+        for child in node:
+            found.extend(options_from_state(child))
+        return found
+    if not isinstance(node, dict):
+        return []
+
+    found = []
+    for child in node.values():
+        found.extend(options_from_state(child))
+    if found:
+        return found
+
+    title = next((node[k] for k in TITLE_KEYS if isinstance(node.get(k), str) and node[k].strip()), None)
+    if title is None:
+        return []
+    records = records_from_calendar_json(node)
+    return [(title.strip(), records)] if records else []
+
+
+class HttpProductFetcher:
+    """以 keep-alive 連線池抓取商品頁並解析內嵌狀態"""
+
+    def __init__(self, pool_connections=10, pool_maxsize=4, timeout=15, retries=2):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        # pool_block=True：同一主機最多 pool_maxsize 條連線，超過時等待而非另開連線
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=True,
+            max_retries=Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch(self, url):
+        """回傳記錄列表；頁面沒有可用的內嵌狀態時回傳 None"""
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"HTTP 抓取 {url} 失敗: {e}")
+            return None
+
+        catalog = OptionCatalog()
+        records = []
+        for payload in extract_embedded_state(response.text):
+            for title, entries in options_from_state(payload):
+                records.extend(make_records(catalog.register(url, title), entries))
+        return to_rows(records, catalog) or None
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,470 @@
+"""多台主機共用的爬取工作佇列
+
+工作是 (url, 選項, 日期範圍)：選項為 None 表示整個商品。以 lease/ack 分派：
+lease() 取出的工作在 visibility_timeout 秒內不會再分給別的 worker，完成時 ack()，
+失敗時 nack() 放回佇列（超過 max_attempts 次標記為 failed）；worker 當機沒有 ack 的工作
+在租約到期後自動回到佇列。同一個 (商品編號, 選項) 只會有一筆工作；同一商品的工作
+不是一筆整個商品的工作就是各選項的工作，兩者不會同時在佇列中。
+
+後端以相同的方法介面（enqueue / enqueue_many / lease / ack / nack / extend / outstanding / stats / close）互換：
+- SqliteJobQueue: 單一主機上的多個 worker 行程共用一個 SQLite 檔
+- MemoryJobQueue: 行程內的替身，測試時取代 SQLite，可注入時鐘
+- HttpJobQueue: 連到以 serve_queue() 對外提供的佇列，讓多台主機共用
+open_queue() 依網址選擇後端：jobs.db、sqlite:///path/jobs.db、memory://、http://host:8790
+
+serve_queue() 預設只綁定 127.0.0.1；綁定其他位址時必須設定共用 token，
+用戶端以 Authorization: Bearer <token> 送出（HttpJobQueue 的 token 參數或 KKDAY_QUEUE_TOKEN 環境變數）。
+"""
+import hmac
+import json
+import os
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id TEXT NOT NULL,
+    option_index INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    crawl_window TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    enqueued_at REAL NOT NULL,
+    finished_at REAL,
+    error TEXT,
+    UNIQUE (product_id, option_index)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires);
+"""
+
+# 工作狀態
+PENDING, LEASED, DONE, FAILED = 'pending', 'leased', 'done', 'failed'
+STATUSES = (PENDING, LEASED, DONE, FAILED)
+
+# 資料庫中以 -1 表示整個商品（UNIQUE 不會比對 NULL）
+ALL_OPTIONS = -1
+
+# serve_queue / HttpJobQueue 共用 token 的環境變數
+TOKEN_ENV = 'KKDAY_QUEUE_TOKEN'
+
+LOOPBACK_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+# 計算吞吐量的時間範圍（秒）
+THROUGHPUT_WINDOW = 600
+
+
+def product_id_of(url):
+    """商品網址路徑的最後一段（與 main.product_id_from_url 相同，這裡不匯入 selenium）"""
+    return urlparse(url).path.rstrip('/').split('/')[-1]
+
+
+def _job(job_id, url, option_index, crawl_window, attempts):
+    return {
+        'job_id': job_id,
+        'url': url,
+        'product_id': product_id_of(url),
+        'option_index': None if option_index == ALL_OPTIONS else option_index,
+        'window': crawl_window,
+        'attempts': attempts,
+    }
+
+
+def _conflicts(option):
+    """與此選項互斥的工作條件：整個商品的工作與各選項的工作不能並存"""
+    return "option_index != -1" if option == ALL_OPTIONS else "option_index = -1"
+
+
+def _throughput(finished_times, now):
+    """最近 THROUGHPUT_WINDOW 秒內每分鐘完成的工作數"""
+    recent = sum(1 for t in finished_times if t is not None and t >= now - THROUGHPUT_WINDOW)
+    return round(recent * 60 / THROUGHPUT_WINDOW, 2)
+
+
+class SqliteJobQueue:
+    """以 SQLite 為後端的工作佇列；同一主機的多個行程可共用同一個檔案"""
+
+    def __init__(self, path='jobs.db', visibility_timeout=900, max_attempts=3):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # 其他行程持有寫入鎖時最多等 30 秒
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def enqueue(self, url, option_index=None, window=None, requeue=False):
+        return self.enqueue_many([(url, option_index, window)], requeue) == 1
+
+    def enqueue_many(self, jobs, requeue=False):
+        """加入 (url, 選項, 日期範圍) 工作，回傳新加入的數量
+
+        已存在的 (商品, 選項) 會略過；requeue 時把已完成或失敗的工作重新放回佇列（例如新一輪爬取）。
+        整個商品的工作與同一商品各選項的工作互斥：另一種工作還在佇列中（pending / leased）時略過，
+        都已結束時只在 requeue 時以新的工作取代。
+        """
+        now = time.time()
+        added = 0
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for url, option_index, window in jobs:
+                    option = ALL_OPTIONS if option_index is None else option_index
+                    window = str(window) if window is not None else None
+                    product_id = product_id_of(url)
+                    conflicting = [row[0] for row in self.conn.execute(
+                        f"SELECT status FROM jobs WHERE product_id = ? AND {_conflicts(option)}", (product_id,))]
+                    if conflicting:
+                        if not requeue or PENDING in conflicting or LEASED in conflicting:
+                            continue
+                        self.conn.execute(f"DELETE FROM jobs WHERE product_id = ? AND {_conflicts(option)}",
+                                          (product_id,))
+                    cursor = self.conn.execute(
+                        "INSERT OR IGNORE INTO jobs (product_id, option_index, url, crawl_window, status, enqueued_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)", (product_id, option, url, window, PENDING, now))
+                    if cursor.rowcount == 0 and requeue:
+                        cursor = self.conn.execute(
+                            "UPDATE jobs SET status = ?, attempts = 0, url = ?, crawl_window = ?, lease_owner = NULL, "
+                            "lease_expires = NULL, enqueued_at = ?, finished_at = NULL, error = NULL "
+                            "WHERE product_id = ? AND option_index = ? AND status IN (?, ?)",
+                            (PENDING, url, window, now, product_id, option, DONE, FAILED))
+                    added += cursor.rowcount
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return added
+
+    def lease(self, owner, count=1, visibility_timeout=None):
+        """取出最多 count 個工作並設定租約；租約過期的工作會重新分派"""
+        now = time.time()
+        expires = now + (visibility_timeout or self.visibility_timeout)
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 租約過期且已用完重試次數的工作不再分派
+                self.conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, error = 'lease expired' "
+                    "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                    (FAILED, now, LEASED, now, self.max_attempts))
+                rows = self.conn.execute(
+                    "SELECT job_id, url, option_index, crawl_window, attempts FROM jobs "
+                    "WHERE status = ? OR (status = ? AND lease_expires < ?) ORDER BY job_id LIMIT ?",
+                    (PENDING, LEASED, now, count)).fetchall()
+                for row in rows:
+                    self.conn.execute(
+                        "UPDATE jobs SET status = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                        "WHERE job_id = ?", (LEASED, owner, expires, row[0]))
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return [_job(job_id, url, option, window, attempts + 1) for job_id, url, option, window, attempts in rows]
+
+    def _update_leased(self, sql, params, job_id, owner):
+        # 只有仍持有租約的 worker 可以更新（租約過期後可能已分給別人）
+        with self._lock:
+            cursor = self.conn.execute(sql + " WHERE job_id = ? AND status = ? AND lease_owner = ?",
+                                       params + (job_id, LEASED, owner))
+            return cursor.rowcount == 1
+
+    def ack(self, job_id, owner):
+        """標記完成，回傳是否仍持有租約"""
+        return self._update_leased("UPDATE jobs SET status = ?, finished_at = ?, lease_owner = NULL",
+                                   (DONE, time.time()), job_id, owner)
+
+    def nack(self, job_id, owner, error=None, retry=True):
+        """放回佇列（或超過重試次數時標記失敗），回傳是否仍持有租約"""
+        with self._lock:
+            row = self.conn.execute("SELECT attempts FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        failed = not retry or row is None or row[0] >= self.max_attempts
+        return self._update_leased(
+            "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, finished_at = ?, error = ?",
+            (FAILED if failed else PENDING, time.time() if failed else None,
+             str(error) if error is not None else None), job_id, owner)
+
+    def extend(self, job_id, owner, visibility_timeout=None):
+        """延長租約（長時間的工作定期呼叫）"""
+        return self._update_leased("UPDATE jobs SET lease_expires = ?",
+                                   (time.time() + (visibility_timeout or self.visibility_timeout),), job_id, owner)
+
+    def outstanding(self, product_id):
+        """此商品尚未結束（pending / leased）的工作數"""
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM jobs WHERE product_id = ? AND status IN (?, ?)",
+                                     (str(product_id), PENDING, LEASED)).fetchone()[0]
+
+    def stats(self):
+        """各狀態的工作數與最近的吞吐量（每分鐘完成數）"""
+        now = time.time()
+        with self._lock:
+            counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            finished = [row[0] for row in self.conn.execute(
+                "SELECT finished_at FROM jobs WHERE status = ? AND finished_at >= ?", (DONE, now - THROUGHPUT_WINDOW))]
+            owners = self.conn.execute(
+                "SELECT COUNT(DISTINCT lease_owner) FROM jobs WHERE status = ? AND lease_expires >= ?",
+                (LEASED, now)).fetchone()[0]
+        stats = {status: counts.get(status, 0) for status in STATUSES}
+        stats['depth'] = stats[PENDING]
+        stats['active_workers'] = owners
+        stats['jobs_per_min'] = _throughput(finished, now)
+        return stats
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class MemoryJobQueue:
+    """行程內的工作佇列，介面與 SqliteJobQueue 相同；clock 可替換以測試租約過期"""
+
+    def __init__(self, visibility_timeout=900, max_attempts=3, clock=time.time):
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self._jobs = {}  # job_id -> dict
+        self._keys = {}  # (product_id, 選項) -> job_id
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def enqueue(self, url, option_index=None, window=None, requeue=False):
+        return self.enqueue_many([(url, option_index, window)], requeue) == 1
+
+    def enqueue_many(self, jobs, requeue=False):
+        now = self.clock()
+        added = 0
+        with self._lock:
+            for url, option_index, window in jobs:
+                key = (product_id_of(url), ALL_OPTIONS if option_index is None else option_index)
+                window = str(window) if window is not None else None
+                conflicting = [other for other in self._keys
+                               if other[0] == key[0] and (other[1] == ALL_OPTIONS) != (key[1] == ALL_OPTIONS)]
+                if conflicting:
+                    statuses = {self._jobs[self._keys[other]]['status'] for other in conflicting}
+                    if not requeue or PENDING in statuses or LEASED in statuses:
+                        continue
+                    for other in conflicting:
+                        del self._jobs[self._keys.pop(other)]
+                job_id = self._keys.get(key)
+                if job_id is not None:
+                    job = self._jobs[job_id]
+                    if not requeue or job['status'] not in (DONE, FAILED):
+                        continue
+                else:
+                    self._next_id += 1
+                    job_id = self._keys[key] = self._next_id
+                    job = self._jobs[job_id] = {'job_id': job_id, 'option_index': key[1]}
+                job.update(url=url, window=window, status=PENDING, attempts=0, lease_owner=None,
+                           lease_expires=None, enqueued_at=now, finished_at=None, error=None)
+                added += 1
+        return added
+
+    def lease(self, owner, count=1, visibility_timeout=None):
+        now = self.clock()
+        leased = []
+        with self._lock:
+            for job in sorted(self._jobs.values(), key=lambda j: j['job_id']):
+                if len(leased) >= count:
+                    break
+                expired = job['status'] == LEASED and job['lease_expires'] < now
+                if expired and job['attempts'] >= self.max_attempts:
+                    job.update(status=FAILED, finished_at=now, error='lease expired')
+                    continue
+                if job['status'] == PENDING or expired:
+                    job.update(status=LEASED, lease_owner=owner, attempts=job['attempts'] + 1,
+                               lease_expires=now + (visibility_timeout or self.visibility_timeout))
+                    leased.append(_job(job['job_id'], job['url'], job['option_index'], job['window'],
+                                       job['attempts']))
+        return leased
+
+    def _held(self, job_id, owner):
+        job = self._jobs.get(job_id)
+        if job is None or job['status'] != LEASED or job['lease_owner'] != owner:
+            return None
+        return job
+
+    def ack(self, job_id, owner):
+        with self._lock:
+            job = self._held(job_id, owner)
+            if job is None:
+                return False
+            job.update(status=DONE, finished_at=self.clock(), lease_owner=None)
+            return True
+
+    def nack(self, job_id, owner, error=None, retry=True):
+        with self._lock:
+            job = self._held(job_id, owner)
+            if job is None:
+                return False
+            failed = not retry or job['attempts'] >= self.max_attempts
+            job.update(status=FAILED if failed else PENDING, lease_owner=None, lease_expires=None,
+                       finished_at=self.clock() if failed else None,
+                       error=str(error) if error is not None else None)
+            return True
+
+    def extend(self, job_id, owner, visibility_timeout=None):
+        with self._lock:
+            job = self._held(job_id, owner)
+            if job is None:
+                return False
+            job['lease_expires'] = self.clock() + (visibility_timeout or self.visibility_timeout)
+            return True
+
+    def outstanding(self, product_id):
+        with self._lock:
+            return sum(1 for (product, _), job_id in self._keys.items()
+                       if product == str(product_id) and self._jobs[job_id]['status'] in (PENDING, LEASED))
+
+    def stats(self):
+        now = self.clock()
+        with self._lock:
+            jobs = list(self._jobs.values())
+        stats = {status: sum(1 for job in jobs if job['status'] == status) for status in STATUSES}
+        stats['depth'] = stats[PENDING]
+        stats['active_workers'] = len({job['lease_owner'] for job in jobs
+                                       if job['status'] == LEASED and job['lease_expires'] >= now})
+        stats['jobs_per_min'] = _throughput([job['finished_at'] for job in jobs if job['status'] == DONE], now)
+        return stats
+
+    def close(self):
+        pass
+
+
+# serve_queue 對外提供的方法
+REMOTE_METHODS = ('enqueue_many', 'lease', 'ack', 'nack', 'extend', 'outstanding', 'stats')
+
+
+def serve_queue(queue, port=8790, host='127.0.0.1', token=None):
+    """在背景執行緒以 HTTP 提供佇列（POST /<方法>，JSON 參數），回傳 server
+
+    指定 token 時每個請求都要帶相同的 Bearer token；綁定 loopback 以外的位址時必須指定。
+    """
+    token = token or os.environ.get(TOKEN_ENV)
+    if not token and host not in LOOPBACK_HOSTS:
+        raise ValueError(f"佇列綁定 {host} 時必須設定 token（或 {TOKEN_ENV} 環境變數）")
+    expected = f"Bearer {token}".encode('utf-8') if token else None
+
+    class QueueHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def reply(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def authorized(self):
+            if expected is None:
+                return True
+            supplied = (self.headers.get('Authorization') or '').encode('utf-8')
+            if hmac.compare_digest(supplied, expected):
+                return True
+            self.reply(401, {'error': 'unauthorized'})
+            return False
+
+        def do_GET(self):
+            if not self.authorized():
+                return
+            if self.path.split('?')[0] == '/stats':
+                self.reply(200, queue.stats())
+            else:
+                self.reply(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if not self.authorized():
+                return
+            method = self.path.strip('/')
+            if method not in REMOTE_METHODS:
+                self.reply(404, {'error': f"unknown method {method}"})
+                return
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+                kwargs = json.loads(self.rfile.read(length) or b'{}')
+                self.reply(200, {'result': getattr(queue, method)(**kwargs)})
+            except Exception as e:
+                self.reply(500, {'error': str(e)})
+
+    server = ThreadingHTTPServer((host, port), QueueHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class HttpJobQueue:
+    """serve_queue() 提供之佇列的用戶端，讓其他主機的 worker 共用同一個佇列"""
+
+    def __init__(self, base_url, timeout=30, token=None):
+        import requests
+
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        token = token or os.environ.get(TOKEN_ENV)
+        if token:
+            self.session.headers['Authorization'] = f"Bearer {token}"
+
+    def _call(self, method, **kwargs):
+        response = self.session.post(f"{self.base_url}/{method}", json=kwargs, timeout=self.timeout)
+        body = response.json()
+        if response.status_code != 200:
+            raise RuntimeError(f"佇列 {method} 失敗: {body.get('error')}")
+        return body['result']
+
+    def enqueue(self, url, option_index=None, window=None, requeue=False):
+        return self.enqueue_many([(url, option_index, window)], requeue) == 1
+
+    def enqueue_many(self, jobs, requeue=False):
+        jobs = [(url, option_index, str(window) if window is not None else None)
+                for url, option_index, window in jobs]
+        return self._call('enqueue_many', jobs=jobs, requeue=requeue)
+
+    def lease(self, owner, count=1, visibility_timeout=None):
+        return self._call('lease', owner=owner, count=count, visibility_timeout=visibility_timeout)
+
+    def ack(self, job_id, owner):
+        return self._call('ack', job_id=job_id, owner=owner)
+
+    def nack(self, job_id, owner, error=None, retry=True):
+        return self._call('nack', job_id=job_id, owner=owner,
+                          error=str(error) if error is not None else None, retry=retry)
+
+    def extend(self, job_id, owner, visibility_timeout=None):
+        return self._call('extend', job_id=job_id, owner=owner, visibility_timeout=visibility_timeout)
+
+    def outstanding(self, product_id):
+        return self._call('outstanding', product_id=product_id)
+
+    def stats(self):
+        return self._call('stats')
+
+    def close(self):
+        self.session.close()
+
+
+# 網址 scheme -> 後端；其他後端（例如 Redis）以相同介面實作後加入即可
+BACKENDS = {
+    'sqlite': lambda parsed, **kwargs: SqliteJobQueue(parsed.path or 'jobs.db', **kwargs),
+    'memory': lambda parsed, **kwargs: MemoryJobQueue(**kwargs),
+    'http': lambda parsed, **kwargs: HttpJobQueue(parsed.geturl(), token=kwargs.get('token')),
+    'https': lambda parsed, **kwargs: HttpJobQueue(parsed.geturl(), token=kwargs.get('token')),
+}
+
+
+def open_queue(spec='jobs.db', **kwargs):
+    """依網址開啟佇列；沒有 scheme 時視為 SQLite 檔案路徑"""
+    parsed = urlparse(spec)
+    if parsed.scheme not in BACKENDS:
+        return SqliteJobQueue(spec, **kwargs)
+    if parsed.scheme == 'sqlite':
+        # sqlite:///jobs.db -> jobs.db；sqlite:////abs/jobs.db -> /abs/jobs.db
+        parsed = parsed._replace(path=parsed.path[1:] if parsed.path.startswith('/') else parsed.path)
+    return BACKENDS[parsed.scheme](parsed, **kwargs)
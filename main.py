@@ -1,28 +1,207 @@
-import requests
-from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, WebDriverException
 import time
-import pandas as pd
 import random
-from webdriver_manager.chrome import ChromeDriverManager
-from fake_useragent import UserAgent
 import undetected_chromedriver as uc
 from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.common.keys import Keys
 import logging
 import concurrent.futures
+import queue
+from collections import Counter
+import threading
+from urllib.parse import urlparse
+from functools import partial
+from calendar_parser import get_backend, parse_calendar, parse_month_label, records_from_calendar_json
+from crawl_window import CrawlWindow, month_request_url, months_between
+from crawl_profiles import (DEFAULT_DELAYS, default_config_path, get_profile, load_profiles, parse_product_ids,
+                            read_url_file, resolve_urls)
+from http_fetcher import HttpProductFetcher
+from network_capture import (DEFAULT_CALENDAR_URL_PATTERN, CalendarNetworkCapture,
+                             PerformanceLogReader, enable_performance_log)
+from resource_filter import ResourceFilter, ResourceStats
+from checkpoint import CheckpointStore
+from price_history import PriceHistory, RecrawlScheduler
+from output_sinks import OutputStream, export_excel, option_part
+from records import OptionCatalog, from_row, make_records, to_rows
+from selector_cache import SelectorCache
+from metrics import Metrics
+from snapshot_store import SnapshotStore
+from browser_supervisor import BrowserSupervisor
+from resilience import AdaptiveTimeouts, CircuitBreaker, HostUnavailable, RetryQueue
+from fast_start import (DEFAULT_CACHE_DIR, clone_profile, has_profile_template, patched_driver_path,
+                        random_user_agent, save_profile_template)
+from page_snapshot import (CLICK_NEXT_MONTH_JS, CLOSE_MODAL_JS, FETCH_JSON_JS, OPTION_STEP_JS,
+                           PAGE_SNAPSHOT_JS, SCROLL_AND_CLICK_JS)
+from waits import (Pacer, calendar_state, wait_for_detached_or_hidden, wait_for_document_ready,
+                   wait_for_month_change)
+import json
+import os
+import shutil
+import socket
+import tempfile
+from datetime import date, datetime
+
+# 一次 round-trip 取得當前月份文字與日曆表格子樹，避免傳回整頁 page_source
+CALENDAR_SNAPSHOT_JS = """
+var month = document.querySelector('div.current-month');
+var tables = document.querySelectorAll('table.date-table');
+return {
+    month: month ? month.textContent.trim() : '',
+    html: Array.prototype.map.call(tables, function(t) { return t.outerHTML; }).join('')
+};
+"""
+TITLE_SELECTORS = ["span.kk-u-text-h6", "h1.product-name", "div.kk-product-name"]
+
+MODAL_SELECTORS = [
+    "div.modal-dialog",
+    "div.modal-content",
+    "div.modal",
+    "div.booking-modal",
+    "div.modal-wrapper"
+]
+
+CLOSE_BUTTON_SELECTORS = [
+    "button.modal-close",
+    "button.kk-button--ghost:not(.select-option)",
+    "button.close",
+    "i.close-icon",
+    "div.modal-close"
+]
 
 class KKdayFlightScraper:
-    def __init__(self, url):
+    def __init__(self, url, driver=None, parser_backend='auto', extraction_mode='dom',
+                 calendar_url_pattern=DEFAULT_CALENDAR_URL_PATTERN, resource_filter=None,
+                 checkpoint=None, output_stream=None, export_excel=True, catalog=None,
+                 option_concurrency=1, min_action_interval=1.0, action_jitter=0.5, selector_cache=None,
+                 headless=False, metrics=None, fast_start=False, cache_dir=None, snapshot_store=None,
+                 timeouts=None, retry_queue=None, circuit_breaker=None, crawl_window=None,
+                 option_indexes=None, delays=None, human_behavior=True, heartbeat=None, skip_months=None):
         self.url = url
+        # 無頭模式供沒有顯示器的機器（CI、基準測試）使用
+        self.headless = headless
+        # 快速啟動：使用快取的 chromedriver、設定檔範本與 User-Agent 清單
+        self.fast_start = fast_start
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        # 熱路徑（翻月、選項、彈窗）上相鄰動作的最小間隔，取代每個動作後的固定 sleep
+        self.pacer = Pacer(min_action_interval, action_jitter)
+        # 各處隨機延遲的範圍（見 crawl_profiles.DEFAULT_DELAYS）與是否模擬捲動/滑鼠；替身網站可全部關閉
+        self.delays = {**DEFAULT_DELAYS, **(delays or {})}
+        self.human_behavior = human_behavior
+        # 有選擇按鈕的頁面同時處理的選項數（每個選項一個分頁）
+        self.option_concurrency = max(1, option_concurrency)
+        self.product_id = product_id_from_url(url) if url else None
+        # 斷點紀錄（CheckpointStore），None 表示不記錄
+        self.checkpoint = checkpoint
         self.setup_logging()
-        self.setup_browser()
-        self.all_product_data = []
+        self.parse_calendar_html = get_backend(parser_backend) if isinstance(parser_backend, str) else parser_backend
+        # dom: 解析日曆表格；network: 優先讀取頁面抓取的日曆 JSON，DOM 作為備援
+        self.extraction_mode = extraction_mode
+        self.calendar_url_pattern = calendar_url_pattern
+        # 攔截圖片/字型/影片/追蹤器，None 表示不攔截
+        self.resource_filter = resource_filter
+        # 由瀏覽器池提供 driver 時不自行啟動，也不在結束時關閉
+        self.owns_driver = driver is None
+        if driver is None:
+            self.setup_browser()
+        else:
+            self.driver = driver
+        
+        self.performance_log = PerformanceLogReader(self.driver) if self.needs_performance_log() else None
+        self.resource_stats = None
+        if self.resource_filter is not None and self.resource_filter.collect_stats:
+            self.resource_stats = ResourceStats()
+            self.performance_log.subscribe(self.resource_stats.on_event)
+        self.network_capture = None
+        if extraction_mode == 'network':
+            self.setup_network_capture()
+        # 串流輸出（OutputStream）時資料列逐月寫出，不保留在記憶體
+        self.output_stream = output_stream
+        self.export_excel = export_excel
+        # 選項標題等中繼資料只存一份，PriceRecord 以 option_id 參照
+        self.catalog = catalog if catalog is not None else OptionCatalog()
+        # 記錄各頁面模板命中的標題/彈窗/關閉按鈕選擇器，命中過的優先嘗試
+        self.selector_cache = selector_cache if selector_cache is not None else SelectorCache()
+        # 頁面模板以「商品編號/頁面類型」區分，頁面類型確定之前不讀寫快取
+        self.page_template = None
+        # 各階段計時與計數（Metrics），多個爬蟲共用時可匯出整體指標
+        self.metrics = metrics if metrics is not None else Metrics()
+        # 快照庫（SnapshotStore）：保存每個月份的日曆 HTML / JSON，供離線重新解析；None 表示不保存
+        self.snapshot_store = snapshot_store
+        self.last_calendar_snapshot = None
+        self.last_calendar_payloads = None
+        # 每個選項/月份呼叫一次，讓瀏覽器看門狗知道仍有進度（BrowserSupervisor.heartbeat）
+        self.heartbeat = heartbeat
+        # 等待上限依各網站、各階段觀察到的延遲調整；失敗的選項/月份稍後重試；
+        # 同一網站連續失敗過多時斷路器開啟，停止浪費 worker 時間
+        self.host = urlparse(url).netloc if url else ''
+        self.timeouts = timeouts if timeouts is not None else AdaptiveTimeouts()
+        self.retry_queue = retry_queue if retry_queue is not None else RetryQueue()
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        self.failed_month = None
+        self.breaker_tripped = False
+        # 要收集的日期範圍（CrawlWindow 或 "next 30 days" 之類的寫法）；None 時由 run() 的 months_to_scrape 決定
+        self.crawl_window = CrawlWindow.parse(crawl_window)
+        # 排程器判定價格穩定、尚未到期重爬的月份 (年, 月)，翻頁時與範圍外的月份一樣略過
+        self.skip_months = set(skip_months or ())
+        # 只處理指定序號的選項（工作佇列以選項分派時）；None 表示全部
+        self.option_indexes = set(option_indexes) if option_indexes is not None else None
+        # 只處理部分選項時寫到各自的子分區，不覆寫同一商品其他選項工作的輸出
+        self.output_part = option_part(self.option_indexes)
+        # URL 完整處理完畢（與斷點標記完成的條件相同）
+        self.completed = False
+        self.records = []
+        self.rows_extracted = 0
+
+    def touch(self):
+        """回報仍有進度"""
+        if self.heartbeat is not None:
+            self.heartbeat()
+
+    def span(self, phase, **fields):
+        """量測一個階段的耗時，JSON 日誌附上 URL"""
+        return self.metrics.span(phase, url=self.url, **fields)
+
+    def timeout(self, phase):
+        """此網站此階段目前的等待上限（秒）"""
+        return self.timeouts.timeout(self.host, phase)
+
+    def timed_wait(self, phase, condition, poll_frequency=0.5):
+        """以自適應上限等待條件成立，並記錄實際等待時間；逾時以上限作為樣本"""
+        limit = self.timeout(phase)
+        start = time.perf_counter()
+        try:
+            result = WebDriverWait(self.driver, limit, poll_frequency=poll_frequency).until(condition)
+        except TimeoutException:
+            self.timeouts.observe(self.host, phase, limit)
+            self.metrics.inc('timeouts', wait=phase)
+            raise
+        self.timeouts.observe(self.host, phase, time.perf_counter() - start)
+        return result
+
+    def record_failure(self, option_index, month_index, error):
+        """記錄失敗的 (選項, 月份) 單位，稍後從該月份重試；同網站連續失敗過多時開啟斷路器"""
+        will_retry = self.retry_queue.add(self.url, option_index, month_index, error)
+        self.metrics.inc('unit_failures')
+        self.metrics.log_event('unit_failed', url=self.url, option=option_index, month=month_index,
+                               error=str(error), will_retry=will_retry)
+        self.host_failed()
+
+    def host_failed(self):
+        """網站的一次失敗計入斷路器；每個失敗只能在一處記錄"""
+        if self.circuit_breaker.record_failure(self.host):
+            self.metrics.inc('circuit_breaker_opened', host=self.host)
+            print(f"{self.host} 連續失敗過多，暫停 {self.circuit_breaker.cooldown} 秒")
+
+    @classmethod
+    def launch_driver(cls, **kwargs):
+        """啟動一個已套用反偵測設定的瀏覽器，供瀏覽器池重複使用"""
+        return cls(None, **kwargs).driver
 
     def setup_logging(self):
         """設置日誌系統"""
@@ -45,8 +224,25 @@ class KKdayFlightScraper:
             # 添加瀏覽器指紋隨機化
             self.add_browser_fingerprint_randomization(options)
             
+            # 網路擷取模式與資源統計需要 performance log 來讀取 Network 事件
+            if self.needs_performance_log():
+                enable_performance_log(options)
+            
+            if self.resource_filter is not None:
+                self.resource_filter.apply_options(options)
+            
+            if self.headless:
+                options.add_argument('--headless=new')
+            
             # 使用 undetected_chromedriver
-            self.driver = uc.Chrome(options=options)
+            if self.fast_start:
+                self.driver = self.launch_fast(options)
+            else:
+                self.driver = uc.Chrome(options=options)
+            
+            # 攔截重資源
+            if self.resource_filter is not None:
+                self.resource_filter.apply(self.driver)
             
             # 設置視窗大小隨機化
             self.randomize_window_size()
@@ -58,10 +254,63 @@ class KKdayFlightScraper:
             self.logger.error(f"設置瀏覽器時發生錯誤: {e}")
             raise
 
+    def launch_fast(self, options):
+        """以快取的已修補 chromedriver 與設定檔範本的複本啟動瀏覽器"""
+        driver_path = patched_driver_path(self.cache_dir)
+        if not has_profile_template(self.cache_dir):
+            self.build_profile_template(driver_path)
+        driver = uc.Chrome(options=options, driver_executable_path=driver_path,
+                           user_data_dir=clone_profile(self.cache_dir))
+        # 設定檔複本在瀏覽器關閉時由 undetected_chromedriver 刪除
+        driver.keep_user_data_dir = False
+        return driver
+
+    def build_profile_template(self, driver_path):
+        """啟動一次乾淨的瀏覽器完成首次啟動設定，關閉後保存為設定檔範本"""
+        user_data_dir = tempfile.mkdtemp(prefix='kkday-template-')
+        options = uc.ChromeOptions()
+        if self.headless:
+            options.add_argument('--headless=new')
+        try:
+            driver = uc.Chrome(options=options, driver_executable_path=driver_path, user_data_dir=user_data_dir)
+            driver.get('about:blank')
+            driver.quit()
+            save_profile_template(user_data_dir, self.cache_dir)
+        finally:
+            shutil.rmtree(user_data_dir, ignore_errors=True)
+
+    def needs_performance_log(self):
+        """是否需要開啟 performance log"""
+        return self.extraction_mode == 'network' or (
+            self.resource_filter is not None and self.resource_filter.collect_stats)
+
+    def setup_network_capture(self):
+        """設置日曆 JSON 擷取，並丟棄瀏覽器先前累積的事件"""
+        self.network_capture = CalendarNetworkCapture(self.driver, self.performance_log, self.calendar_url_pattern)
+        self.network_capture.clear()
+
+    def report_resource_stats(self):
+        """記錄本頁載入與攔截的請求數、位元組數，並重新計數"""
+        if self.resource_stats is None:
+            return None
+        self.performance_log.poll()
+        summary = self.resource_stats.summary()
+        self.logger.info(
+            f"本頁載入 {summary['requests_loaded']} 個請求（{summary['bytes_loaded'] / 1024:.0f} KB），"
+            f"攔截 {summary['requests_blocked']} 個，估計節省 {summary['bytes_saved_estimate'] / 1024:.0f} KB"
+        )
+        self.resource_stats.reset()
+        return summary
+
     def add_browser_fingerprint_randomization(self, options):
-        # 使用 fake-useragent 生成隨機 User-Agent
-        ua = UserAgent()
-        options.add_argument(f'user-agent={ua.random}')
+        # 快速啟動時從快取的清單挑選 User-Agent，否則使用 fake-useragent 生成
+        if self.fast_start:
+            user_agent = random_user_agent(self.cache_dir)
+        else:
+            from fake_useragent import UserAgent
+
+            user_agent = UserAgent().random
+        options.add_argument(f'user-agent={user_agent}')
         
         # 添加隨機語言設置
         languages = ['en-US,en;q=0.9', 'zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7']
@@ -105,27 +354,36 @@ class KKdayFlightScraper:
 
     def simulate_human_behavior(self):
         """模擬人類行為"""
-        # 隨機滾動
-        for _ in range(random.randint(2, 5)):
-            scroll_amount = random.randint(100, 700)
-            self.driver.execute_script(f"window.scrollBy(0, {scroll_amount});")
-            time.sleep(random.uniform(0.5, 2))
-            
-            # 偶爾向上滾動
-            if random.random() > 0.7:
-                self.driver.execute_script(f"window.scrollBy(0, -{scroll_amount//2});")
-                time.sleep(random.uniform(0.3, 1))
-        
-        # 隨機鼠標移動
-        if random.random() > 0.5:
-            elements = self.driver.find_elements(By.TAG_NAME, "div")
-            if elements:
-                element = random.choice(elements)
-                try:
-                    ActionChains(self.driver).move_to_element(element).perform()
+        if not self.human_behavior:
+            return
+        with self.span('human_behavior'):
+            # 隨機滾動
+            for _ in range(random.randint(2, 5)):
+                scroll_amount = random.randint(100, 700)
+                self.driver.execute_script(f"window.scrollBy(0, {scroll_amount});")
+                time.sleep(random.uniform(0.5, 2))
+            
+                # 偶爾向上滾動
+                if random.random() > 0.7:
+                    self.driver.execute_script(f"window.scrollBy(0, -{scroll_amount//2});")
                     time.sleep(random.uniform(0.3, 1))
-                except:
-                    pass
+        
+            # 隨機鼠標移動
+            if random.random() > 0.5:
+                elements = self.driver.find_elements(By.TAG_NAME, "div")
+                if elements:
+                    element = random.choice(elements)
+                    try:
+                        ActionChains(self.driver).move_to_element(element).perform()
+                        time.sleep(random.uniform(0.3, 1))
+                    except:
+                        pass
+
+    def pause(self, kind):
+        """依設定的範圍隨機延遲；範圍為 (0, 0) 時不延遲"""
+        min_delay, max_delay = self.delays[kind]
+        if max_delay > 0:
+            self.add_random_delay(min_delay, max_delay)
 
     def add_random_delay(self, min_delay=1, max_delay=3):
         """添加智能隨機延遲"""
@@ -137,28 +395,51 @@ class KKdayFlightScraper:
 
     def open_page(self):
         """打開頁面並模擬真實用戶行為"""
-        try:
-            # 添加頁面加載超時處理
-            self.driver.set_page_load_timeout(30)
-            self.driver.get(self.url)
+        with self.span('open_page'):
+            try:
+                # 頁面加載上限依觀察到的延遲調整（最長 30 秒）
+                limit = self.timeout('page_load')
+                self.driver.set_page_load_timeout(limit)
+                if self.resource_stats is not None:
+                    self.performance_log.poll()
+                    self.resource_stats.reset()
+                start = time.perf_counter()
+                try:
+                    self.driver.get(self.url)
+                except TimeoutException:
+                    self.timeouts.observe(self.host, 'page_load', limit)
+                    self.metrics.inc('timeouts', wait='page_load')
+                    raise
+                self.timeouts.observe(self.host, 'page_load', time.perf_counter() - start)
             
-            # 模擬真實用戶行為
-            self.simulate_human_behavior()
+                # 模擬真實用戶行為
+                self.simulate_human_behavior()
             
-            # 隨機等待
-            self.add_random_delay(3, 7)
+                # 隨機等待
+                self.pause('page')
             
-            self.logger.info("頁面已成功打開")
-        except Exception as e:
-            self.logger.error(f"打開頁面時發生錯誤: {e}")
-            raise
+                self.logger.info("頁面已成功打開")
+                self.report_resource_stats()
+            except WebDriverException as e:
+                # 只有載入頁面本身的失敗算是網站的問題，在這裡記錄一次
+                self.logger.error(f"打開頁面時發生錯誤: {e}")
+                self.host_failed()
+                raise HostUnavailable(f"無法打開 {self.url}: {e}") from e
+            except Exception as e:
+                self.logger.error(f"打開頁面時發生錯誤: {e}")
+                raise
+
+    def reload_page(self):
+        """重新載入頁面（重試前讓日曆回到第一個月），不重複模擬瀏覽行為"""
+        self.driver.refresh()
+        wait_for_document_ready(self.driver, timeout=self.timeout('page_load'))
 
     def click_element(self, element):
         """智能點擊元素"""
         try:
             # 先確保元素在視圖中
             self.driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", element)
-            self.add_random_delay(0.5, 1.5)
+            self.pause('click')
             
             # 隨機選擇點擊方式
             if random.random() > 0.5:
@@ -168,26 +449,42 @@ class KKdayFlightScraper:
                 # 使用 JavaScript
                 self.driver.execute_script("arguments[0].click();", element)
             
-            self.add_random_delay(0.5, 1.5)
+            self.pause('click')
             
         except Exception as e:
             self.logger.error(f"點擊元素時發生錯誤: {e}")
             raise
 
+    def page_snapshot(self):
+        """一次 round-trip 取得頁面類型、標題、選項狀態、翻月按鈕與當前月份"""
+        title_selectors = self.ordered_selectors('title', TITLE_SELECTORS)
+        started = time.perf_counter()
+        snapshot = self.driver.execute_script(PAGE_SNAPSHOT_JS, title_selectors)
+        if snapshot['pageType'] != "unknown" and self.product_id:
+            self.page_template = f"{self.product_id}/{snapshot['pageType']}"
+        if snapshot['title'] is not None:
+            self.record_selector('title', snapshot['title']['selector'], (time.perf_counter() - started) * 1000)
+        return snapshot
+
+    def ordered_selectors(self, role, selectors):
+        """依快取排序候選選擇器；頁面模板未知時維持原順序"""
+        if self.page_template is None:
+            return list(selectors)
+        return self.selector_cache.ordered(self.page_template, role, selectors)
+
+    def record_selector(self, role, selector, latency_ms):
+        """記錄命中的選擇器；頁面模板未知時不記錄，避免不同商品的結果混在一起"""
+        if self.page_template is not None:
+            self.selector_cache.record(self.page_template, role, selector, latency_ms)
+
     def get_product_info(self):
         """獲取產品基本信息"""
         try:
-            # 只獲取產品標題
-            try:
-                title_element = self.driver.find_element(By.CSS_SELECTOR, "span.kk-u-text-h6")
-                title = title_element.text
-            except:
-                try:
-                    title_element = self.driver.find_element(By.CSS_SELECTOR, "h1.product-name")
-                    title = title_element.text
-                except:
-                    title_element = self.driver.find_element(By.CSS_SELECTOR, "div.kk-product-name")
-                    title = title_element.text
+            # 只獲取產品標題，三個候選選擇器在同一段腳本中依序嘗試
+            title_match = self.page_snapshot()['title']
+            if title_match is None:
+                raise ValueError("找不到產品標題元素")
+            title = title_match['text']
             
             return {
                 "title": title if title else "未知產品",
@@ -199,36 +496,26 @@ class KKdayFlightScraper:
 
     def check_page_type(self):
         """檢查頁面類型，判斷是否直接顯示日曆"""
-        try:
-            # 檢查是否有選擇按鈕
-            select_buttons = self.driver.find_elements(By.CSS_SELECTOR, "button.kk-button.select-option")
-            if select_buttons:
-                return "has_select_button"
-            
-            # 檢查是否直接顯示日曆
-            calendar = self.driver.find_elements(By.CSS_SELECTOR, "div.option-booking")
-            if calendar:
-                return "direct_calendar"
-            
-            return "unknown"
-        except Exception as e:
-            print(f"檢查頁面類型時發生錯誤: {e}")
-            return "unknown"
+        with self.span('page_type'):
+            try:
+                # 選擇按鈕優先於直接顯示的日曆
+                return self.page_snapshot()['pageType']
+            except Exception as e:
+                print(f"檢查頁面類型時發生錯誤: {e}")
+                return "unknown"
 
     def process_with_select_button(self):
         """處理有選擇按鈕的頁面"""
         try:
             # 等待產品選項加載
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.option-head"))
-            )
+            self.timed_wait('option_head', EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.option-head")))
             
             # 模擬人類行為
             self.simulate_human_behavior()
-            self.add_random_delay(2, 4)
+            self.pause('option')
             
             # 先獲取所有產品選項
-            product_options = self.driver.find_elements(By.CSS_SELECTOR, "div.option-head")
+            product_options = self.page_snapshot()['options']
             if not product_options:
                 print("未找到產品選項")
                 return
@@ -236,264 +523,587 @@ class KKdayFlightScraper:
             total_options = len(product_options)
             print(f"找到 {total_options} 個產品選項")
             
-            for i in range(total_options):
-                try:
-                     # 添加人性化延遲
-                    self.add_random_delay(2, 4)
-                    self.logger.info(f"\n正在處理第 {i+1}/{total_options} 個產品選項")
-                    
-                    # 重新獲取最新的產品元素列表
-                    product_options = self.driver.find_elements(By.CSS_SELECTOR, "div.option-head")
-                    if i >= len(product_options):
-                        print(f"找不到第 {i+1} 個產品選項")
-                        continue
-                    
-                    current_option = product_options[i]
-                    
-                    # 模擬真實滾動行為
-                    self.driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", current_option)
-                    self.add_random_delay(1, 2)
-                    self.simulate_human_behavior()
-                
-                    
-                    # 獲取產品信息
-                    try:
-                        title_element = current_option.find_element(By.CSS_SELECTOR, "span.kk-u-text-h6")
-                        title = title_element.text
-                        product_info = {"title": title if title else "未知產品", "base_price": ""}
-                        print(f"產品標題: {product_info['title']}")
-                    except Exception as e:
-                        print(f"提取產品標題時發生錯誤: {e}")
-                        continue
-                    
-                    # 尋找並點擊選擇按鈕
-                    try:
-                        # 使用 WebDriverWait 等待按鈕可點擊
-                        select_button = WebDriverWait(current_option, 10).until(
-                            EC.element_to_be_clickable((By.CSS_SELECTOR, "button.kk-button.select-option"))
-                        )
-                        
-                        # 確保按鈕在視圖中且可點擊
-                        self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", select_button)
-                        time.sleep(1)
-                        
-                        # 使用 JavaScript 點擊按鈕
-                        self.driver.execute_script("arguments[0].click();", select_button)
-                        print("已點擊'選擇'按鈕")
-                        time.sleep(2)
-                        
-                        # 獲取日期和價格
-                        dates_prices = self.navigate_through_months(product_info)
-                        if dates_prices:
-                            self.all_product_data.extend(dates_prices)
-                        
-                        # 關閉彈窗
-                        self.close_booking_modal()
-                        time.sleep(1)  # 等待彈窗完全關閉
-                        
-                    except Exception as e:
-                        print(f"點擊選擇按鈕時發生錯誤: {e}")
-                        self.close_booking_modal()
-                        time.sleep(1)
-                        continue
-                        
-                except Exception as e:
-                    print(f"處理產品選項時發生錯誤: {e}")
+            if self.option_concurrency > 1 and total_options > 1:
+                self.process_options_in_tabs(total_options)
+                return
+            
+            for i in self.selected_options(total_options):
+                # 已完成的選項直接取用斷點資料
+                if self.restore_option(i, total_options):
                     continue
+                if not self.circuit_breaker.allow(self.host):
+                    # 剩下的選項不標記完成，斷路器恢復後再處理
+                    print(f"{self.host} 斷路器開啟，停止處理剩下的產品選項")
+                    self.breaker_tripped = True
+                    break
+                self.process_option(i, total_options)
                     
         except Exception as e:
             print(f"處理選擇按鈕頁面時發生錯誤: {e}")
 
-    def process_direct_calendar(self):
-        """處理直接顯示日曆的頁面"""
-        try:
-            # 獲取產品信息
-            product_info = self.get_product_info()
-            print(f"產品標題: {product_info['title']}")
-            print(f"基本價格: {product_info['base_price']}")
-            
-            # 直接獲取日期和價格
-            dates_prices = self.navigate_through_months(product_info)
-            if dates_prices:
-                self.all_product_data.extend(dates_prices)
-                
-        except Exception as e:
-            print(f"處理直接日曆頁面時發生錯誤: {e}")
+    def selected_options(self, total_options):
+        """要處理的選項序號"""
+        return [i for i in range(total_options) if self.option_indexes is None or i in self.option_indexes]
 
-    def extract_available_dates_and_prices(self):
-        """提取可用日期和價格"""
-        dates_prices = []
-        try:
-            # 等待日曆表格加載
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "table.date-table"))
-            )
+    def restore_option(self, i, total_options):
+        """選項在斷點中已完成時收集其資料並回傳 True"""
+        if self.checkpoint is None or not self.checkpoint.is_option_done(self.url, i):
+            return False
+        print(f"第 {i+1}/{total_options} 個產品選項已完成，略過")
+        self.collect_records([from_row(row, self.catalog, self.product_id)
+                              for row in self.checkpoint.option_rows(self.url, i)])
+        return True
+
+    def process_options_in_tabs(self, total_options):
+        """在同一個瀏覽器的多個分頁中並行處理選項，結果依選項順序合併"""
+        selected = self.selected_options(total_options)
+        completed = [i for i in selected
+                     if self.checkpoint is not None and self.checkpoint.is_option_done(self.url, i)]
+        pending = queue.Queue()
+        for i in selected:
+            if i not in completed:
+                pending.put(i)
+        
+        results = {}
+        tab_count = min(self.option_concurrency, pending.qsize())
+        print(f"以 {tab_count} 個分頁並行處理 {pending.qsize()} 個產品選項")
+        
+        def tab_worker():
+            session = attach_driver(self.driver, performance_log=self.needs_performance_log())
+            try:
+                session.switch_to.new_window('tab')
+                if self.resource_filter is not None:
+                    self.resource_filter.apply(session)
+                child = KKdayFlightScraper(self.url, driver=session, parser_backend=self.parse_calendar_html,
+                                           extraction_mode=self.extraction_mode,
+                                           calendar_url_pattern=self.calendar_url_pattern,
+                                           resource_filter=self.resource_filter,
+                                           checkpoint=self.checkpoint, catalog=self.catalog,
+                                           selector_cache=self.selector_cache, metrics=self.metrics,
+                                           snapshot_store=self.snapshot_store, timeouts=self.timeouts,
+                                           retry_queue=self.retry_queue, circuit_breaker=self.circuit_breaker,
+                                           crawl_window=self.crawl_window, delays=self.delays,
+                                           human_behavior=self.human_behavior, heartbeat=self.heartbeat,
+                                           skip_months=self.skip_months,
+                                           min_action_interval=self.pacer.min_interval,
+                                           action_jitter=self.pacer.jitter)
+                # 子分頁開的是同一個商品頁，沿用已確定的頁面模板
+                child.page_template = self.page_template
+                child.open_page()
+                child.timed_wait('option_head',
+                                 EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.option-head")))
+                while True:
+                    if not self.circuit_breaker.allow(self.host):
+                        self.breaker_tripped = True
+                        break
+                    try:
+                        i = pending.get_nowait()
+                    except queue.Empty:
+                        break
+                    child.records = []
+                    child.process_option(i, total_options)
+                    results[i] = child.records
+            finally:
+                try:
+                    session.close()
+                finally:
+                    session.quit()
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=tab_count) as executor:
+            futures = [executor.submit(tab_worker) for _ in range(tab_count)]
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"分頁處理產品選項時發生錯誤: {e}")
+        
+        # 依選項順序合併，輸出與逐一處理時相同
+        for i in selected:
+            if i in completed:
+                self.restore_option(i, total_options)
+            elif i in results:
+                # 子分頁共用同一個 metrics，擷取時已計入 rows_extracted
+                self.collect_records(results[i], counted=True)
+            elif not self.breaker_tripped:
+                print(f"第 {i+1} 個產品選項未完成，稍後重試")
+                self.record_failure(i, 0, "分頁未處理此選項")
+
+    def process_option(self, i, total_options, resume_month=0):
+        """處理第 i 個產品選項：點擊選擇、瀏覽月份（重試時從 resume_month 開始收集）、關閉彈窗"""
+        self.touch()
+        with self.span('option', option=i):
+            try:
+                # 動作間隔由點擊選擇按鈕前的 pacer 控制，這裡不再固定延遲
+                self.logger.info(f"\n正在處理第 {i+1}/{total_options} 個產品選項")
             
-            # 只添加最小延遲，不進行滾動
-            self.add_random_delay(0.5, 1)
+                # 重新獲取最新的產品選項，捲動到該選項並取得標題與選擇按鈕（一次 round-trip）
+                option = self.driver.execute_script(OPTION_STEP_JS, i)
+                if not option['found']:
+                    print(f"找不到第 {i+1} 個產品選項")
+                    self.record_failure(i, resume_month, "找不到產品選項")
+                    return
             
-            # 解析頁面內容
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
+                # 模擬真實滾動行為
+                self.simulate_human_behavior()
+        
             
-            # 找到所有可選擇的日期單元格
-            date_cells = soup.select("td.cell-date.selectable")
+                # 獲取產品信息
+                if option['title'] is None:
+                    print("提取產品標題時發生錯誤: 找不到 span.kk-u-text-h6")
+                    self.record_failure(i, resume_month, "找不到產品標題")
+                    return
+                title = option['title'] or "未知產品"
+                option_id = self.catalog.register(self.product_id, title)
+                print(f"產品標題: {title}")
             
-            # 獲取當前月份
-            current_month_elem = soup.select_one("div.current-month")
-            current_month = current_month_elem.text.strip() if current_month_elem else "未知月份"
+                # 尋找並點擊選擇按鈕
+                try:
+                    select_button = option['button']
+                    if select_button is None:
+                        raise ValueError("找不到選擇按鈕")
+                    if not option['buttonEnabled']:
+                        # 按鈕尚不可點擊時才等待
+                        self.timed_wait('select_button', EC.element_to_be_clickable(select_button))
+                    self.pacer.wait()
+                
+                    # 丟棄上一個選項留下的日曆回應
+                    if self.network_capture is not None:
+                        self.network_capture.clear()
+                
+                    # 捲動到按鈕並以 JavaScript 點擊（同一次 round-trip）
+                    self.driver.execute_script(SCROLL_AND_CLICK_JS, select_button)
+                    print("已點擊'選擇'按鈕")
+                    # 不固定等待：extract_available_dates_and_prices 會等到日曆表格出現
+                
+                    # 獲取日期和價格（逐月收集）
+                    self.navigate_through_months(option_id, option_index=i, resume_month=resume_month)
+                    if self.last_navigation_complete:
+                        self.circuit_breaker.record_success(self.host)
+                        self.retry_queue.succeeded(self.url, i)
+                        if self.checkpoint is not None:
+                            self.checkpoint.mark_option_done(self.url, i, title)
+                    else:
+                        self.record_failure(i, self.failed_month, "瀏覽月份失敗")
+                
+                    # 關閉彈窗（會等到彈窗從頁面移除）
+                    self.close_booking_modal()
+                
+                except Exception as e:
+                    print(f"點擊選擇按鈕時發生錯誤: {e}")
+                    self.record_failure(i, resume_month, e)
+                    self.close_booking_modal()
+                
+            except Exception as e:
+                print(f"處理產品選項時發生錯誤: {e}")
+                self.record_failure(i, resume_month, e)
+
+    def process_direct_calendar(self, resume_month=0):
+        """處理直接顯示日曆的頁面（重試時從 resume_month 開始收集）"""
+        self.touch()
+        with self.span('option', option=0):
+            try:
+                # 獲取產品信息
+                product_info = self.get_product_info()
+                print(f"產品標題: {product_info['title']}")
+                print(f"基本價格: {product_info['base_price']}")
+                option_id = self.catalog.register(self.product_id, product_info['title'], product_info['base_price'])
             
-            for cell in date_cells:
-                dates_prices.append({
-                    'date': f"{current_month} {cell.select_one('div.date-num').text.strip()}日",
-                    'price': cell.select_one('div.price').text.strip() if cell.select_one('div.price') else "無價格"
-                })
-                    
+                # 直接獲取日期和價格（逐月收集）
+                self.navigate_through_months(option_id, option_index=0, resume_month=resume_month)
+                if self.last_navigation_complete:
+                    self.circuit_breaker.record_success(self.host)
+                    self.retry_queue.succeeded(self.url, 0)
+                    if self.checkpoint is not None:
+                        self.checkpoint.mark_option_done(self.url, 0, product_info['title'])
+                else:
+                    self.record_failure(0, self.failed_month, "瀏覽月份失敗")
+                
+            except Exception as e:
+                print(f"處理直接日曆頁面時發生錯誤: {e}")
+                self.record_failure(0, resume_month, e)
+
+    def collect_records(self, records, counted=False):
+        """收集記錄：串流模式下立即寫出，否則保留在記憶體；counted 表示指標已由子分頁計入"""
+        self.rows_extracted += len(records)
+        if not counted:
+            self.metrics.inc('rows_extracted', len(records))
+        if self.output_stream is not None:
+            self.output_stream.write(self.product_id, to_rows(records, self.catalog), self.output_part)
+        else:
+            self.records.extend(records)
+
+    def product_rows(self):
+        """本商品的所有資料列（串流模式下從輸出分區讀回）"""
+        if self.output_stream is None:
+            return to_rows(self.records, self.catalog)
+        return list(self.output_stream.read_rows(self.product_id, self.output_part))
+
+    def extract_available_dates_and_prices(self):
+        """提取可用日期和價格，回傳 (date, price, currency) 列表"""
+        try:
+            # 等待日曆表格加載
+            self.timed_wait('calendar_table', EC.presence_of_element_located((By.CSS_SELECTOR, "table.date-table")))
+            
+            # 只取回日曆表格的 outerHTML，不解析整頁
+            snapshot = self.driver.execute_script(CALENDAR_SNAPSHOT_JS)
+            self.last_calendar_snapshot = snapshot
+            with self.span('parse'):
+                dates_prices = parse_calendar(snapshot['html'], snapshot['month'], self.parse_calendar_html)
+            if not dates_prices and snapshot['html']:
+                self.logger.warning(f"無法解析月份文字: {snapshot['month']!r}")
             return dates_prices
+        except TimeoutException:
+            # 逾時不能當成「沒有可用日期」，交給呼叫端標記此月份失敗
+            print("等待日曆表格逾時")
+            raise
         except Exception as e:
+            # 同樣不能當成沒有可用日期（否則會被存入斷點或判定為售完），交給呼叫端重試此月份
             print(f"提取日期和價格時發生錯誤: {e}")
-            return []
+            raise
+
+    def extract_month_data(self, wait_timeout=5):
+        """提取當前月份資料，網路模式優先使用日曆 JSON，沒有回應時才解析 DOM"""
+        self.last_calendar_snapshot = None
+        self.last_calendar_payloads = None
+        if self.network_capture is not None:
+            records = self.network_capture.wait_for_records(timeout=wait_timeout)
+            if records:
+                self.last_calendar_payloads = self.network_capture.payloads
+                return records
+            self.logger.info("未擷取到日曆 JSON，改用 DOM 解析")
+            self.metrics.inc('retries', kind='dom_fallback')
+        return self.extract_available_dates_and_prices()
 
-    def navigate_through_months(self, product_info, months_ahead=3):
-        """瀏覽接下來幾個月的數據"""
+    def save_snapshot(self, option_index, month_index, option_title):
+        """把剛擷取的日曆 HTML 或 JSON 存入快照庫"""
+        if self.snapshot_store is None:
+            return
+        try:
+            if self.last_calendar_payloads:
+                self.snapshot_store.save(self.product_id, option_index, month_index, 'json',
+                                         json.dumps(self.last_calendar_payloads, ensure_ascii=False),
+                                         option_title)
+            elif self.last_calendar_snapshot and self.last_calendar_snapshot['html']:
+                self.snapshot_store.save(self.product_id, option_index, month_index, 'html',
+                                         self.last_calendar_snapshot['html'], option_title,
+                                         self.last_calendar_snapshot['month'])
+        except Exception as e:
+            self.logger.warning(f"保存日曆快照時發生錯誤: {e}")
+
+    def navigate_through_months(self, option_id, window=None, option_index=0, resume_month=0):
+        """瀏覽日期範圍內各月份的數據，回傳此選項的 PriceRecord 列表
+
+        month_index 是相對於日曆開啟時第一個月份的位移。範圍外的月份只翻頁不擷取，
+        範圍結束或之後的月份已無可選日期時提前停止；網路模式下能改寫日曆 API 的月份參數時，
+        剩下的月份直接取得 JSON，不再逐月翻頁。resume_month 之前的月份只翻頁不收集（重試時這些月份已經收集過）。
+        """
+        window = window or self.crawl_window or CrawlWindow.next_months(3)
         all_dates_prices = []
+        seen_dates = set()
+        today = date.today()
+        this_month = (today.year, today.month)
+        
+        def discard_pending():
+            """丟棄不擷取之月份的日曆回應，避免下一個月份的 wait_for_records 讀到它們"""
+            if self.network_capture is not None:
+                self.network_capture.collect()
+                self.last_calendar_payloads = self.network_capture.payloads
         
-        # 獲取當前月份的數據
-        current_month_data = self.extract_available_dates_and_prices()
-        for item in current_month_data:
-            item.update(product_info)
-        all_dates_prices.extend(current_month_data)
+        def add_month_data(month_index, loader=None):
+            """收集一個月份，回傳新擷取到的原始資料；略過或取自斷點時回傳 None"""
+            self.touch()
+            if month_index < resume_month:
+                discard_pending()
+                return None
+            with self.span('month', option=option_index, month=month_index):
+                return collect_month(month_index, loader or self.extract_month_data)
         
-        # 遍歷接下來的幾個月
-        for _ in range(months_ahead):
+        def collect_month(month_index, loader):
+            # 已完成的月份直接取用斷點資料，仍需翻頁才能到達下一個月
+            stored = None
+            fresh = None
+            if self.checkpoint is not None:
+                stored = self.checkpoint.month_rows(self.url, option_index, month_index)
+            if stored is not None:
+                discard_pending()
+                month_data = [(r.date, r.price, r.currency)
+                              for r in (from_row(row, self.catalog, self.product_id) for row in stored)]
+            else:
+                fresh = loader()
+                self.save_snapshot(option_index, month_index, self.catalog.get(option_id).title)
+                month_data = window.filter(fresh)
+            
+            # 同一個 JSON 回應可能包含多個月份，跨請求時需去重
+            new_entries = [entry for entry in month_data if entry[0] not in seen_dates]
+            seen_dates.update(entry[0] for entry in new_entries)
+            added = make_records(option_id, new_entries)
+            all_dates_prices.extend(added)
+            self.collect_records(added)
+            
+            if stored is None and self.checkpoint is not None:
+                self.checkpoint.save_month(self.url, option_index, month_index,
+                                           self.catalog.get(option_id).title, to_rows(added, self.catalog))
+            return fresh
+        
+        def sold_out(year_month, fresh):
+            """本月之後的月份沒有任何可選日期時，視為已超過開放預訂的範圍"""
+            if fresh is None or year_month is None or year_month <= this_month:
+                return False
+            return not any((entry[0].year, entry[0].month) == year_month for entry in fresh)
+        
+        def fetch_directly(month_index, year_month, months):
+            """改寫日曆 API 的月份參數逐月取得 JSON，全部完成時回傳 True"""
+            template = self.calendar_request_url(year_month)
+            if template is None:
+                return False
+            for target in months:
+                url = month_request_url(template, year_month, target)
+                if url is None:
+                    return False
+                self.pacer.wait()
+                target_index = month_index + months_between(year_month, target)
+                fresh = add_month_data(target_index, partial(self.fetch_calendar_json, url))
+                self.metrics.inc('months_fetched_direct')
+                done.add(target)
+                if sold_out(target, fresh):
+                    print(f"{target[0]}年{target[1]}月沒有可選日期，不再取得之後的月份")
+                    self.metrics.inc('early_stops')
+                    return True
+            return True
+        
+        # 中途出錯時不標記選項完成並記下失敗的月份，重試或重啟後會補齊缺少的月份
+        self.last_navigation_complete = True
+        self.failed_month = None
+        covered = set()  # 網路回應涵蓋到的月份（一個回應可能包含多個月）
+        done = set(self.skip_months)  # 已收集（或尚未到期而略過）的月份
+        direct_fetch = self.network_capture is not None  # 直接取得失敗一次後，此選項剩下的月份都改為翻頁
+        month_index = 0
+        
+        try:
+            year_month = self.displayed_month()
+        except Exception as e:
+            print(f"讀取日曆月份時發生錯誤: {e}")
+            self.last_navigation_complete = False
+            self.failed_month = 0
+            return all_dates_prices
+        
+        while True:
+            if year_month is not None and window.is_after(year_month):
+                break
+            if year_month is None and month_index >= len(window.months()):
+                # 無法解析月份文字時，假設日曆從本月開始
+                break
+            
+            if year_month is not None and (window.is_before(year_month) or year_month in done):
+                # 範圍外的月份不擷取；丟棄它的日曆回應，避免算到下一個月份
+                self.metrics.inc('months_skipped')
+                discard_pending()
+            else:
+                try:
+                    fresh = add_month_data(month_index)
+                except Exception as e:
+                    print(f"提取第 {month_index+1} 個月份時發生錯誤: {e}")
+                    self.last_navigation_complete = False
+                    self.failed_month = month_index
+                    break
+                if year_month is not None:
+                    done.add(year_month)
+                if fresh is not None:
+                    covered.update((entry[0].year, entry[0].month) for entry in fresh)
+                if sold_out(year_month, fresh):
+                    print(f"{year_month[0]}年{year_month[1]}月沒有可選日期，不再瀏覽之後的月份")
+                    self.metrics.inc('early_stops')
+                    break
+            
+            if year_month is not None:
+                remaining = [m for m in window.months() if m > year_month and m not in covered | done]
+                if not remaining:
+                    # 網路回應已涵蓋所需月份，不必再翻頁
+                    break
+                if direct_fetch and month_index >= resume_month:
+                    try:
+                        if fetch_directly(month_index, year_month, remaining):
+                            break
+                    except Exception as e:
+                        print(f"直接取得月份資料失敗，此選項改為逐月翻頁: {e}")
+                        self.metrics.inc('direct_fetch_fallbacks')
+                        direct_fetch = False
+            
             try:
-                # 只添加最小延遲
-                self.add_random_delay(1, 1.5)
+                self.pacer.wait()
                 
-                # 檢查下個月按鈕
-                next_month_buttons = self.driver.find_elements(By.CSS_SELECTOR, "div.change-month.next-month")
-                if not next_month_buttons or "disabled" in next_month_buttons[0].get_attribute("class"):
+                # 檢查並點擊下個月按鈕（同一次 round-trip），等到月份文字改變或舊表格失效
+                month_index += 1
+                with self.span('month_navigation', option=option_index, month=month_index):
+                    result = self.driver.execute_script(CLICK_NEXT_MONTH_JS)
+                    if result['clicked']:
+                        self.wait_for_month_change(result['month'], result['table'])
+                if not result['clicked']:
                     print("沒有更多月份可瀏覽")
                     break
-                
-                # 簡單點擊下個月按鈕
-                next_month_button = next_month_buttons[0]
-                self.driver.execute_script("arguments[0].click();", next_month_button)
-                self.add_random_delay(1, 1.5)
-                
-                # 獲取新月份的數據
-                month_data = self.extract_available_dates_and_prices()
-                for item in month_data:
-                    item.update(product_info)
-                all_dates_prices.extend(month_data)
+                year_month = parse_month_label(calendar_state(self.driver)[0])
                 
             except Exception as e:
                 print(f"瀏覽下個月時發生錯誤: {e}")
+                self.last_navigation_complete = False
+                self.failed_month = month_index
                 break
                 
         return all_dates_prices
 
+    def displayed_month(self):
+        """等待日曆出現並回傳目前顯示的 (年, 月)，月份文字無法解析時回傳 None"""
+        self.timed_wait('calendar_table', EC.presence_of_element_located((By.CSS_SELECTOR, "table.date-table")))
+        return parse_month_label(calendar_state(self.driver)[0])
+
+    def calendar_request_url(self, year_month):
+        """最近一次擷取到、帶有 year_month 月份參數的日曆 API 網址"""
+        for url, payload in self.last_calendar_payloads or []:
+            if records_from_calendar_json(payload) and month_request_url(url, year_month, year_month):
+                return url
+        return None
+
+    def fetch_calendar_json(self, url):
+        """在頁面中直接取得日曆 JSON，回傳 (date, price, currency) 列表"""
+        self.driver.set_script_timeout(self.timeout('month_change'))
+        result = self.driver.execute_async_script(FETCH_JSON_JS, url)
+        if not result or not result.get('ok'):
+            raise RuntimeError(f"取得日曆 JSON 失敗: {result.get('error') if result else None}")
+        self.last_calendar_snapshot = None
+        self.last_calendar_payloads = [(url, result['payload'])]
+        return records_from_calendar_json(result['payload'])
+
+    def wait_for_month_change(self, old_month, old_table):
+        """以自適應上限等待翻月完成"""
+        limit = self.timeout('month_change')
+        start = time.perf_counter()
+        try:
+            wait_for_month_change(self.driver, old_month, old_table, timeout=limit)
+        except TimeoutException:
+            self.timeouts.observe(self.host, 'month_change', limit)
+            self.metrics.inc('timeouts', wait='month_change')
+            raise
+        self.timeouts.observe(self.host, 'month_change', time.perf_counter() - start)
+
+    def retry_failed_units(self, page_type):
+        """以退避重做此 URL 失敗的選項/月份；斷路器開啟時放棄剩下的單位"""
+        while True:
+            unit = self.retry_queue.pop(self.url)
+            if unit is None:
+                return
+            if not self.circuit_breaker.allow(self.host):
+                print(f"{self.host} 斷路器開啟，放棄剩下的重試")
+                self.breaker_tripped = True
+                self.retry_queue.drop(self.url)
+                return
+            option_index, month_index = unit['option_index'], unit['month_index']
+            print(f"重試第 {option_index+1} 個產品選項（從第 {month_index+1} 個月開始，已失敗 {unit['attempts']} 次）")
+            self.metrics.inc('retries', kind='unit')
+            try:
+                self.reload_page()
+                if page_type == "has_select_button":
+                    self.timed_wait('option_head',
+                                    EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.option-head")))
+                    total_options = len(self.page_snapshot()['options'])
+                    self.process_option(option_index, total_options, resume_month=month_index)
+                else:
+                    self.process_direct_calendar(resume_month=month_index)
+            except Exception as e:
+                print(f"重試時發生錯誤: {e}")
+                self.record_failure(option_index, month_index, e)
+
     def close_booking_modal(self):
         """改進的關閉預訂彈窗方法"""
-        try:
-            # 先等待一小段時間讓頁面穩定
-            self.add_random_delay(1, 2)
-            
-            # 嘗試多個可能的選擇器
-            modal_selectors = [
-                "div.modal-dialog",
-                "div.modal-content",
-                "div.modal",
-                "div.booking-modal",
-                "div.modal-wrapper"
-            ]
-            
-            modal_found = False
-            for selector in modal_selectors:
-                try:
-                    # 使用較短的超時時間來快速檢查每個選擇器
-                    modal = WebDriverWait(self.driver, 3).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-                    )
-                    modal_found = True
-                    self.logger.info(f"找到彈窗元素: {selector}")
-                    break
-                except:
-                    continue
+        with self.span('modal_close'):
+            try:
+                self.pacer.wait()
             
-            if not modal_found:
-                self.logger.warning("未找到彈窗元素，嘗試其他關閉方法")
-                # 嘗試按 ESC 鍵關閉
+                # 所有彈窗選擇器在同一段腳本中檢查，找到後立即點擊第一個可見的關閉按鈕；
+                # 每次輪詢只需一次 round-trip，最多等待 3 秒。快取中命中過的選擇器排在前面
+                modal_selectors = self.ordered_selectors('modal', MODAL_SELECTORS)
+                close_selectors = self.ordered_selectors('close', CLOSE_BUTTON_SELECTORS)
+                started = time.perf_counter()
                 try:
-                    ActionChains(self.driver).send_keys(Keys.ESCAPE).perform()
-                    self.add_random_delay(1, 2)
-                except:
-                    self.logger.warning("ESC鍵關閉失敗")
-                return
+                    result = self.timed_wait(
+                        'modal', lambda d: d.execute_script(CLOSE_MODAL_JS, modal_selectors, close_selectors),
+                        poll_frequency=0.2)
+                except TimeoutException:
+                    result = None
+                if result is not None:
+                    latency_ms = (time.perf_counter() - started) * 1000
+                    self.record_selector('modal', result['modalSelector'], latency_ms)
+                    if result['closedWith'] in close_selectors:
+                        self.record_selector('close', result['closedWith'], latency_ms)
             
-            # 嘗試找到並點擊關閉按鈕
-            close_button_selectors = [
-                "button.modal-close",
-                "button.kk-button--ghost:not(.select-option)",
-                "button.close",
-                "i.close-icon",
-                "div.modal-close"
-            ]
+                if result is None:
+                    self.logger.warning("未找到彈窗元素，嘗試其他關閉方法")
+                    # 嘗試按 ESC 鍵關閉
+                    try:
+                        ActionChains(self.driver).send_keys(Keys.ESCAPE).perform()
+                    except:
+                        self.logger.warning("ESC鍵關閉失敗")
+                    return
             
-            for selector in close_button_selectors:
-                try:
-                    close_buttons = self.driver.find_elements(By.CSS_SELECTOR, selector)
-                    if close_buttons:
-                        # 使用JavaScript點擊第一個可見的關閉按鈕
-                        for button in close_buttons:
-                            if button.is_displayed():
-                                self.driver.execute_script("arguments[0].click();", button)
-                                self.logger.info(f"成功點擊關閉按鈕: {selector}")
-                                self.add_random_delay(1, 2)
-                                return
-                except Exception as e:
-                    self.logger.warning(f"嘗試點擊關閉按鈕失敗: {selector}, {str(e)}")
-                    continue
+                self.logger.info(f"找到彈窗元素: {result['modalSelector']}")
+                if result['closedWith'] is None:
+                    self.logger.warning("找不到可點擊的關閉按鈕")
+                    return
+                if result['closedWith'] == 'outside':
+                    self.logger.info("已嘗試點擊彈窗外部關閉")
+                else:
+                    self.logger.info(f"成功點擊關閉按鈕: {result['closedWith']}")
+                if not wait_for_detached_or_hidden(self.driver, result['modal']):
+                    self.metrics.inc('timeouts', wait='modal_close')
+                    self.logger.warning("關閉後彈窗仍存在")
             
-            # 如果找不到關閉按鈕，嘗試點擊彈窗外部
-            try:
-                self.driver.execute_script("""
-                    var elements = document.getElementsByClassName('modal-dialog');
-                    if(elements.length > 0) {
-                        elements[0].parentElement.click();
-                    }
-                """)
-                self.logger.info("已嘗試點擊彈窗外部關閉")
-                self.add_random_delay(1, 2)
             except Exception as e:
-                self.logger.warning(f"點擊彈窗外部失敗: {str(e)}")
-            
-        except Exception as e:
-            self.logger.error(f"關閉彈窗時發生錯誤: {str(e)}")
-            # 如果所有方法都失敗，嘗試刷新頁面
-            try:
-                self.driver.refresh()
-                self.add_random_delay(2, 4)
-                self.logger.info("已刷新頁面")
-            except:
-                self.logger.error("刷新頁面失敗")
+                self.logger.error(f"關閉彈窗時發生錯誤: {str(e)}")
+                # 如果所有方法都失敗，嘗試刷新頁面
+                self.metrics.inc('refresh_fallbacks')
+                try:
+                    self.driver.refresh()
+                    wait_for_document_ready(self.driver)
+                    self.logger.info("已刷新頁面")
+                except:
+                    self.logger.error("刷新頁面失敗")
             
-    def save_to_excel(self, data, filename):
+    def save_results(self):
+        """保存結果：串流模式下關閉分區並從串流匯出 Excel，否則由記憶體寫 Excel
+
+        只處理部分選項時不匯出整個商品的 Excel，由所有選項工作完成後的合併步驟匯出。
+        """
+        with self.span('save'):
+            filename = product_output_filename(self.url, self.output_part)
+            if self.output_stream is None:
+                if self.export_excel:
+                    self.save_to_excel(to_rows(self.records, self.catalog), filename)
+                else:
+                    print("未設定串流輸出且停用 Excel 匯出，結果不會寫出")
+                return
+            count = self.output_stream.close_product(self.product_id, self.output_part)
+            print(f"已串流寫出 {count} 筆資料到 {self.output_stream.partition_dir(self.product_id, self.output_part)}")
+            if self.export_excel and self.output_part is None:
+                export_excel(self.output_stream.read_rows(self.product_id), filename)
+                print(f"數據已保存到 {filename}")
+
+    @staticmethod
+    def save_to_excel(data, filename):
         """保存數據到Excel"""
         if not data:
             print("沒有數據可保存")
             return
             
         try:
+            # 只有實際輸出 Excel 時才載入 pandas
+            import pandas as pd
+
+            # 日期與價格在擷取時已是 date / int，不需要再轉換
             df = pd.DataFrame(data)
             if 'title' in df.columns:
-                cols = ['title', 'date', 'price']  # 移除 base_price
+                cols = ['title', 'date', 'price']
                 df = df[cols + [c for c in df.columns if c not in cols]]
             
-            # 只處理 price 列
-            df['price'] = df['price'].replace('', '0')
-            df['price'] = pd.to_numeric(df['price'].str.replace(',', ''), errors='coerce')
-            
-            with pd.ExcelWriter(filename, engine='xlsxwriter') as writer:
+            with pd.ExcelWriter(filename, engine='xlsxwriter', date_format='yyyy-mm-dd') as writer:
                 df.to_excel(writer, sheet_name='航班價格', index=False)
                 
                 workbook = writer.book
@@ -523,76 +1133,665 @@ class KKdayFlightScraper:
         except Exception as e:
             print(f"保存Excel時發生錯誤: {e}")
 
-    def run(self, months_to_scrape=3):
-        """執行爬蟲"""
-        try:
-            self.open_page()
+    def run(self, months_to_scrape=3, window=None):
+        """執行爬蟲；window 指定日期範圍，否則收集本月與之後 months_to_scrape 個月"""
+        self.crawl_window = (CrawlWindow.parse(window) or self.crawl_window
+                             or CrawlWindow.next_months(months_to_scrape))
+        with self.span('url', product_id=self.product_id):
+            try:
+                if self.checkpoint is not None and self.checkpoint.is_url_done(self.url):
+                    print(f"{self.url} 在本次執行中已完成，略過")
+                    self.completed = True
+                    return
+                if not self.circuit_breaker.allow(self.host):
+                    print(f"{self.host} 斷路器開啟，{self.circuit_breaker.retry_after(self.host):.0f} 秒後再試")
+                    self.breaker_tripped = True
+                    return
             
-            # 檢查頁面類型
-            page_type = self.check_page_type()
-            print(f"檢測到頁面類型: {page_type}")
+                # 失敗次數只計算本次執行：清除先前執行（或被延後、重新派送的工作）留下的記錄
+                self.retry_queue.begin(self.url, self.option_indexes)
             
-            # 根據頁面類型選擇處理方式
-            if page_type == "has_select_button":
-                self.process_with_select_button()
-            elif page_type == "direct_calendar":
-                self.process_direct_calendar()
-            else:
-                print("無法識別的頁面類型")
-            
-            # 保存數據
-            if self.all_product_data:
-                url_id = self.url.rstrip('/').split('/')[-1]
-                filename = f"kkday_{url_id}.xlsx"
-                self.save_to_excel(self.all_product_data, filename)
-                print(f"共找到 {len(self.all_product_data)} 個可用日期")
-            else:
-                print("未找到任何可用日期")
+                if self.output_stream is not None:
+                    self.output_stream.open_product(self.product_id, self.output_part)
+            
+                self.open_page()
+            
+                # 檢查頁面類型
+                page_type = self.check_page_type()
+                print(f"檢測到頁面類型: {page_type}")
+                self.metrics.inc('pages', page_type=page_type)
+            
+                # 根據頁面類型選擇處理方式
+                if page_type == "has_select_button":
+                    self.process_with_select_button()
+                elif page_type == "direct_calendar":
+                    self.process_direct_calendar()
+                else:
+                    print("無法識別的頁面類型")
+
+                # URL 結束前以退避重做失敗的選項/月份，不必重爬整個 URL
+                if page_type != "unknown":
+                    self.retry_failed_units(page_type)
+            
+                # 保存數據
+                if self.rows_extracted:
+                    self.save_results()
+                    print(f"共找到 {self.rows_extracted} 個可用日期")
+                else:
+                    print("未找到任何可用日期")
+            
+                # 無法識別的頁面、重試用盡或斷路器中斷的 URL 不標記完成，以便重啟時重試
+                exhausted = self.retry_queue.exhausted_for(self.url, self.option_indexes)
+                if exhausted:
+                    print(f"{len(exhausted)} 個選項重試多次仍失敗")
+                self.completed = page_type != "unknown" and not exhausted and not self.breaker_tripped
+                if self.checkpoint is not None and self.completed and self.option_indexes is None:
+                    self.checkpoint.mark_url_done(self.url, self.rows_extracted)
                 
+            except HostUnavailable as e:
+                # open_page 已計入斷路器
+                print(f"爬蟲過程中發生錯誤: {e}")
+            except WebDriverException as e:
+                print(f"爬蟲過程中發生錯誤: {e}")
+                self.host_failed()
+            except Exception as e:
+                # 程式或設定錯誤與網站無關，不計入斷路器
+                print(f"爬蟲過程中發生錯誤: {e}")
+                self.logger.exception("爬蟲過程中發生非網站錯誤")
+            finally:
+                if self.output_stream is not None:
+                    self.output_stream.close_product(self.product_id, self.output_part)
+                if self.owns_driver:
+                    self.driver.quit()
+                    print("瀏覽器已關閉")
+
+
+def product_id_from_url(url):
+    """商品網址路徑的最後一段即為商品編號（忽略查詢字串）"""
+    return urlparse(url).path.rstrip('/').split('/')[-1]
+
+
+def product_output_filename(url, part=None):
+    """依商品網址產生輸出檔名；未串流輸出的選項工作各自寫一個檔案"""
+    suffix = f"_{part.replace('=', '')}" if part else ""
+    return f"kkday_{product_id_from_url(url)}{suffix}.xlsx"
+
+
+def attach_driver(driver, performance_log=False):
+    """透過 debuggerAddress 連到同一個 Chrome，建立可獨立控制自己分頁的工作階段
+
+    不會啟動新的 Chrome；quit() 只會結束這個工作階段，不會關閉瀏覽器。
+    """
+    address = driver.capabilities.get('goog:chromeOptions', {}).get('debuggerAddress')
+    if not address:
+        raise RuntimeError("瀏覽器未提供 debuggerAddress，無法建立分頁工作階段")
+    options = webdriver.ChromeOptions()
+    options.debugger_address = address
+    if performance_log:
+        enable_performance_log(options)
+    return webdriver.Chrome(service=Service(driver.service.path), options=options)
+
+
+def reset_driver_state(driver):
+    """清除 cookie、storage 與多餘分頁，讓下一個產品從乾淨狀態開始"""
+    handles = driver.window_handles
+    for handle in handles[1:]:
+        driver.switch_to.window(handle)
+        driver.close()
+    driver.switch_to.window(handles[0])
+
+    # 清除目前網域的 localStorage / IndexedDB / Cache Storage 等
+    parsed = urlparse(driver.current_url)
+    if parsed.scheme in ('http', 'https'):
+        driver.execute_cdp_cmd('Storage.clearDataForOrigin', {
+            'origin': f"{parsed.scheme}://{parsed.netloc}",
+            'storageTypes': 'all'
+        })
+
+    # 清除所有網域的 cookie
+    driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+    driver.get('about:blank')
+
+
+class BrowserPool:
+    """有上限的瀏覽器池，每個 worker 只需支付一次 Chrome 啟動成本"""
+
+    def __init__(self, size=3, factory=None, supervisor=None):
+        self.size = size
+        self.factory = factory or KKdayFlightScraper.launch_driver
+        # BrowserSupervisor：依頁數、記憶體、延遲決定何時回收瀏覽器，None 表示不監控
+        self.supervisor = supervisor
+        self._idle = queue.Queue()
+        self._drivers = []
+        self._lock = threading.Lock()
+        # undetected_chromedriver 啟動時會修補同一個 chromedriver 檔案，需序列化
+        self._launch_lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """取出一個閒置的瀏覽器，未達上限時才啟動新的"""
+        try:
+            return self._checked_out(self._idle.get_nowait())
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_launch = len(self._drivers) < self.size
+            if can_launch:
+                self._drivers.append(None)  # 先佔位，避免超過上限
+
+        if not can_launch:
+            return self._checked_out(self._idle.get(timeout=timeout))
+
+        try:
+            with self._launch_lock:
+                driver = self.factory()
+        except Exception:
+            with self._lock:
+                self._drivers.remove(None)
+            raise
+
+        with self._lock:
+            self._drivers[self._drivers.index(None)] = driver
+        if self.supervisor is not None:
+            self.supervisor.register(driver)
+        return self._checked_out(driver)
+
+    def _checked_out(self, driver):
+        if self.supervisor is not None:
+            self.supervisor.mark_busy(driver)
+        return driver
+
+    def heartbeat_for(self, driver):
+        """回報此瀏覽器仍有進度的函式，交給爬蟲在每個選項/月份呼叫"""
+        if self.supervisor is None:
+            return None
+        return partial(self.supervisor.heartbeat, driver)
+
+    def release(self, driver):
+        """重置瀏覽器狀態後放回池中；達到回收條件或重置失敗則丟棄，下次取用時重新啟動"""
+        if self.supervisor is not None:
+            self.supervisor.record_page(driver)
+            reason = self.supervisor.recycle_reason(driver)
+            if reason is not None:
+                self.discard(driver, reason)
+                return
+        try:
+            reset_driver_state(driver)
         except Exception as e:
-            print(f"爬蟲過程中發生錯誤: {e}")
-        finally:
-            self.driver.quit()
-            print("瀏覽器已關閉")
+            logging.getLogger(__name__).warning(f"重置瀏覽器失敗，將丟棄此瀏覽器: {e}")
+            self.discard(driver)
+            return
+        self._idle.put(driver)
+
+    def discard(self, driver, reason='broken'):
+        """關閉並移除損壞的瀏覽器，讓池可以重新啟動一個"""
+        with self._lock:
+            if driver in self._drivers:
+                self._drivers.remove(driver)
+        if self.supervisor is not None:
+            # 連同殘留的 chrome / chromedriver 行程一起清除
+            self.supervisor.retire(driver, reason)
+            return
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def close(self):
+        """關閉池中所有瀏覽器"""
+        with self._lock:
+            drivers = [d for d in self._drivers if d is not None]
+            self._drivers = []
+        for driver in drivers:
+            if self.supervisor is not None:
+                self.supervisor.retire(driver)
+                continue
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        if self.supervisor is not None:
+            self.supervisor.close()
+        print(f"已關閉 {len(drivers)} 個瀏覽器")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
 
 class KKdayMultiScraper:
-    def __init__(self, urls):
+    def __init__(self, urls, max_workers=3, parser_backend='auto', extraction_mode='dom',
+                 http_fast_path=True, resource_filter=None, checkpoint_path=None, run_id=None,
+                 history_path=None, changes_path=None, output_dir='output', output_formats=None,
+                 export_excel=True, option_concurrency=1, min_action_interval=1.0, action_jitter=0.5,
+                 selector_cache_path='selector_cache.db', headless=False,
+                 metrics_log_path='metrics.jsonl', metrics_path='metrics.prom', metrics_port=None,
+                 fast_start=False, snapshot_dir=None, max_pages_per_browser=50, max_browser_rss_mb=1500,
+                 max_unit_attempts=3, breaker_threshold=5, breaker_cooldown=300, deferred_passes=2,
+                 crawl_window=None, horizons=None, months_to_scrape=3, delays=None, human_behavior=True,
+                 timeout_defaults=None):
         self.urls = urls if isinstance(urls, list) else [urls]
+        self.max_workers = max(1, max_workers)
+        self.option_concurrency = option_concurrency
+        self.min_action_interval = min_action_interval
+        self.action_jitter = action_jitter
+        self.delays = {**DEFAULT_DELAYS, **(delays or {})}
+        self.human_behavior = human_behavior
+        self.headless = headless
+        self.fast_start = fast_start
+        self.parser_backend = parser_backend
+        self.extraction_mode = extraction_mode
+        # 多個 worker 同時爬取時頻寬成本最高，預設攔截重資源；傳入 False 可關閉
+        if resource_filter is None:
+            resource_filter = ResourceFilter()
+        self.resource_filter = resource_filter or None
+        # 指定 checkpoint_path 後，以相同 run_id 重新執行會略過已完成的 URL/選項/月份
+        self.checkpoint = CheckpointStore(checkpoint_path, run_id) if checkpoint_path else None
+        # 指定 output_formats（jsonl / csv / parquet）時逐月串流寫出，Excel 改為事後匯出
+        self.output_dir = output_dir
+        self.run_id = run_id
+        self.output_stream = OutputStream(output_dir, run_id, output_formats) if output_formats else None
+        self.export_excel = export_excel
+        # 先嘗試不開瀏覽器的 HTTP 抓取，需要時才升級到瀏覽器
+        self.http_fetcher = HttpProductFetcher(pool_maxsize=self.max_workers) if http_fast_path else None
+        self.tier_counts = Counter()
+        self._tier_lock = threading.Lock()
+        # 價格歷史：去重記錄並只輸出變動；排程器據此略過價格穩定且未到期的商品
+        self.history = PriceHistory(history_path) if history_path else None
+        self.scheduler = RecrawlScheduler(self.history) if self.history is not None else None
+        self.changes_path = changes_path or f"price_changes_{datetime.now():%Y%m%d}.jsonl"
+        self._changes_lock = threading.Lock()
+        # 所有 worker 共用的選擇器快取，跨次執行保留命中紀錄；None 表示只存在記憶體
+        self.selector_cache = SelectorCache(selector_cache_path)
+        # 各階段計時寫成 JSON 日誌；Prometheus 文字檔在每個 URL 完成後更新，也可開本地 /metrics 端點
+        self.metrics = Metrics(metrics_log_path)
+        self.metrics_path = metrics_path
+        self.metrics_port = metrics_port
+        # 指定 snapshot_dir 時保存每個月份的日曆快照，之後可用 replay.py 離線重新解析
+        self.snapshot_store = SnapshotStore(snapshot_dir, run_id) if snapshot_dir else None
+        # 瀏覽器服務 max_pages_per_browser 個商品或記憶體超過 max_browser_rss_mb 時回收
+        self.max_pages_per_browser = max_pages_per_browser
+        self.max_browser_rss_mb = max_browser_rss_mb
+        self.browser_stats = None
+        self.pool = None
+        # 所有 worker 共用自適應逾時、重試佇列與斷路器；斷路器開啟時 URL 延後到下一輪
+        self.timeouts = AdaptiveTimeouts(timeout_defaults)
+        self.retry_queue = RetryQueue(max_attempts=max_unit_attempts)
+        self.circuit_breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self.deferred_passes = deferred_passes
+        self.deferred = []
+        # 日期範圍："next 30 days"、"2026-12-20..2027-01-05" 或 CrawlWindow；horizons 以商品編號覆寫個別商品的範圍
+        self.crawl_window = CrawlWindow.parse(crawl_window) or CrawlWindow.next_months(months_to_scrape)
+        self.horizons = {product_id: CrawlWindow.parse(spec) for product_id, spec in (horizons or {}).items()}
+        self._deferred_lock = threading.Lock()
+
+    def record_tier(self, tier):
+        """記錄此產品由哪一層完成"""
+        with self._tier_lock:
+            self.tier_counts[tier] += 1
+        self.metrics.inc('products', tier=tier)
+
+    def record_history(self, url, rows):
+        """寫入價格歷史，並把本次的價格變動附加到 changes_path"""
+        if self.history is None or not rows:
+            return []
+        deltas = self.history.record(product_id_from_url(url), rows)
+        if deltas:
+            with self._changes_lock, open(self.changes_path, 'a', encoding='utf-8') as f:
+                for delta in deltas:
+                    f.write(json.dumps(delta, ensure_ascii=False) + "\n")
+        print(f"{url} 有 {len(deltas)} 筆價格新增或變動")
+        return deltas
+
+    def save_rows(self, url, rows):
+        """保存 HTTP 快速路徑取得的資料列"""
+        filename = product_output_filename(url)
+        if self.output_stream is None:
+            if self.export_excel:
+                KKdayFlightScraper.save_to_excel(rows, filename)
+            return
+        product_id = product_id_from_url(url)
+        self.output_stream.open_product(product_id)
+        self.output_stream.write(product_id, rows)
+        self.output_stream.close_product(product_id)
+        if self.export_excel:
+            export_excel(rows, filename)
+
+    def export_product(self, url):
+        """合併商品的所有選項子分區匯出 Excel（佇列中此商品的選項工作都完成後）"""
+        if self.output_stream is None or not self.export_excel:
+            return
+        filename = product_output_filename(url)
+        # 多個 worker 可能同時完成最後的工作，先寫暫存檔再換名，避免讀到寫了一半的檔案
+        temp = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            count = export_excel(self.output_stream.read_rows(product_id_from_url(url)), temp)
+            os.replace(temp, filename)
+            print(f"已合併 {count} 筆資料到 {filename}")
+        except Exception as e:
+            print(f"合併匯出 {url} 時發生錯誤: {e}")
+            if os.path.exists(temp):
+                os.remove(temp)
+
+    def write_metrics(self):
+        """更新 Prometheus 文字檔"""
+        if self.metrics_path:
+            try:
+                self.metrics.write_prometheus(self.metrics_path)
+            except OSError as e:
+                print(f"寫出指標檔時發生錯誤: {e}")
+
+    def due_urls(self):
+        """只保留依價格波動程度已到期需要重爬的 URL"""
+        if self.scheduler is None:
+            return list(self.urls)
+        due = [url for url in self.urls if self.scheduler.is_due(product_id_from_url(url))]
+        if len(due) < len(self.urls):
+            print(f"價格穩定且未到期，略過 {len(self.urls) - len(due)} 個商品")
+        return due
+
+    def window_for(self, url):
+        """此商品的日期範圍"""
+        return self.horizons.get(product_id_from_url(url)) or self.crawl_window
 
-    def scrape_url(self, url):
-        """爬取單個URL"""
+    def stable_months(self, url, window):
+        """範圍內價格穩定、依月份波動程度尚未到期重爬的 (年, 月)"""
+        if self.scheduler is None:
+            return set()
+        product_id = product_id_from_url(url)
+        months = {f"{year:04d}-{month:02d}": (year, month) for year, month in window.months()}
+        due = set(self.scheduler.due_months(product_id, list(months)))
+        return {year_month for key, year_month in months.items() if key not in due}
+
+    def pause_between_urls(self):
+        """在每個URL之間添加延遲，避免過於頻繁的請求"""
+        min_delay, max_delay = self.delays['url']
+        if max_delay > 0:
+            time.sleep(random.uniform(min_delay, max_delay))
+
+    def defer(self, url):
+        """斷路器開啟的 URL 留到下一輪"""
+        with self._deferred_lock:
+            self.deferred.append(url)
+
+    def scrape_url(self, url, window=None, option_indexes=None):
+        """爬取單個URL：先走 HTTP 快速路徑，失敗才從瀏覽器池取出瀏覽器；回傳是否完整完成
+
+        option_indexes 只處理指定的選項（此時不走 HTTP 快速路徑，它一次取得所有選項）。
+        """
         print(f"\n開始爬取 URL: {url}")
-        scraper = KKdayFlightScraper(url)
+        if self.checkpoint is not None and self.checkpoint.is_url_done(url):
+            print(f"{url} 在本次執行中已完成，略過")
+            return True
+        if not self.circuit_breaker.allow(urlparse(url).netloc):
+            print(f"{urlparse(url).netloc} 斷路器開啟，{url} 延後處理")
+            self.defer(url)
+            return False
+        
+        window = CrawlWindow.parse(window) or self.window_for(url)
+        skip_months = self.stable_months(url, window)
+        if skip_months:
+            if len(skip_months) == len(window.months()):
+                print(f"{url} 範圍內的月份價格穩定且都未到期，略過")
+                return True
+            print(f"{url} 有 {len(skip_months)} 個月份價格穩定且未到期，瀏覽時略過")
+        if self.http_fetcher is not None and option_indexes is None:
+            with self.metrics.span('http_fetch', url=url):
+                rows = self.http_fetcher.fetch(url)
+            # 內嵌狀態可能包含整個可預訂期間，只保留範圍內的日期
+            rows = [row for row in rows or [] if window.contains(row['date'])]
+            if rows:
+                print(f"HTTP 快速路徑取得 {len(rows)} 個可用日期")
+                self.save_rows(url, rows)
+                if self.checkpoint is not None:
+                    self.checkpoint.mark_url_done(url, len(rows))
+                self.record_history(url, rows)
+                self.record_tier('http')
+                self.pause_between_urls()
+                return True
+
+        self.record_tier('browser')
+        completed = False
+        driver = self.pool.acquire()
         try:
-            scraper.run(months_to_scrape=3)
+            scraper = KKdayFlightScraper(url, driver=driver, parser_backend=self.parser_backend,
+                                         extraction_mode=self.extraction_mode,
+                                         resource_filter=self.resource_filter,
+                                         checkpoint=self.checkpoint,
+                                         selector_cache=self.selector_cache,
+                                         metrics=self.metrics,
+                                         snapshot_store=self.snapshot_store,
+                                         timeouts=self.timeouts,
+                                         retry_queue=self.retry_queue,
+                                         circuit_breaker=self.circuit_breaker,
+                                         option_indexes=option_indexes,
+                                         output_stream=self.output_stream,
+                                         export_excel=self.export_excel,
+                                         option_concurrency=self.option_concurrency,
+                                         min_action_interval=self.min_action_interval,
+                                         action_jitter=self.action_jitter,
+                                         delays=self.delays,
+                                         human_behavior=self.human_behavior,
+                                         heartbeat=self.pool.heartbeat_for(driver),
+                                         skip_months=skip_months)
+            scraper.run(window=window)
+            completed = scraper.completed
+            if scraper.breaker_tripped:
+                self.defer(url)
+            if self.history is not None and scraper.rows_extracted:
+                self.record_history(url, scraper.product_rows())
         except Exception as e:
             print(f"處理 URL {url} 時發生錯誤: {e}")
         finally:
-            if hasattr(scraper, 'driver'):
-                scraper.driver.quit()
+            self.pool.release(driver)
+
+        self.pause_between_urls()
+        return completed
+
+    def open_pool(self):
+        """開啟指標端點與受監控的瀏覽器池"""
+        if self.metrics_port is not None:
+            port = self.metrics.serve(self.metrics_port)
+            print(f"指標端點: http://127.0.0.1:{port}/metrics")
+
+        factory = partial(KKdayFlightScraper.launch_driver, extraction_mode=self.extraction_mode,
+                          resource_filter=self.resource_filter, headless=self.headless,
+                          fast_start=self.fast_start)
+        supervisor = BrowserSupervisor(max_pages=self.max_pages_per_browser, max_rss_mb=self.max_browser_rss_mb,
+                                       metrics=self.metrics)
+        supervisor.start_watchdog()
+        return BrowserPool(size=self.max_workers, factory=factory, supervisor=supervisor)
+
+    def record_browser_stats(self, pool):
+        """關閉前記錄各瀏覽器的頁數、記憶體與延遲，供估算每台主機的 worker 數"""
+        if pool.supervisor is None:
+            return
+        self.browser_stats = pool.supervisor.stats()
+        self.metrics.log_event('browser_stats', **self.browser_stats)
 
     def run(self):
-        """依序執行爬蟲"""
-        print(f"開始爬取 {len(self.urls)} 個URLs")
-        
-        for url in self.urls:
-            self.scrape_url(url)
-            # 在每個URL之間添加延遲，避免過於頻繁的請求
-            time.sleep(random.uniform(3, 5))
-
-def main():
-    # 要爬取的URL列表
-    urls = [
-        "https://www.kkday.com/zh-tw/product/137240",
-        "https://www.kkday.com/zh-tw/product/139665",
-        "https://www.kkday.com/zh-tw/product/146962"
-    ]
-    
-    # 初始化多URL爬蟲器（設置同時爬取的最大URL數量為3）
-    scraper = KKdayMultiScraper(urls)
-    
-    # 執行爬蟲
+        """以 max_workers 個 worker 並行執行爬蟲"""
+        urls = self.due_urls()
+        print(f"開始爬取 {len(urls)} 個URLs（同時執行 {self.max_workers} 個）")
+
+        with self.open_pool() as pool:
+            self.pool = pool
+            for attempt in range(self.deferred_passes + 1):
+                if attempt:
+                    # 斷路器開啟而延後的 URL，等冷卻結束再處理一輪
+                    wait = max((self.circuit_breaker.retry_after(urlparse(url).netloc) for url in urls), default=0)
+                    print(f"{len(urls)} 個 URL 因斷路器延後，{wait:.0f} 秒後重試")
+                    time.sleep(wait)
+                self.deferred = []
+                with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    futures = {executor.submit(self.scrape_url, url): url for url in urls}
+                    for future in concurrent.futures.as_completed(futures):
+                        try:
+                            future.result()
+                        except Exception as e:
+                            print(f"處理 URL {futures[future]} 時發生錯誤: {e}")
+                        self.write_metrics()
+                urls = list(dict.fromkeys(self.deferred))
+                if not urls:
+                    break
+            if urls:
+                print(f"{len(urls)} 個 URL 因斷路器未能完成")
+            self.record_browser_stats(pool)
+            self.pool = None
+
+        return self.finish()
+
+    def run_queue(self, jobs, worker_id=None, idle_timeout=60, poll_interval=5, heartbeat_interval=60):
+        """從共用工作佇列（job_queue 的任一後端）持續取出工作執行，直到佇列空閒超過 idle_timeout 秒
+
+        每個工作完成時 ack，未完成時 nack 放回佇列；執行中的工作每 heartbeat_interval 秒延長租約，
+        worker 當機時租約到期，工作會分給其他 worker。idle_timeout 為 None 時持續等待新工作。
+        """
+        worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        if self.output_stream is None:
+            # 選項工作寫到各自的子分區、最後合併匯出 Excel，佇列模式一定要有可讀回的串流輸出
+            self.output_stream = OutputStream(self.output_dir, self.run_id)
+        print(f"worker {worker_id} 開始從佇列取得工作（同時執行 {self.max_workers} 個）")
+        running = {}  # future -> 工作
+        held_lock = threading.Lock()
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(heartbeat_interval):
+                with held_lock:
+                    held = [job['job_id'] for job in running.values()]
+                for job_id in held:
+                    try:
+                        jobs.extend(job_id, worker_id)
+                    except Exception as e:
+                        print(f"延長工作 {job_id} 的租約時發生錯誤: {e}")
+
+        threading.Thread(target=heartbeat, daemon=True).start()
+        idle_since = time.monotonic()
+        try:
+            with self.open_pool() as pool, \
+                    concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                self.pool = pool
+                while True:
+                    free = self.max_workers - len(running)
+                    leased = []
+                    if free > 0:
+                        try:
+                            leased = jobs.lease(worker_id, free)
+                        except Exception as e:
+                            print(f"取得工作時發生錯誤: {e}")
+                    with held_lock:
+                        for job in leased:
+                            options = None if job['option_index'] is None else [job['option_index']]
+                            running[executor.submit(self.scrape_url, job['url'], job['window'], options)] = job
+                    if not running:
+                        if idle_timeout is not None and time.monotonic() - idle_since > idle_timeout:
+                            print("佇列已空，worker 結束")
+                            break
+                        time.sleep(poll_interval)
+                        continue
+                    idle_since = time.monotonic()
+
+                    finished, _ = concurrent.futures.wait(running, timeout=poll_interval,
+                                                          return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in finished:
+                        with held_lock:
+                            job = running.pop(future)
+                        try:
+                            completed, error = future.result(), "未完成"
+                        except Exception as e:
+                            completed, error = False, e
+                        try:
+                            if completed:
+                                jobs.ack(job['job_id'], worker_id)
+                                # 此商品最後一個選項工作完成時合併各選項的輸出
+                                if job['option_index'] is not None and not jobs.outstanding(job['product_id']):
+                                    self.export_product(job['url'])
+                            else:
+                                jobs.nack(job['job_id'], worker_id, error)
+                        except Exception as e:
+                            print(f"回報工作 {job['job_id']} 結果時發生錯誤: {e}")
+                        self.metrics.inc('queue_jobs', status='done' if completed else 'retry')
+                        self.write_metrics()
+                    idle_since = time.monotonic()
+                self.record_browser_stats(pool)
+                self.pool = None
+        finally:
+            stop.set()
+
+        return self.finish()
+
+    def finish(self):
+        """關閉共用資源並輸出統計"""
+        if self.http_fetcher is not None:
+            self.http_fetcher.close()
+        if self.output_stream is not None:
+            self.output_stream.close()
+        self.selector_cache.close()
+        if self.snapshot_store is not None:
+            self.snapshot_store.close()
+        self.write_metrics()
+        self.metrics.close()
+        print(f"HTTP 快速路徑完成 {self.tier_counts['http']} 個產品，"
+              f"瀏覽器完成 {self.tier_counts['browser']} 個產品")
+        if self.browser_stats and self.browser_stats['recycles']:
+            print(f"瀏覽器回收次數: {self.browser_stats['recycles']}")
+        if self.retry_queue.exhausted:
+            print(f"{len(self.retry_queue.exhausted)} 個選項重試多次仍失敗，下次以相同 run_id 執行時補齊")
+        self.metrics.log_event('timeouts', **self.timeouts.summary())
+        return dict(self.tier_counts)
+
+DEFAULT_PRODUCT_IDS = ["137240", "139665", "146962"]
+
+
+def parse_args(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="KKday 價格爬蟲")
+    parser.add_argument('urls', nargs='*', help="商品 URL 或商品編號")
+    parser.add_argument('--urls-file', help="每行一個 URL 或商品編號的檔案")
+    parser.add_argument('--products', help="商品編號範圍，例如 137240-137260,139665")
+    parser.add_argument('--profile', default='default', help="設定檔名稱，例如 default、fixture/fast")
+    parser.add_argument('--config', default=default_config_path(), help="設定檔（.toml 或 .json）")
+    parser.add_argument('--list-profiles', action='store_true', help="列出可用的設定檔")
+    # 以下參數覆寫設定檔中的同名設定
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--window', help="日期範圍，例如 \"next 30 days\" 或 2026-12-20..2027-01-05")
+    parser.add_argument('--extraction-mode', choices=['dom', 'network'])
+    parser.add_argument('--output-dir')
+    parser.add_argument('--formats', nargs='+', dest='output_formats', help="jsonl / csv / parquet")
+    parser.add_argument('--checkpoint', dest='checkpoint_path')
+    parser.add_argument('--headless', action='store_const', const=True)
+    parser.add_argument('--metrics-port', type=int)
+    parser.add_argument('--run-id')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.list_profiles:
+        for name in sorted(load_profiles(args.config)):
+            print(name)
+        return
+
+    profile = get_profile(args.profile, args.config, workers=args.workers, window=args.window,
+                          extraction_mode=args.extraction_mode, output_dir=args.output_dir,
+                          output_formats=args.output_formats, checkpoint_path=args.checkpoint_path,
+                          headless=args.headless, metrics_port=args.metrics_port)
+    items = list(args.urls)
+    if args.urls_file:
+        items.extend(read_url_file(args.urls_file))
+    if args.products:
+        items.extend(parse_product_ids(args.products))
+    if not items:
+        items = DEFAULT_PRODUCT_IDS
+    urls = resolve_urls(profile, items)
+    print(f"設定檔 {profile.name}: {len(urls)} 個商品，{profile.workers} 個 worker，日期範圍 {profile.window}")
+
+    scraper = KKdayMultiScraper(urls, run_id=args.run_id, **profile.multi_kwargs())
     scraper.run()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
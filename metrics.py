@@ -0,0 +1,164 @@
+"""爬取各階段的計時與計數
+
+span() 量測一個階段（每個 URL、選項、月份…）的耗時，寫一行結構化 JSON 日誌並累計到直方圖；
+inc() 累計重試、逾時、重新整理等次數。結果可匯出為 Prometheus 文字格式檔案或本地 HTTP 端點。
+"""
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = 'kkday_scraper'
+
+# 直方圖的上界（秒）
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{str(v)}"' for k, v in labels) + '}'
+
+
+class Metrics:
+    """執行緒安全的階段計時與計數器；log_path 為 None 時不寫 JSON 日誌"""
+
+    def __init__(self, log_path=None, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # (phase, status) -> [各 bucket 累計次數..., 總秒數, 次數]
+        self._durations = {}
+        # (name, ((label, value), ...)) -> 次數
+        self._counters = Counter()
+        # (name, ((label, value), ...)) -> 目前值
+        self._gauges = {}
+        self._log = open(log_path, 'a', encoding='utf-8') if log_path else None
+        self._server = None
+
+    @contextmanager
+    def span(self, phase, **fields):
+        """量測 with 區塊的耗時；區塊拋出例外時 status 為 error"""
+        start = time.perf_counter()
+        status = 'ok'
+        try:
+            yield
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            self.observe(phase, time.perf_counter() - start, status, **fields)
+
+    def observe(self, phase, seconds, status='ok', **fields):
+        """記錄一個階段的耗時"""
+        with self._lock:
+            entry = self._durations.setdefault((phase, status), [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    entry[i] += 1
+            entry[-2] += seconds
+            entry[-1] += 1
+        self.log_event('span', phase=phase, status=status, duration_ms=round(seconds * 1000, 3), **fields)
+
+    def inc(self, name, amount=1, **labels):
+        """累計計數器；labels 只應使用少量固定值（如 kind、tier）"""
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += amount
+
+    def set_gauge(self, name, value, **labels):
+        """設定量測值（如瀏覽器記憶體用量），value 為 None 時移除"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if value is None:
+                self._gauges.pop(key, None)
+            else:
+                self._gauges[key] = value
+
+    def log_event(self, event, **fields):
+        """寫一行 JSON 日誌"""
+        if self._log is None:
+            return
+        line = json.dumps({'ts': datetime.now().isoformat(timespec='milliseconds'), 'event': event, **fields},
+                          ensure_ascii=False, default=str)
+        with self._lock:
+            self._log.write(line + '\n')
+            self._log.flush()
+
+    def snapshot(self):
+        """目前的計數與各階段耗時摘要"""
+        with self._lock:
+            counters = {name + _labels(labels): value for (name, labels), value in self._counters.items()}
+            gauges = {name + _labels(labels): value for (name, labels), value in self._gauges.items()}
+            phases = {f"{phase}:{status}": {'count': entry[-1], 'total_s': entry[-2],
+                                            'mean_s': entry[-2] / entry[-1] if entry[-1] else 0.0}
+                      for (phase, status), entry in self._durations.items()}
+        return {'counters': counters, 'gauges': gauges, 'phases': phases}
+
+    def prometheus_text(self):
+        """Prometheus 文字格式"""
+        lines = [f"# TYPE {PREFIX}_phase_duration_seconds histogram"]
+        with self._lock:
+            for (phase, status), entry in sorted(self._durations.items()):
+                base = (('phase', phase), ('status', status))
+                for bound, count in zip(self.buckets, entry):
+                    lines.append(f"{PREFIX}_phase_duration_seconds_bucket{_labels(base + (('le', bound),))} {count}")
+                lines.append(f"{PREFIX}_phase_duration_seconds_bucket{_labels(base + (('le', '+Inf'),))} {entry[-1]}")
+                lines.append(f"{PREFIX}_phase_duration_seconds_sum{_labels(base)} {entry[-2]:.6f}")
+                lines.append(f"{PREFIX}_phase_duration_seconds_count{_labels(base)} {entry[-1]}")
+            declared = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in declared:
+                    lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+                    declared.add(name)
+                lines.append(f"{PREFIX}_{name}_total{_labels(labels)} {value}")
+            declared = set()
+            for (name, labels), value in sorted(self._gauges.items()):
+                if name not in declared:
+                    lines.append(f"# TYPE {PREFIX}_{name} gauge")
+                    declared.add(name)
+                lines.append(f"{PREFIX}_{name}{_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """寫出 Prometheus 文字檔（供 node_exporter textfile collector 讀取），以改名確保原子性"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def serve(self, port, host='127.0.0.1'):
+        """在背景執行緒提供 /metrics 端點，回傳實際使用的 port"""
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = metrics.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server.server_address[1]
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
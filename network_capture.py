@@ -0,0 +1,109 @@
+"""透過 Chrome 效能日誌（CDP Network 事件）擷取日曆價格 JSON
+
+瀏覽器需以 goog:loggingPrefs = {'performance': 'ALL'} 啟動。
+"""
+import base64
+import json
+import re
+import time
+
+from calendar_parser import records_from_calendar_json
+
+# 預設只攔截網址含這些關鍵字的 JSON 回應
+DEFAULT_CALENDAR_URL_PATTERN = r'(calendar|sku|price|date)'
+
+
+def enable_performance_log(options):
+    """在 ChromeOptions 上開啟 performance log"""
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+
+class PerformanceLogReader:
+    """讀取 performance log 並分派給所有訂閱者
+
+    get_log('performance') 讀過即清空，所以同一個 driver 只能有一個讀取者。
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.listeners = []
+
+    def subscribe(self, callback):
+        """訂閱事件，callback(method, params)"""
+        self.listeners.append(callback)
+
+    def poll(self):
+        """讀取目前累積的事件並分派，回傳事件數量"""
+        entries = self.driver.get_log('performance')
+        for entry in entries:
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            for callback in self.listeners:
+                callback(message.get('method'), message.get('params', {}))
+        return len(entries)
+
+
+class CalendarNetworkCapture:
+    """收集日曆 JSON 回應並轉成 (date, price, currency) 記錄"""
+
+    def __init__(self, driver, reader, url_pattern=DEFAULT_CALENDAR_URL_PATTERN):
+        self.driver = driver
+        self.reader = reader
+        self.url_pattern = re.compile(url_pattern, re.IGNORECASE)
+        self._responses = {}  # requestId -> url，已收到標頭但尚未下載完成
+        self._finished = []   # (requestId, url)，可以讀取 body
+        self.payloads = []    # 最近一次 collect 解析到的原始 JSON
+        reader.subscribe(self.on_event)
+
+    def on_event(self, method, params):
+        if method == 'Network.responseReceived':
+            response = params.get('response', {})
+            if 'json' in response.get('mimeType', '') and self.url_pattern.search(response.get('url', '')):
+                self._responses[params['requestId']] = response['url']
+        elif method == 'Network.loadingFinished':
+            url = self._responses.pop(params.get('requestId'), None)
+            if url is not None:
+                self._finished.append((params['requestId'], url))
+        elif method == 'Network.loadingFailed':
+            self._responses.pop(params.get('requestId'), None)
+
+    def clear(self):
+        """丟棄目前為止的所有回應（例如切換產品選項之前）"""
+        self.reader.poll()
+        self._responses.clear()
+        self._finished.clear()
+
+    def _read_body(self, request_id):
+        body = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+        text = body.get('body', '')
+        if body.get('base64Encoded'):
+            text = base64.b64decode(text).decode('utf-8')
+        return json.loads(text)
+
+    def collect(self):
+        """讀取已完成的日曆回應，回傳 (date, price, currency) 列表（可能跨多個月份）"""
+        self.reader.poll()
+        finished, self._finished = self._finished, []
+        self.payloads = []
+        records = {}
+        for request_id, url in finished:
+            try:
+                payload = self._read_body(request_id)
+            except Exception:
+                # body 可能已被瀏覽器回收，或不是合法 JSON
+                continue
+            self.payloads.append((url, payload))
+            for entry in records_from_calendar_json(payload):
+                records.setdefault(entry[0], entry)
+        return list(records.values())
+
+    def wait_for_records(self, timeout=5, poll_interval=0.2):
+        """等待日曆回應出現，逾時回傳空列表"""
+        deadline = time.monotonic() + timeout
+        while True:
+            records = self.collect()
+            if records or time.monotonic() >= deadline:
+                return records
+            time.sleep(poll_interval)
@@ -0,0 +1,261 @@
+"""串流輸出：每個月份擷取完就附加寫入，不必等整個商品結束
+
+分區路徑為 <base_dir>/run=<run_id>/product=<product_id>/part.<ext>，
+只爬部分選項的佇列工作寫到 product=<product_id>/option=<n>/part.<ext>，
+同一商品的各選項工作互不覆寫，讀回時合併；支援 JSONL / CSV / Parquet；
+Excel 改為事後從串流以 xlsxwriter constant_memory 模式逐列匯出。
+"""
+import csv
+import glob
+import json
+import os
+import shutil
+import threading
+from datetime import date, datetime
+
+BASE_COLUMNS = ['title', 'date', 'price', 'currency']
+
+
+class JsonlSink:
+    extension = 'jsonl'
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+        # 每個月份寫完就 flush，中途當機也看得到已擷取的資料
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class CsvSink:
+    extension = 'csv'
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8-sig', newline='')
+        self.writer = None
+
+    def write(self, rows):
+        if not rows:
+            return
+        if self.writer is None:
+            extra = [key for key in rows[0] if key not in BASE_COLUMNS]
+            self.writer = csv.DictWriter(self.file, fieldnames=BASE_COLUMNS + extra, extrasaction='ignore')
+            self.writer.writeheader()
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink:
+    """累積到 row_group_size 筆才寫出一個 row group，避免產生大量小 row group"""
+    extension = 'parquet'
+
+    def __init__(self, path, row_group_size=5000):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ImportError("Parquet 輸出需要安裝 pyarrow") from e
+        self.path = path
+        self.row_group_size = row_group_size
+        self.buffer = []
+        self.writer = None
+
+    def write(self, rows):
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self.buffer:
+            return
+        # 標準欄位使用固定 schema，避免第一批價格全為 None 時被推斷成 null 型別
+        schema = None
+        if set(self.buffer[0]) == set(BASE_COLUMNS):
+            schema = pa.schema([('title', pa.string()), ('date', pa.date32()),
+                                ('price', pa.int64()), ('currency', pa.string())])
+        table = pa.Table.from_pylist(self.buffer, schema=schema)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        else:
+            table = table.cast(self.writer.schema)
+        self.writer.write_table(table)
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+
+
+SINKS = {sink.extension: sink for sink in (JsonlSink, CsvSink, ParquetSink)}
+
+OPTION_PART_PREFIX = 'option='
+
+
+def option_part(option_indexes):
+    """只爬部分選項時的子分區名稱，例如 option=2；整個商品時回傳 None"""
+    if option_indexes is None:
+        return None
+    return OPTION_PART_PREFIX + '_'.join(str(i) for i in sorted(option_indexes))
+
+
+class OutputStream:
+    """依商品與執行批次分區的串流輸出，可供多個 worker 同時使用"""
+
+    def __init__(self, base_dir='output', run_id=None, formats=('jsonl',)):
+        unknown = set(formats) - set(SINKS)
+        if unknown:
+            raise ValueError(f"未知的輸出格式: {', '.join(sorted(unknown))}")
+        self.base_dir = base_dir
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d')
+        self.formats = tuple(formats)
+        self._open = {}  # (product_id, part) -> [sink, ...]
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def partition_dir(self, product_id, part=None):
+        path = os.path.join(self.base_dir, f"run={self.run_id}", f"product={product_id}")
+        return os.path.join(path, part) if part else path
+
+    def partition_path(self, product_id, extension, part=None):
+        return os.path.join(self.partition_dir(product_id, part), f"part.{extension}")
+
+    def option_parts(self, product_id):
+        """此商品已寫出的選項子分區"""
+        pattern = os.path.join(glob.escape(self.partition_dir(product_id)), OPTION_PART_PREFIX + '*')
+        return sorted(os.path.basename(path) for path in glob.glob(pattern) if os.path.isdir(path))
+
+    def open_product(self, product_id, part=None):
+        """開始一個商品（或其選項子分區）；重新爬取時覆寫該分區，避免續傳時重複寫入
+
+        整個商品重新爬取時也移除各選項的子分區，讀回時才不會重複。
+        """
+        self.close_product(product_id, part)
+        if part is None:
+            for option in self.option_parts(product_id):
+                shutil.rmtree(self.partition_dir(product_id, option), ignore_errors=True)
+        os.makedirs(self.partition_dir(product_id, part), exist_ok=True)
+        sinks = [SINKS[fmt](self.partition_path(product_id, fmt, part)) for fmt in self.formats]
+        with self._lock:
+            self._open[product_id, part] = sinks
+            self._counts[product_id, part] = 0
+
+    def write(self, product_id, rows, part=None):
+        """附加寫入一批資料列（通常是一個月份）"""
+        with self._lock:
+            sinks = self._open.get((product_id, part))
+            if sinks is None:
+                raise RuntimeError(f"商品 {product_id} 的輸出尚未開啟")
+            for sink in sinks:
+                sink.write(rows)
+            self._counts[product_id, part] += len(rows)
+
+    def close_product(self, product_id, part=None):
+        """關閉商品分區，回傳寫入的資料列數"""
+        with self._lock:
+            sinks = self._open.pop((product_id, part), [])
+            count = self._counts.pop((product_id, part), 0)
+        for sink in sinks:
+            sink.close()
+        return count
+
+    def _readable_format(self):
+        for fmt in ('jsonl', 'csv'):
+            if fmt in self.formats:
+                return fmt
+        raise ValueError("讀回資料需要 jsonl 或 csv 輸出格式")
+
+    def read_rows(self, product_id, part=None):
+        """從 JSONL 或 CSV 分區逐列讀回資料；未指定 part 時合併整個商品與各選項的子分區"""
+        fmt = self._readable_format()
+        if part is not None:
+            return read_rows(self.partition_path(product_id, fmt, part))
+        paths = [self.partition_path(product_id, fmt, option) for option in [None] + self.option_parts(product_id)]
+        return read_many([path for path in paths if os.path.exists(path)])
+
+    def close(self):
+        for product_id, part in list(self._open):
+            self.close_product(product_id, part)
+
+
+def read_rows(path):
+    """逐列讀取 JSONL / CSV 檔（generator，不會一次載入全部）"""
+    if path.endswith('.jsonl'):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif path.endswith('.csv'):
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            yield from csv.DictReader(f)
+    else:
+        raise ValueError(f"不支援讀取的格式: {path}")
+
+
+def read_many(paths):
+    """依序讀取多個分區檔"""
+    for path in paths:
+        yield from read_rows(path)
+
+
+def export_excel(rows, filename):
+    """以 xlsxwriter constant_memory 模式逐列寫出 Excel，回傳寫入的列數"""
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(filename, {'constant_memory': True})
+    worksheet = workbook.add_worksheet('航班價格')
+    header_format = workbook.add_format({
+        'bold': True,
+        'text_wrap': True,
+        'valign': 'top',
+        'bg_color': '#D7E4BC',
+        'border': 1
+    })
+    price_format = workbook.add_format({'num_format': '#,##0'})
+    date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
+
+    worksheet.set_column('A:A', 40)  # 標題列
+    worksheet.set_column('B:B', 20, date_format)  # 日期列
+    worksheet.set_column('C:C', 12, price_format)  # 價格列
+    # constant_memory 模式只能依序寫入，凍結窗格須在寫入資料前設定
+    worksheet.freeze_panes(1, 0)
+
+    columns = None
+    count = 0
+    for row in rows:
+        if columns is None:
+            columns = BASE_COLUMNS + [key for key in row if key not in BASE_COLUMNS]
+            for col_num, value in enumerate(columns):
+                worksheet.write(0, col_num, value, header_format)
+        count += 1
+        for col_num, key in enumerate(columns):
+            value = row.get(key, "")
+            if key == 'date':
+                # 從 JSONL / CSV 讀回時是 ISO 字串
+                if isinstance(value, str):
+                    value = date.fromisoformat(value[:10])
+                worksheet.write_datetime(count, col_num, value, date_format)
+            elif value is None or value == "":
+                worksheet.write_blank(count, col_num, None)
+            elif key == 'price':
+                # 從 CSV 讀回時是字串，轉成數字才能套用千分位格式與排序
+                worksheet.write_number(count, col_num, int(float(value)), price_format)
+            else:
+                worksheet.write(count, col_num, value)
+
+    if columns is not None:
+        worksheet.autofilter(0, 0, count, len(columns) - 1)
+    workbook.close()
+    return count
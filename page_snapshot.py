@@ -0,0 +1,118 @@
+"""批次 JS 查詢：每個步驟只用一次 execute_script 取得所需的頁面狀態
+
+每次 find_element / get_attribute / is_displayed 都是一次到 chromedriver 的
+HTTP round-trip；這裡把同一步驟需要的查詢與點擊合併成一段腳本並回傳 JSON。
+"""
+
+# 共用的可見性判斷（近似 Selenium 的 is_displayed）
+_VISIBLE_JS = """
+function visible(el) {
+    if (!el || !(el.offsetWidth || el.offsetHeight || el.getClientRects().length)) return false;
+    var style = window.getComputedStyle(el);
+    return style.visibility !== 'hidden' && style.display !== 'none';
+}
+"""
+
+# arguments[0]: 商品標題的候選選擇器（依序嘗試）
+PAGE_SNAPSHOT_JS = _VISIBLE_JS + """
+var titleSelectors = arguments[0] || [];
+var title = null;
+for (var i = 0; i < titleSelectors.length; i++) {
+    var el = document.querySelector(titleSelectors[i]);
+    if (el) { title = {selector: titleSelectors[i], text: el.innerText.trim()}; break; }
+}
+var options = Array.prototype.map.call(document.querySelectorAll('div.option-head'), function(head) {
+    var t = head.querySelector('span.kk-u-text-h6');
+    var b = head.querySelector('button.kk-button.select-option');
+    return {title: t ? t.innerText.trim() : '', hasSelect: !!b, selectEnabled: !!b && !b.disabled && visible(b)};
+});
+var pageType = 'unknown';
+if (document.querySelector('button.kk-button.select-option')) pageType = 'has_select_button';
+else if (document.querySelector('div.option-booking')) pageType = 'direct_calendar';
+var next = document.querySelector('div.change-month.next-month');
+var month = document.querySelector('div.current-month');
+return {
+    pageType: pageType,
+    title: title,
+    options: options,
+    nextMonth: {exists: !!next, disabled: !!next && next.classList.contains('disabled')},
+    currentMonth: month ? month.textContent.trim() : ''
+};
+"""
+
+# arguments[0]: 選項序號；捲動到該選項並回傳標題與選擇按鈕
+OPTION_STEP_JS = _VISIBLE_JS + """
+var heads = document.querySelectorAll('div.option-head');
+var head = heads[arguments[0]];
+if (!head) return {found: false, count: heads.length};
+head.scrollIntoView({behavior: 'smooth', block: 'center'});
+var t = head.querySelector('span.kk-u-text-h6');
+var b = head.querySelector('button.kk-button.select-option');
+return {
+    found: true,
+    count: heads.length,
+    title: t ? t.innerText.trim() : null,
+    button: b,
+    buttonEnabled: !!b && !b.disabled && visible(b)
+};
+"""
+
+# arguments[0]: 元素；捲動到畫面中央並點擊
+SCROLL_AND_CLICK_JS = """
+arguments[0].scrollIntoView({block: 'center'});
+arguments[0].click();
+"""
+
+# 檢查下個月按鈕，可用時記下目前月份與表格後點擊
+CLICK_NEXT_MONTH_JS = """
+var next = document.querySelector('div.change-month.next-month');
+if (!next) return {clicked: false, reason: 'missing'};
+if (next.classList.contains('disabled')) return {clicked: false, reason: 'disabled'};
+var month = document.querySelector('div.current-month');
+var result = {
+    clicked: true,
+    month: month ? month.textContent.trim() : '',
+    table: document.querySelector('table.date-table')
+};
+next.click();
+return result;
+"""
+
+# arguments[0]: 彈窗選擇器；arguments[1]: 關閉按鈕選擇器
+# 找到第一個存在的彈窗後，點擊第一個可見的關閉按鈕，都沒有時點擊彈窗外部
+CLOSE_MODAL_JS = _VISIBLE_JS + """
+var modalSelectors = arguments[0], closeSelectors = arguments[1];
+var modal = null, modalSelector = null;
+for (var i = 0; i < modalSelectors.length; i++) {
+    modal = document.querySelector(modalSelectors[i]);
+    if (modal) { modalSelector = modalSelectors[i]; break; }
+}
+if (!modal) return null;
+for (var j = 0; j < closeSelectors.length; j++) {
+    var buttons = document.querySelectorAll(closeSelectors[j]);
+    for (var k = 0; k < buttons.length; k++) {
+        if (visible(buttons[k])) {
+            buttons[k].click();
+            return {modal: modal, modalSelector: modalSelector, closedWith: closeSelectors[j]};
+        }
+    }
+}
+var dialogs = document.getElementsByClassName('modal-dialog');
+if (dialogs.length > 0) {
+    dialogs[0].parentElement.click();
+    return {modal: modal, modalSelector: modalSelector, closedWith: 'outside'};
+}
+return {modal: modal, modalSelector: modalSelector, closedWith: null};
+"""
+
+# execute_async_script 用；arguments[0]: 網址。以頁面的 cookie 直接取得日曆 JSON，不必翻頁
+FETCH_JSON_JS = """
+var done = arguments[arguments.length - 1];
+fetch(arguments[0], {credentials: 'include'})
+    .then(function(r) {
+        if (!r.ok) throw new Error('HTTP ' + r.status);
+        return r.json();
+    })
+    .then(function(payload) { done({ok: true, payload: payload}); })
+    .catch(function(e) { done({ok: false, error: String(e)}); });
+"""
@@ -0,0 +1,290 @@
+"""跨商品、跨批次的價格分析
+
+資料集沿用 OutputStream 的分區目錄 <root>/run=<run_id>/product=<product_id>/part.parquet
+（hive 分區，run 與 product 由路徑提供）；只有 JSONL/CSV 的分區可先以 consolidate() 補上 Parquet。
+查詢以 pyarrow 依分區過濾後載入 pandas，所有彙總都是向量化的 groupby / pivot / merge。
+常用的彙總由 AnalyticsCache 依資料集指紋快取成 Parquet，資料沒有變動時直接讀取。
+
+用法: python price_analytics.py --root output consolidate
+      python price_analytics.py --root output min [--by title] [--run 20261018]
+      python price_analytics.py --root output matrix --product 137240
+      python price_analytics.py --root output percentiles
+      python price_analytics.py --root output wow [--days 7]
+      python price_analytics.py --root output precompute
+"""
+import argparse
+import glob
+import hashlib
+import os
+from datetime import date
+
+from output_sinks import ParquetSink, read_rows
+
+PARTITION_GLOB = os.path.join('run=*', 'product=*')
+# 佇列的選項工作寫在商品分區下的 option=<n> 子分區
+PARTITION_GLOBS = (PARTITION_GLOB, os.path.join(PARTITION_GLOB, 'option=*'))
+DEFAULT_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+
+def partitions(root):
+    return sorted(path for pattern in PARTITION_GLOBS for path in glob.glob(os.path.join(root, pattern))
+                  if os.path.isdir(path))
+
+
+def partition_files(root, extension='parquet'):
+    return [path for path in (os.path.join(partition, f'part.{extension}') for partition in partitions(root))
+            if os.path.exists(path)]
+
+
+def _normalize_row(row):
+    """JSONL/CSV 讀回的日期與價格是字串，轉回 Parquet schema 的型別"""
+    price = row.get('price')
+    return {
+        'title': row.get('title') or "",
+        'date': row['date'] if isinstance(row['date'], date) else date.fromisoformat(str(row['date'])[:10]),
+        'price': int(float(price)) if price not in (None, '') else None,
+        'currency': row.get('currency') or "",
+    }
+
+
+def consolidate(root='output'):
+    """為只有 JSONL/CSV（或 Parquet 較舊）的分區寫出 part.parquet，回傳轉換的分區數"""
+    converted = 0
+    for partition in partitions(root):
+        parquet_path = os.path.join(partition, 'part.parquet')
+        sources = [os.path.join(partition, f'part.{ext}') for ext in ('jsonl', 'csv')]
+        sources = [path for path in sources if os.path.exists(path)]
+        if not sources:
+            continue
+        if os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(sources[0]):
+            continue
+        sink = ParquetSink(parquet_path)
+        sink.write(_normalize_row(row) for row in read_rows(sources[0]))
+        sink.close()
+        converted += 1
+    return converted
+
+
+def fingerprint(root):
+    """資料集指紋（所有 Parquet 分區的路徑、大小與修改時間）"""
+    digest = hashlib.sha1()
+    for path in partition_files(root):
+        stat = os.stat(path)
+        digest.update(f"{os.path.relpath(path, root)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load(root='output', runs=None, products=None, include_replays=False):
+    """載入資料集為 DataFrame：run, run_date, product_id, title, date, price, currency
+
+    runs / products 會下推到分區過濾，只讀取需要的檔案；replay.py 產生的 replay-* 批次預設不納入。
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    files = partition_files(root)
+    columns = ['run', 'run_date', 'product_id', 'title', 'date', 'price', 'currency']
+    if not files:
+        return pd.DataFrame(columns=columns)
+    # 商品編號是數字時 pyarrow 會推斷成整數，固定為字串
+    partitioning = ds.partitioning(pa.schema([('run', pa.string()), ('product', pa.string())]), flavor='hive')
+    dataset = ds.dataset(files, format='parquet', partitioning=partitioning, partition_base_dir=root)
+    condition = None
+    if runs is not None:
+        condition = ds.field('run').isin(list(runs))
+    if products is not None:
+        product_filter = ds.field('product').isin([str(p) for p in products])
+        condition = product_filter if condition is None else condition & product_filter
+    if not include_replays:
+        replay_filter = ~pc.starts_with(ds.field('run'), 'replay-')
+        condition = replay_filter if condition is None else condition & replay_filter
+    table = dataset.to_table(columns=['run', 'product', 'title', 'date', 'price', 'currency'], filter=condition)
+
+    df = table.to_pandas()
+    df = df.rename(columns={'product': 'product_id'})
+    df['date'] = pd.to_datetime(df['date'])
+    df['price'] = df['price'].astype('Int64').astype('float64')
+    # 批次編號通常是 20261018 或 2026-10-18
+    df['run_date'] = pd.to_datetime(df['run'].str.replace('-', '', regex=False).str[:8],
+                                    format='%Y%m%d', errors='coerce')
+    for column in ('run', 'product_id', 'title', 'currency'):
+        df[column] = df[column].astype('category')
+    return df[columns]
+
+
+def latest_runs(df):
+    """依批次日期（無法解析時依名稱）排序的批次列表"""
+    runs = df[['run', 'run_date']].drop_duplicates('run')
+    return list(runs.sort_values(['run_date', 'run'], na_position='first')['run'].astype(str))
+
+
+def latest(df):
+    """只保留最新一批"""
+    runs = latest_runs(df)
+    return df[df['run'] == runs[-1]] if runs else df
+
+
+def min_prices(df, by=('product_id',)):
+    """每組（預設每個商品）的最低價格與其日期、選項；by=('title',) 可跨商品找出每條路線最便宜的日期"""
+    by = list(by)
+    priced = df.dropna(subset=['price'])
+    if priced.empty:
+        return priced[by + ['title', 'date', 'price', 'currency']]
+    index = priced.groupby(by, observed=True)['price'].idxmin()
+    result = priced.loc[index.values, list(dict.fromkeys(by + ['product_id', 'title', 'date', 'price', 'currency']))]
+    counts = priced.groupby(by, observed=True)['price'].agg(['count', 'median'])
+    result = result.merge(counts, left_on=by, right_index=True, how='left')
+    return result.rename(columns={'count': 'priced_dates', 'median': 'median_price'}).reset_index(drop=True)
+
+
+def price_matrix(df, product_id=None):
+    """日曆價格矩陣：列為選項（未指定商品時為 商品 × 選項），欄為日期"""
+    if product_id is not None:
+        df = df[df['product_id'] == str(product_id)]
+        index = 'title'
+    else:
+        index = ['product_id', 'title']
+    return df.pivot_table(index=index, columns='date', values='price', aggfunc='min', observed=True)
+
+
+def percentiles(df, by=('product_id',), quantiles=DEFAULT_QUANTILES):
+    """每組的價格百分位數與平均"""
+    by = list(by)
+    grouped = df.dropna(subset=['price']).groupby(by, observed=True)['price']
+    result = grouped.quantile(list(quantiles)).unstack()
+    result.columns = [f"p{round(q * 100)}" for q in result.columns]
+    result['mean'] = grouped.mean()
+    result['count'] = grouped.count()
+    return result.reset_index()
+
+
+def week_over_week(df, days=7):
+    """最新一批與 days 天前（或更早最接近的一批）比較，回傳價格有變動的 (商品, 選項, 日期)"""
+    import pandas as pd
+
+    dated = df.dropna(subset=['run_date'])
+    if dated.empty:
+        return pd.DataFrame(columns=['product_id', 'title', 'date', 'price', 'previous_price', 'delta', 'pct_change'])
+    current_date = dated['run_date'].max()
+    previous = dated[dated['run_date'] <= current_date - pd.Timedelta(days=days)]
+    if previous.empty:
+        return pd.DataFrame(columns=['product_id', 'title', 'date', 'price', 'previous_price', 'delta', 'pct_change'])
+    previous = previous[previous['run_date'] == previous['run_date'].max()]
+    current = dated[dated['run_date'] == current_date]
+
+    keys = ['product_id', 'title', 'date']
+    # category 欄位合併前轉回字串，避免兩邊類別不同
+    left = current[keys + ['price']].astype({'product_id': str, 'title': str})
+    right = previous[keys + ['price']].astype({'product_id': str, 'title': str})
+    merged = left.merge(right, on=keys, how='inner', suffixes=('', '_previous'))
+    merged = merged.rename(columns={'price_previous': 'previous_price'})
+    merged['delta'] = merged['price'] - merged['previous_price']
+    merged['pct_change'] = merged['delta'] / merged['previous_price']
+    changed = merged[merged['delta'].fillna(0) != 0]
+    return changed.sort_values('pct_change').reset_index(drop=True)
+
+
+# AnalyticsCache.precompute() 預先計算的彙總
+AGGREGATES = {
+    'min_prices': lambda df: min_prices(latest(df)),
+    'route_min_prices': lambda df: min_prices(latest(df), by=('title',)),
+    'percentiles': lambda df: percentiles(latest(df)),
+    'week_over_week': week_over_week,
+}
+
+
+class AnalyticsCache:
+    """依資料集指紋快取彙總結果；分區有新增或變動時重新計算"""
+
+    def __init__(self, root='output', cache_dir=None):
+        self.root = root
+        self.cache_dir = cache_dir or os.path.join(root, '_aggregates')
+        self._fingerprint = None
+        self._frame = None
+
+    def fingerprint(self):
+        if self._fingerprint is None:
+            self._fingerprint = fingerprint(self.root)
+        return self._fingerprint
+
+    def frame(self):
+        """整個資料集（只在需要重新計算時載入一次）"""
+        if self._frame is None:
+            self._frame = load(self.root)
+        return self._frame
+
+    def get(self, name, compute=None):
+        """取得彙總；快取不存在或過期時以 compute（預設 AGGREGATES[name]）重新計算並寫入"""
+        import pandas as pd
+
+        path = os.path.join(self.cache_dir, f"{name}-{self.fingerprint()[:16]}.parquet")
+        if os.path.exists(path):
+            return pd.read_parquet(path)
+        result = (compute or AGGREGATES[name])(self.frame())
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        result.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        # 移除同一彙總的舊版本
+        for old in glob.glob(os.path.join(self.cache_dir, f"{name}-*.parquet")):
+            if old != path:
+                os.remove(old)
+        return result
+
+    def precompute(self):
+        """計算所有常用彙總，回傳 {名稱: 列數}"""
+        return {name: len(self.get(name)) for name in AGGREGATES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="跨商品價格分析")
+    parser.add_argument('--root', default='output', help="OutputStream 的輸出目錄")
+    parser.add_argument('--run', action='append', help="只分析指定批次（可重複），預設最新一批")
+    parser.add_argument('--output', help="結果另存為 CSV")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('consolidate', help="為 JSONL/CSV 分區補上 Parquet")
+    p = commands.add_parser('min', help="每個商品（或路線）的最低價格與日期")
+    p.add_argument('--by', default='product_id', help="分組欄位，例如 title 表示跨商品的路線")
+    p = commands.add_parser('matrix', help="選項 × 日期的價格矩陣")
+    p.add_argument('--product', required=True)
+    commands.add_parser('percentiles', help="每個商品的價格百分位數")
+    p = commands.add_parser('wow', help="與一週前相比的價格變動")
+    p.add_argument('--days', type=int, default=7)
+    commands.add_parser('precompute', help="預先計算並快取常用彙總")
+    args = parser.parse_args()
+
+    if args.command == 'consolidate':
+        print(f"已轉換 {consolidate(args.root)} 個分區")
+        return
+    cache = AnalyticsCache(args.root)
+    if args.command == 'precompute':
+        print(cache.precompute())
+        return
+
+    if args.command == 'matrix':
+        df = load(args.root, runs=args.run, products=[args.product])
+        result = price_matrix(latest(df), args.product)
+    elif args.run or (args.command == 'min' and args.by not in ('product_id', 'title')) or \
+            (args.command == 'wow' and args.days != 7):
+        # 指定批次或非預設參數時直接計算，不使用快取
+        df = load(args.root, runs=args.run)
+        result = {
+            'min': lambda: min_prices(latest(df), by=(args.by,)),
+            'percentiles': lambda: percentiles(latest(df)),
+            'wow': lambda: week_over_week(df, args.days),
+        }[args.command]()
+    else:
+        if args.command == 'min':
+            result = cache.get('route_min_prices' if args.by == 'title' else 'min_prices')
+        else:
+            result = cache.get({'percentiles': 'percentiles', 'wow': 'week_over_week'}[args.command])
+
+    if args.output:
+        result.to_csv(args.output, encoding='utf-8-sig')
+    print(result.to_string(max_rows=50))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""價格歷史（SQLite 時間序列）與依波動程度調整的重爬排程
+
+同一個 (商品, 選項, 日期) 價格不變時只更新 last_seen，不新增觀測；
+每次記錄只回傳有變動的部分（delta）。
+"""
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    product_id TEXT NOT NULL,
+    option_title TEXT NOT NULL,
+    travel_date TEXT NOT NULL,
+    price INTEGER,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    PRIMARY KEY (product_id, option_title, travel_date, first_seen)
+);
+CREATE TABLE IF NOT EXISTS latest (
+    product_id TEXT NOT NULL,
+    option_title TEXT NOT NULL,
+    travel_date TEXT NOT NULL,
+    price INTEGER,
+    first_seen TEXT NOT NULL,
+    PRIMARY KEY (product_id, option_title, travel_date)
+);
+CREATE TABLE IF NOT EXISTS crawls (
+    product_id TEXT NOT NULL,
+    month TEXT NOT NULL,
+    observed_at TEXT NOT NULL,
+    compared INTEGER NOT NULL,
+    changes INTEGER NOT NULL,
+    PRIMARY KEY (product_id, month, observed_at)
+);
+"""
+
+
+class PriceHistory:
+    """去重的價格時間序列"""
+
+    def __init__(self, path='price_history.db'):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def record(self, product_id, rows, observed_at=None):
+        """記錄一次爬取結果，回傳新增或變動的價格列表"""
+        observed_at = (observed_at or datetime.now()).isoformat(timespec='seconds')
+        deltas = []
+        month_counts = {}  # month -> [有前次價格可比較的數量, 價格變動數]
+
+        with self._lock, self.conn:
+            for row in rows:
+                # date 可能是 datetime.date 或從 JSONL 讀回的 ISO 字串
+                travel_date = str(row['date'])[:10]
+                title = row.get('title') or ""
+                price = row.get('price')
+                counts = month_counts.setdefault(travel_date[:7], [0, 0])
+
+                previous = self.conn.execute(
+                    "SELECT price, first_seen FROM latest "
+                    "WHERE product_id = ? AND option_title = ? AND travel_date = ?",
+                    (product_id, title, travel_date)).fetchone()
+
+                if previous is not None:
+                    counts[0] += 1
+                if previous is not None and previous[0] == price:
+                    # 價格沒變：只延長這筆觀測的有效期間
+                    self.conn.execute(
+                        "UPDATE observations SET last_seen = ? WHERE product_id = ? AND option_title = ? "
+                        "AND travel_date = ? AND first_seen = ?",
+                        (observed_at, product_id, title, travel_date, previous[1]))
+                    continue
+
+                if previous is not None:
+                    counts[1] += 1
+                self.conn.execute("INSERT OR REPLACE INTO observations VALUES (?, ?, ?, ?, ?, ?)",
+                                  (product_id, title, travel_date, price, observed_at, observed_at))
+                self.conn.execute("INSERT OR REPLACE INTO latest VALUES (?, ?, ?, ?, ?)",
+                                  (product_id, title, travel_date, price, observed_at))
+                deltas.append({
+                    'product_id': product_id,
+                    'title': title,
+                    'date': travel_date,
+                    'old_price': previous[0] if previous is not None else None,
+                    'new_price': price,
+                    'change': 'changed' if previous is not None else 'new',
+                    'observed_at': observed_at,
+                })
+
+            for month, (compared, changes) in month_counts.items():
+                self.conn.execute("INSERT OR REPLACE INTO crawls VALUES (?, ?, ?, ?, ?)",
+                                  (product_id, month, observed_at, compared, changes))
+        return deltas
+
+    def crawl_history(self, product_id, month=None, limit=10):
+        """最近幾次爬取的 (observed_at, 可比較數, 變動數)，新的在前"""
+        with self._lock:
+            if month is None:
+                return self.conn.execute(
+                    "SELECT observed_at, SUM(compared), SUM(changes) FROM crawls WHERE product_id = ? "
+                    "GROUP BY observed_at ORDER BY observed_at DESC LIMIT ?", (product_id, limit)).fetchall()
+            return self.conn.execute(
+                "SELECT observed_at, compared, changes FROM crawls WHERE product_id = ? AND month = ? "
+                "ORDER BY observed_at DESC LIMIT ?", (product_id, month, limit)).fetchall()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class RecrawlScheduler:
+    """價格常變的商品/月份較常重爬，穩定的則拉長間隔"""
+
+    def __init__(self, history, min_interval=timedelta(hours=6), max_interval=timedelta(days=7),
+                 lookback=5, volatile_ratio=0.2):
+        self.history = history
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.lookback = lookback
+        # 變動比例達到此值即視為高波動，使用最短間隔
+        self.volatile_ratio = volatile_ratio
+
+    def volatility(self, product_id, month=None):
+        """最近幾次爬取中價格有變動的比例（0~1），還沒有可比較的資料時視為高波動"""
+        crawls = self.history.crawl_history(product_id, month, self.lookback)
+        compared = sum(c[1] for c in crawls)
+        if not compared:
+            return 1.0
+        return sum(c[2] for c in crawls) / compared
+
+    def interval(self, product_id, month=None):
+        """依波動程度在最短與最長間隔之間線性插值"""
+        score = min(1.0, self.volatility(product_id, month) / self.volatile_ratio)
+        return self.max_interval - (self.max_interval - self.min_interval) * score
+
+    def is_due(self, product_id, month=None, now=None):
+        """距上次爬取已超過間隔（或從未爬取）時回傳 True"""
+        crawls = self.history.crawl_history(product_id, month, 1)
+        if not crawls:
+            return True
+        last = datetime.fromisoformat(crawls[0][0])
+        return (now or datetime.now()) - last >= self.interval(product_id, month)
+
+    def due_months(self, product_id, months, now=None):
+        """列出需要重爬的月份（YYYY-MM）"""
+        return [month for month in months if self.is_due(product_id, month, now)]
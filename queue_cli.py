@@ -0,0 +1,134 @@
+"""共用工作佇列的命令列工具
+
+用法:
+  python queue_cli.py enqueue --queue jobs.db [--file urls.txt] [--option 0] [--window "next 30 days"] [URL ...]
+  python queue_cli.py work    --queue jobs.db [--profile default] [--workers 3] [--idle-timeout 60] [--headless]
+  python queue_cli.py status  --queue jobs.db [--watch 10]
+  python queue_cli.py serve   --queue jobs.db [--host 0.0.0.0 --token <共用 token>] [--port 8790]
+
+單一主機上的 worker 直接共用 SQLite 檔；多台主機時在一台執行 serve，
+其他主機以 --queue http://<host>:8790 連線。serve 預設只綁定 127.0.0.1，
+對外綁定時必須設定 --token（或 KKDAY_QUEUE_TOKEN 環境變數），其他主機以相同的環境變數連線。
+worker 的延遲、逾時、擷取方式等設定取自 --profile（見 crawl_profiles），命令列參數覆寫設定檔中的同名設定。
+"""
+import argparse
+import json
+import time
+
+from crawl_profiles import default_config_path, get_profile
+from job_queue import open_queue, serve_queue
+
+
+def read_urls(args):
+    urls = list(args.urls)
+    if args.file:
+        with open(args.file, encoding='utf-8') as f:
+            urls.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    return urls
+
+
+def enqueue(args):
+    jobs = open_queue(args.queue)
+    try:
+        urls = read_urls(args)
+        options = args.option if args.option else [None]
+        added = jobs.enqueue_many([(url, option, args.window) for url in urls for option in options],
+                                  requeue=args.requeue)
+        print(f"加入 {added} 個工作（{len(urls) * len(options) - added} 個已存在或與同商品的工作衝突，略過）")
+        print(json.dumps(jobs.stats(), ensure_ascii=False))
+    finally:
+        jobs.close()
+
+
+def work(args):
+    # 只有 worker 需要 selenium，延後載入
+    from main import KKdayMultiScraper
+
+    profile = get_profile(args.profile, args.config, workers=args.workers, headless=args.headless,
+                          checkpoint_path=args.checkpoint, output_dir=args.output_dir,
+                          output_formats=args.formats, export_excel=False if args.no_excel else None,
+                          metrics_port=args.metrics_port)
+    jobs = open_queue(args.queue)
+    try:
+        scraper = KKdayMultiScraper([], **profile.multi_kwargs())
+        scraper.run_queue(jobs, worker_id=args.worker_id, idle_timeout=args.idle_timeout or None)
+    finally:
+        jobs.close()
+
+
+def status(args):
+    jobs = open_queue(args.queue)
+    try:
+        while True:
+            stats = jobs.stats()
+            print(f"待處理 {stats['pending']}，執行中 {stats['leased']}（{stats['active_workers']} 個 worker），"
+                  f"完成 {stats['done']}，失敗 {stats['failed']}，每分鐘 {stats['jobs_per_min']} 個")
+            if not args.watch:
+                break
+            time.sleep(args.watch)
+    finally:
+        jobs.close()
+
+
+def serve(args):
+    jobs = open_queue(args.queue)
+    try:
+        server = serve_queue(jobs, args.port, args.host, args.token)
+    except ValueError as e:
+        jobs.close()
+        raise SystemExit(str(e))
+    print(f"佇列服務: http://{args.host}:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        jobs.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="共用爬取工作佇列")
+    parser.add_argument('--queue', default='jobs.db', help="jobs.db、sqlite:///path、memory:// 或 http://host:port")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('enqueue', help="加入工作")
+    p.add_argument('urls', nargs='*')
+    p.add_argument('--file', help="每行一個 URL 的檔案")
+    p.add_argument('--option', type=int, action='append', help="只處理指定序號的選項（可重複），預設整個商品")
+    p.add_argument('--window', help="日期範圍，例如 \"next 30 days\" 或 2026-12-20..2027-01-05")
+    p.add_argument('--requeue', action='store_true', help="把已完成或失敗的工作重新放回佇列")
+    p.set_defaults(func=enqueue)
+
+    p = commands.add_parser('work', help="啟動 worker")
+    p.add_argument('--profile', default='default', help="設定檔名稱，例如 default、fixture/fast")
+    p.add_argument('--config', default=default_config_path(), help="設定檔（.toml 或 .json）")
+    p.add_argument('--worker-id', help="預設為 <主機名稱>-<pid>")
+    p.add_argument('--idle-timeout', type=float, default=60, help="佇列空閒多少秒後結束，0 表示持續等待")
+    # 以下參數覆寫設定檔中的同名設定
+    p.add_argument('--workers', type=int, help="同時使用的瀏覽器數")
+    p.add_argument('--headless', action='store_const', const=True)
+    p.add_argument('--checkpoint', help="斷點資料庫路徑")
+    p.add_argument('--output-dir')
+    p.add_argument('--formats', nargs='+', help="jsonl / csv / parquet")
+    p.add_argument('--no-excel', action='store_true')
+    p.add_argument('--metrics-port', type=int)
+    p.set_defaults(func=work)
+
+    p = commands.add_parser('status', help="顯示佇列深度與吞吐量")
+    p.add_argument('--watch', type=float, help="每隔幾秒更新一次")
+    p.set_defaults(func=status)
+
+    p = commands.add_parser('serve', help="以 HTTP 提供佇列給其他主機")
+    p.add_argument('--host', default='127.0.0.1', help="對外提供時例如 0.0.0.0，此時必須設定 --token")
+    p.add_argument('--token', help="用戶端須帶的共用 token，預設讀取 KKDAY_QUEUE_TOKEN")
+    p.add_argument('--port', type=int, default=8790)
+    p.set_defaults(func=serve)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""精簡的型別化記錄
+
+每個日曆格子是一個 __slots__ 的 PriceRecord（日期為 datetime.date、價格為整數），
+商品/選項等中繼資料只在 OptionCatalog 存一份，記錄以 option_id 參照。
+輸出（串流、Excel、斷點、價格歷史）時才以 to_row 展開成 dict。
+"""
+import threading
+from dataclasses import dataclass
+from datetime import date
+
+
+@dataclass(frozen=True, slots=True)
+class OptionInfo:
+    option_id: int
+    product_id: str
+    title: str
+    base_price: str = ""
+
+
+@dataclass(slots=True)
+class PriceRecord:
+    option_id: int
+    date: date
+    price: int | None
+    currency: str = ""
+
+
+class OptionCatalog:
+    """商品選項註冊表，同一個 (商品, 標題) 只會有一個 option_id"""
+
+    def __init__(self):
+        self._options = []
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def register(self, product_id, title, base_price=""):
+        key = (product_id, title)
+        with self._lock:
+            option_id = self._ids.get(key)
+            if option_id is None:
+                option_id = len(self._options)
+                self._options.append(OptionInfo(option_id, product_id, title, base_price))
+                self._ids[key] = option_id
+            return option_id
+
+    def get(self, option_id):
+        return self._options[option_id]
+
+    def __len__(self):
+        return len(self._options)
+
+
+def make_records(option_id, entries):
+    """把解析出的 (date, price, currency) 轉成 PriceRecord"""
+    return [PriceRecord(option_id, day, price, currency) for day, price, currency in entries]
+
+
+def to_row(record, catalog):
+    """展開成輸出用的 dict"""
+    option = catalog.get(record.option_id)
+    return {
+        'title': option.title,
+        'date': record.date,
+        'price': record.price,
+        'currency': record.currency,
+    }
+
+
+def to_rows(records, catalog):
+    return [to_row(record, catalog) for record in records]
+
+
+def from_row(row, catalog, product_id):
+    """從輸出的 dict（例如斷點裡的 JSON）還原 PriceRecord"""
+    day = row['date']
+    if isinstance(day, str):
+        day = date.fromisoformat(day[:10])
+    option_id = catalog.register(product_id, row.get('title') or "")
+    return PriceRecord(option_id, day, row.get('price'), row.get('currency') or "")
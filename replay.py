@@ -0,0 +1,118 @@
+"""離線重新解析：不開瀏覽器，以多個 CPU 核心重新解析快照庫中的日曆
+
+用法: python replay.py --store snapshots/ [--run-id 2026-10-18] [--backend auto]
+                       [--workers 8] [--output-dir output] [--formats jsonl csv]
+                       [--profile default] [--window "next 30 days"]
+
+結果以 run=replay-<run_id> 分區寫出，欄位與爬蟲輸出相同。相同內容的快照只解析一次。
+與爬取時相同，只保留日期範圍（設定檔的 window 與各商品的 horizons，或 --window）內的日期；
+"next 30 days" 這類相對範圍以快照的擷取日期計算，而不是重新解析的日期。
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import time
+from datetime import date
+
+from calendar_parser import get_backend, parse_calendar, records_from_calendar_json
+from crawl_profiles import default_config_path, get_profile
+from crawl_window import CrawlWindow
+from output_sinks import OutputStream
+from snapshot_store import SnapshotStore, read_object
+
+
+def parse_snapshot(job):
+    """解析一個快照（在子行程中執行），回傳 (date, price, currency) 列表"""
+    root, digest, kind, month_label, backend = job
+    text = read_object(root, digest)
+    if kind == 'json':
+        entries = {}
+        for _, payload in json.loads(text):
+            for entry in records_from_calendar_json(payload):
+                entries.setdefault(entry[0], entry)
+        return sorted(entries.values())
+    return parse_calendar(text, month_label, get_backend(backend))
+
+
+def replay(store, run_id=None, backend='auto', workers=None, output=None, window=None, horizons=None):
+    """重新解析一個批次的所有快照，回傳 {product_id: 資料列}；指定 output（OutputStream）時一併寫出
+
+    window / horizons（商品編號 -> 範圍）與爬蟲的 crawl_window / horizons 相同，None 時不過濾。
+    """
+    entries = store.entries(run_id)
+    # 相對範圍以該批次的擷取日期為準
+    captured = min((e['captured_at'] for e in entries), default=None)
+    today = date.fromisoformat(captured[:10]) if captured else None
+    window = CrawlWindow.parse(window, today)
+    horizons = {str(product_id): CrawlWindow.parse(spec, today) for product_id, spec in (horizons or {}).items()}
+    # 同一個 (選項, 月份) 同時有 JSON 與 HTML 時，與爬取時相同，優先使用 JSON
+    chosen = {}
+    for entry in entries:
+        key = (entry['product_id'], entry['option_index'], entry['month_index'])
+        if key not in chosen or entry['kind'] == 'json':
+            chosen[key] = entry
+
+    # 相同內容（與月份文字）只解析一次
+    jobs = sorted({(store.root, e['digest'], e['kind'], e['month_label'] if e['kind'] == 'html' else '', backend)
+                   for e in chosen.values()})
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        parsed = dict(zip(jobs, executor.map(parse_snapshot, jobs, chunksize=max(1, len(jobs) // 64))))
+
+    products = {}
+    seen = {}
+    for key in sorted(chosen):
+        entry = chosen[key]
+        job = (store.root, entry['digest'], entry['kind'],
+               entry['month_label'] if entry['kind'] == 'html' else '', backend)
+        # 與 navigate_through_months 相同：同一選項跨月份的 JSON 可能重複，依日期去重
+        option_seen = seen.setdefault(key[:2], set())
+        rows = products.setdefault(entry['product_id'], [])
+        product_window = horizons.get(entry['product_id']) or window
+        for day, price, currency in parsed[job]:
+            if day in option_seen or (product_window is not None and not product_window.contains(day)):
+                continue
+            option_seen.add(day)
+            rows.append({'title': entry['option_title'], 'date': day, 'price': price, 'currency': currency})
+
+    if output is not None:
+        for product_id, rows in products.items():
+            output.open_product(product_id)
+            output.write(product_id, rows)
+            output.close_product(product_id)
+    return products
+
+
+def main():
+    parser = argparse.ArgumentParser(description="離線重新解析快照庫中的日曆")
+    parser.add_argument('--store', default='snapshots', help="快照庫目錄")
+    parser.add_argument('--run-id', help="要重新解析的批次，預設為最新的批次")
+    parser.add_argument('--backend', default='auto', help="解析後端: auto / selectolax / lxml / bs4")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="平行處理的行程數")
+    parser.add_argument('--output-dir', default='output')
+    parser.add_argument('--formats', nargs='+', default=['jsonl'], help="jsonl / csv / parquet")
+    parser.add_argument('--profile', default='default', help="爬取時使用的設定檔，沿用其 window 與 horizons")
+    parser.add_argument('--config', default=default_config_path(), help="設定檔（.toml 或 .json）")
+    parser.add_argument('--window', help="覆寫日期範圍，例如 \"next 30 days\" 或 2026-12-20..2027-01-05")
+    args = parser.parse_args()
+    profile = get_profile(args.profile, args.config, window=args.window)
+
+    store = SnapshotStore(args.store)
+    try:
+        run_ids = store.run_ids()
+        if not run_ids:
+            raise SystemExit(f"{args.store} 中沒有任何快照")
+        run_id = args.run_id or run_ids[-1]
+        output = OutputStream(args.output_dir, f"replay-{run_id}", args.formats)
+        start = time.perf_counter()
+        products = replay(store, run_id, args.backend, args.workers, output, profile.window, profile.horizons)
+        elapsed = time.perf_counter() - start
+        print(f"已重新解析批次 {run_id}: {len(products)} 個商品，"
+              f"{sum(len(rows) for rows in products.values())} 筆資料，耗時 {elapsed:.1f} 秒")
+        print(f"快照庫: {store.stats()}")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""自適應逾時、失敗單位重試佇列與各網站的斷路器
+
+- AdaptiveTimeouts: 依各網站、各階段觀察到的延遲百分位數決定等待上限，取代固定的 30/10/3 秒
+- RetryQueue: 記錄失敗的 (url, 選項, 月份) 單位，以指數退避稍後只重做這些單位
+- CircuitBreaker: 同一網站連續失敗過多時暫停送出請求，冷卻後放行一次試探
+"""
+import heapq
+import random
+import threading
+import time
+from collections import deque
+
+# 各階段的預設（也是最長）等待秒數，與原本的固定值相同
+DEFAULT_TIMEOUTS = {
+    'page_load': 30,
+    'option_head': 10,
+    'select_button': 10,
+    'calendar_table': 10,
+    'month_change': 10,
+    'modal': 3,
+}
+
+
+class AdaptiveTimeouts:
+    """timeout = clamp(延遲第 percentile 百分位數 × factor, minimum, 預設值)
+
+    樣本不足 min_samples 時使用預設值。逾時也會記錄為一個樣本（等於當時的上限），
+    網站變慢時上限會跟著回升。
+    """
+
+    def __init__(self, defaults=None, percentile=0.95, factor=2.0, minimum=1.0, window=200, min_samples=20):
+        self.defaults = dict(DEFAULT_TIMEOUTS, **(defaults or {}))
+        self.percentile = percentile
+        self.factor = factor
+        self.minimum = minimum
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = {}  # (host, phase) -> deque[秒數]
+        self._lock = threading.Lock()
+
+    def observe(self, host, phase, seconds):
+        with self._lock:
+            self._samples.setdefault((host, phase), deque(maxlen=self.window)).append(seconds)
+
+    def quantile(self, host, phase):
+        with self._lock:
+            samples = sorted(self._samples.get((host, phase), ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * self.percentile))]
+
+    def timeout(self, host, phase):
+        default = self.defaults.get(phase, 10)
+        observed = self.quantile(host, phase)
+        if observed is None:
+            return default
+        return min(default, max(self.minimum, observed * self.factor))
+
+    def summary(self):
+        """各網站、各階段目前的等待上限"""
+        with self._lock:
+            keys = list(self._samples)
+        return {f"{host}:{phase}": round(self.timeout(host, phase), 2) for host, phase in keys}
+
+
+class RetryQueue:
+    """失敗單位的重試佇列（執行緒安全）；超過 max_attempts 次的單位移到 exhausted
+
+    失敗次數以 (url, 選項) 計算，只在一次執行之內有效：begin() 開始處理 url 時清除這些選項
+    之前留下的記錄（工作重新派送或延後重跑時從零開始），succeeded() 在選項完成時清除。
+    """
+
+    def __init__(self, max_attempts=3, base_delay=5.0, max_delay=120.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._heap = []  # (到期時間, 序號, 單位)
+        self._attempts = {}  # (url, 選項) -> 已失敗次數
+        self._counter = 0
+        self._lock = threading.Lock()
+        self.exhausted = []
+
+    @staticmethod
+    def _matches(unit, url, option_indexes):
+        return unit['url'] == url and (option_indexes is None or unit['option_index'] in option_indexes)
+
+    def _forget(self, url, option_indexes):
+        """清除 url 中 option_indexes（None 表示全部）的失敗次數、待重試與用盡的單位；呼叫端需持有鎖"""
+        for key in [key for key in self._attempts
+                    if key[0] == url and (option_indexes is None or key[1] in option_indexes)]:
+            del self._attempts[key]
+        self._heap = [item for item in self._heap if not self._matches(item[2], url, option_indexes)]
+        heapq.heapify(self._heap)
+        self.exhausted = [unit for unit in self.exhausted if not self._matches(unit, url, option_indexes)]
+
+    def begin(self, url, option_indexes=None):
+        """開始處理 url（或其中的 option_indexes）：清除上一次執行留下的記錄"""
+        with self._lock:
+            self._forget(url, option_indexes)
+
+    def succeeded(self, url, option_index):
+        """選項已完整完成：清除它的失敗次數與先前用盡或放棄的單位"""
+        with self._lock:
+            self._forget(url, (option_index,))
+
+    def add(self, url, option_index, month_index=0, error=None):
+        """記錄一次失敗，回傳是否會再重試"""
+        key = (url, option_index)
+        with self._lock:
+            attempts = self._attempts.get(key, 0) + 1
+            self._attempts[key] = attempts
+            unit = {'url': url, 'option_index': option_index, 'month_index': month_index,
+                    'attempts': attempts, 'error': str(error) if error is not None else None}
+            if attempts >= self.max_attempts:
+                self.exhausted.append(unit)
+                return False
+            # 指數退避加上隨機抖動，避免多個 worker 同時重試
+            delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+            self._counter += 1
+            heapq.heappush(self._heap, (time.monotonic() + delay, self._counter, unit))
+            return True
+
+    def __len__(self):
+        with self._lock:
+            return len(self._heap)
+
+    def pop(self, url=None, wait=True, deadline=None):
+        """取出下一個到期的單位（可只取某個 url 的），wait 時睡到到期；沒有單位時回傳 None"""
+        while True:
+            with self._lock:
+                candidates = [item for item in self._heap if url is None or item[2]['url'] == url]
+                if not candidates:
+                    return None
+                item = min(candidates)
+                now = time.monotonic()
+                if item[0] <= now:
+                    self._heap.remove(item)
+                    heapq.heapify(self._heap)
+                    return item[2]
+                delay = item[0] - now
+            if not wait or (deadline is not None and now + delay > deadline):
+                return None
+            time.sleep(delay)
+
+    def drop(self, url=None):
+        """放棄尚未重試的單位（例如斷路器開啟時），移到 exhausted
+
+        之後重跑該 url 時 begin() 會清除它們，選項完成時 succeeded() 也會清除。
+        """
+        with self._lock:
+            keep = []
+            for item in self._heap:
+                if url is None or item[2]['url'] == url:
+                    self.exhausted.append(dict(item[2], dropped=True))
+                else:
+                    keep.append(item)
+            self._heap = keep
+            heapq.heapify(self._heap)
+
+    def exhausted_for(self, url, option_indexes=None):
+        """url（或其中的 option_indexes）重試用盡或被放棄的單位"""
+        with self._lock:
+            return [unit for unit in self.exhausted if self._matches(unit, url, option_indexes)]
+
+
+class HostUnavailable(Exception):
+    """網站無法回應（例如頁面載入失敗或逾時）；拋出前已計入斷路器，上層不必再記錄"""
+
+
+class CircuitBreaker:
+    """各網站（host）的斷路器：連續 failure_threshold 次失敗後開啟 cooldown 秒
+
+    冷卻結束後進入半開狀態，只放行一個試探者（同一執行緒可重複通過），其他呼叫者在試探者
+    回報 record_success / record_failure 之前仍被擋下；試探者 probe_timeout 秒內沒有回報時改放行下一個。
+    """
+
+    def __init__(self, failure_threshold=5, cooldown=300, probe_timeout=None):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.probe_timeout = probe_timeout or cooldown
+        self._failures = {}  # host -> 連續失敗次數
+        self._open_until = {}  # host -> 恢復放行的時間
+        self._probes = {}  # host -> (試探者的執行緒, 開始試探的時間)
+        self._lock = threading.Lock()
+
+    def allow(self, host):
+        """是否可以對 host 送出請求；半開狀態下只有取得試探資格的執行緒可以通過"""
+        now = time.monotonic()
+        with self._lock:
+            if host not in self._open_until:
+                return True
+            if now < self._open_until[host]:
+                return False
+            thread = threading.get_ident()
+            probe = self._probes.get(host)
+            if probe is not None and probe[0] != thread and now - probe[1] < self.probe_timeout:
+                return False
+            if probe is None or probe[0] != thread:
+                self._probes[host] = (thread, now)
+            return True
+
+    def retry_after(self, host):
+        """距離恢復放行還有幾秒"""
+        with self._lock:
+            return max(0.0, self._open_until.get(host, 0) - time.monotonic())
+
+    def record_success(self, host):
+        with self._lock:
+            self._failures[host] = 0
+            self._open_until.pop(host, None)
+            self._probes.pop(host, None)
+
+    def record_failure(self, host):
+        """記錄失敗，回傳斷路器是否因此開啟"""
+        with self._lock:
+            self._probes.pop(host, None)
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+            if failures >= self.failure_threshold:
+                self._open_until[host] = time.monotonic() + self.cooldown
+                # 半開狀態下再失敗一次就重新開啟
+                self._failures[host] = self.failure_threshold - 1
+                return True
+            return False
+
+    def is_open(self, host):
+        """是否仍在冷卻中（不會取得試探資格）"""
+        with self._lock:
+            return time.monotonic() < self._open_until.get(host, 0)
@@ -0,0 +1,137 @@
+"""攔截頁面的重資源（圖片、字型、影片、追蹤/廣告腳本）
+
+透過 CDP Network.setBlockedURLs 套用，並從 performance log 統計每頁
+省下的請求數與位元組數。被攔截的請求沒有實際大小，位元組數以同類型
+已下載資源的平均大小估算（沒有樣本時使用預設值）。
+"""
+
+
+def with_query(patterns):
+    """副檔名樣式再加上帶查詢字串的版本：CDN 資源常是 foo.png?v=3，*.png 比對不到"""
+    return [variant for pattern in patterns for variant in (pattern, pattern + '?*')]
+
+
+# 依資源類型對應的網址樣式（setBlockedURLs 只支援網址萬用字元）
+RESOURCE_TYPE_PATTERNS = {
+    'Image': with_query(['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico']),
+    'Font': with_query(['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot']),
+    'Media': with_query(['*.mp4', '*.webm', '*.m3u8', '*.ts', '*.mp3']),
+}
+
+TRACKER_PATTERNS = [
+    '*google-analytics.com*',
+    '*googletagmanager.com*',
+    '*doubleclick.net*',
+    '*googlesyndication.com*',
+    '*connect.facebook.net*',
+    '*hotjar.com*',
+    '*clarity.ms*',
+    '*criteo.*',
+    '*branch.io*',
+    '*appier.net*',
+]
+
+# 沒有同類型樣本時，每個被攔截請求的估計大小（bytes）
+ESTIMATED_BYTES = {
+    'Image': 60 * 1024,
+    'Font': 40 * 1024,
+    'Media': 500 * 1024,
+    'Script': 40 * 1024,
+    'Other': 10 * 1024,
+}
+
+PAGE_LOAD_STRATEGIES = ('normal', 'eager', 'none')
+
+
+class ResourceFilter:
+    """資源攔截設定：拒絕清單 = 類型樣式 + 追蹤器 + 自訂拒絕，再扣除允許清單"""
+
+    def __init__(self, blocked_types=('Image', 'Font', 'Media'), block_trackers=True,
+                 blocked_patterns=(), allowed_patterns=(), page_load_strategy='eager',
+                 collect_stats=True):
+        unknown = set(blocked_types) - set(RESOURCE_TYPE_PATTERNS)
+        if unknown:
+            raise ValueError(f"未知的資源類型: {', '.join(sorted(unknown))}")
+        if page_load_strategy not in PAGE_LOAD_STRATEGIES:
+            raise ValueError(f"未知的頁面載入策略: {page_load_strategy}")
+        self.blocked_types = tuple(blocked_types)
+        self.block_trackers = block_trackers
+        self.blocked_patterns = tuple(blocked_patterns)
+        self.allowed_patterns = tuple(allowed_patterns)
+        self.page_load_strategy = page_load_strategy
+        self.collect_stats = collect_stats
+
+    def patterns(self):
+        """最終要攔截的網址樣式"""
+        patterns = []
+        for resource_type in self.blocked_types:
+            patterns.extend(RESOURCE_TYPE_PATTERNS[resource_type])
+        if self.block_trackers:
+            patterns.extend(TRACKER_PATTERNS)
+        patterns.extend(self.blocked_patterns)
+        allowed = set(self.allowed_patterns)
+        return [p for i, p in enumerate(patterns) if p not in allowed and p not in patterns[:i]]
+
+    def apply_options(self, options):
+        """在啟動前設定頁面載入策略，並以偏好設定關閉圖片"""
+        options.page_load_strategy = self.page_load_strategy
+        if 'Image' in self.blocked_types and not self.allowed_patterns:
+            options.add_experimental_option('prefs', {
+                'profile.managed_default_content_settings.images': 2
+            })
+
+    def apply(self, driver):
+        """在瀏覽器啟動後套用攔截清單"""
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.patterns()})
+
+
+class ResourceStats:
+    """從 Network 事件統計每頁載入與攔截的請求"""
+
+    def __init__(self):
+        self.type_bytes = {}  # 類型 -> [已下載總 bytes, 數量]，用於估算
+        self.reset()
+
+    def reset(self):
+        self._types = {}
+        self.requests_loaded = 0
+        self.bytes_loaded = 0
+        self.requests_blocked = 0
+        self.blocked_by_type = {}
+
+    def on_event(self, method, params):
+        if method == 'Network.requestWillBeSent':
+            self._types[params.get('requestId')] = params.get('type', 'Other')
+        elif method == 'Network.loadingFinished':
+            resource_type = self._types.pop(params.get('requestId'), 'Other')
+            size = int(params.get('encodedDataLength', 0))
+            self.requests_loaded += 1
+            self.bytes_loaded += size
+            total = self.type_bytes.setdefault(resource_type, [0, 0])
+            total[0] += size
+            total[1] += 1
+        elif method == 'Network.loadingFailed':
+            self._types.pop(params.get('requestId'), None)
+            if params.get('blockedReason'):
+                resource_type = params.get('type', 'Other')
+                self.requests_blocked += 1
+                self.blocked_by_type[resource_type] = self.blocked_by_type.get(resource_type, 0) + 1
+
+    def estimated_bytes_saved(self):
+        """估算被攔截請求的總大小"""
+        saved = 0
+        for resource_type, count in self.blocked_by_type.items():
+            total, samples = self.type_bytes.get(resource_type, (0, 0))
+            average = total / samples if samples else ESTIMATED_BYTES.get(resource_type, ESTIMATED_BYTES['Other'])
+            saved += average * count
+        return int(saved)
+
+    def summary(self):
+        return {
+            'requests_loaded': self.requests_loaded,
+            'bytes_loaded': self.bytes_loaded,
+            'requests_blocked': self.requests_blocked,
+            'blocked_by_type': dict(self.blocked_by_type),
+            'bytes_saved_estimate': self.estimated_bytes_saved(),
+        }
@@ -0,0 +1,67 @@
+"""選擇器解析快取（SQLite）
+
+以 (頁面模板, 角色) 為單位（頁面模板為「商品編號/頁面類型」）記錄哪個候選選擇器命中及其觀察到的延遲，
+下次先嘗試命中過的選擇器；所有候選仍在同一段腳本中一次檢查。
+"""
+import sqlite3
+import threading
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS selector_hits (
+    template TEXT NOT NULL,
+    role TEXT NOT NULL,
+    selector TEXT NOT NULL,
+    hits INTEGER NOT NULL,
+    total_latency_ms REAL NOT NULL,
+    last_hit_at TEXT NOT NULL,
+    PRIMARY KEY (template, role, selector)
+);
+"""
+
+
+class SelectorCache:
+    """執行緒安全的選擇器快取；path 為 None 時只保存在記憶體"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path or ':memory:', check_same_thread=False, isolation_level=None)
+        if path:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def ordered(self, template, role, selectors):
+        """命中過的選擇器依命中次數、平均延遲排在前面，其餘維持原順序"""
+        with self._lock:
+            stats = {selector: (hits, total / hits) for selector, hits, total in self.conn.execute(
+                "SELECT selector, hits, total_latency_ms FROM selector_hits WHERE template = ? AND role = ?",
+                (template, role))}
+        hits = sorted((s for s in selectors if s in stats), key=lambda s: (-stats[s][0], stats[s][1]))
+        return hits + [s for s in selectors if s not in stats]
+
+    def record(self, template, role, selector, latency_ms):
+        """記錄一次命中與從開始查詢到命中的延遲（毫秒）"""
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO selector_hits VALUES (?, ?, ?, 1, ?, ?) "
+                "ON CONFLICT (template, role, selector) DO UPDATE SET "
+                "hits = hits + 1, total_latency_ms = total_latency_ms + excluded.total_latency_ms, "
+                "last_hit_at = excluded.last_hit_at",
+                (template, role, selector, latency_ms, datetime.now().isoformat(timespec='seconds')))
+
+    def stats(self, template=None):
+        """各選擇器的命中次數與平均延遲"""
+        sql = "SELECT template, role, selector, hits, total_latency_ms / hits FROM selector_hits"
+        params = ()
+        if template is not None:
+            sql += " WHERE template = ?"
+            params = (template,)
+        with self._lock:
+            return [dict(zip(('template', 'role', 'selector', 'hits', 'mean_latency_ms'), row))
+                    for row in self.conn.execute(sql + " ORDER BY template, role, hits DESC", params)]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
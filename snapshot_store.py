@@ -0,0 +1,110 @@
+"""以內容定址的日曆快照庫
+
+每個 (商品, 選項, 月份) 擷取到的日曆表格 HTML 或日曆 JSON 以 SHA-256 命名、gzip 壓縮後
+存在 objects/ 下，相同內容只存一份；index.db（SQLite）記錄每次擷取指向哪個快照。
+replay.py 可以不開瀏覽器，直接對這些快照重新解析。
+"""
+import gzip
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+from datetime import date, datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    run_id TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    option_index INTEGER NOT NULL,
+    month_index INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    option_title TEXT,
+    month_label TEXT,
+    digest TEXT NOT NULL,
+    captured_at TEXT NOT NULL,
+    PRIMARY KEY (run_id, product_id, option_index, month_index, kind)
+);
+"""
+
+# 快照種類：日曆表格 outerHTML，或網路擷取到的日曆 JSON
+KINDS = ('html', 'json')
+
+
+def object_path(root, digest):
+    return os.path.join(root, 'objects', digest[:2], f"{digest[2:]}.gz")
+
+
+def read_object(root, digest):
+    """讀取並解壓一個快照（不需要開啟索引，可在其他行程中使用）"""
+    with open(object_path(root, digest), 'rb') as f:
+        return gzip.decompress(f.read()).decode('utf-8')
+
+
+class SnapshotStore:
+    """執行緒安全的快照庫"""
+
+    def __init__(self, root='snapshots', run_id=None):
+        self.root = root
+        self.run_id = run_id or date.today().isoformat()
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root, 'index.db'), check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def put_object(self, text):
+        """寫入內容並回傳 digest；已存在相同內容時不重寫"""
+        data = text.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = object_path(self.root, digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=6))
+            os.replace(tmp_path, path)
+        return digest
+
+    def save(self, product_id, option_index, month_index, kind, text, option_title='', month_label=''):
+        """記錄一次擷取的快照，回傳 digest"""
+        if kind not in KINDS:
+            raise ValueError(f"未知的快照種類: {kind}")
+        digest = self.put_object(text)
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                              (self.run_id, product_id, option_index, month_index, kind, option_title,
+                               month_label, digest, datetime.now().isoformat(timespec='seconds')))
+        return digest
+
+    def get(self, digest):
+        return read_object(self.root, digest)
+
+    def entries(self, run_id=None, product_id=None):
+        """快照索引（dict），依商品、選項、月份排序；run_id 為 None 時使用本批次"""
+        sql = "SELECT * FROM snapshots WHERE run_id = ?"
+        params = [run_id or self.run_id]
+        if product_id is not None:
+            sql += " AND product_id = ?"
+            params.append(product_id)
+        with self._lock:
+            cursor = self.conn.execute(sql + " ORDER BY product_id, option_index, month_index, kind", params)
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def run_ids(self):
+        with self._lock:
+            return [row[0] for row in self.conn.execute("SELECT DISTINCT run_id FROM snapshots ORDER BY run_id")]
+
+    def stats(self):
+        """索引筆數與實際存放的物件數，用來觀察去重效果"""
+        with self._lock:
+            entries, unique = self.conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT digest) FROM snapshots").fetchone()
+        return {'entries': entries, 'unique_objects': unique}
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
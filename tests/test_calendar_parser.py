@@ -0,0 +1,77 @@
+import json
+from datetime import date
+from urllib.request import urlopen
+
+import pytest
+
+from calendar_parser import parse_price, records_from_calendar_json
+from crawl_window import month_request_url
+from fixture_site import FixtureConfig, start_fixture_server, synthetic_month
+
+
+def test_records_from_nested_payload():
+    payload = {'data': {'groups': [
+        {'items': [
+            {'date': '2026-11-02', 'price': 1500, 'currency': 'TWD'},
+            {'date': '2026-11-01', 'price': {'amount': 1200, 'currency': 'TWD'}},
+        ]},
+        {'items': [{'date': '2026-11-03', 'price': 900, 'is_available': False}]},
+    ]}}
+    assert records_from_calendar_json(payload) == [
+        (date(2026, 11, 1), 1200, 'TWD'),
+        (date(2026, 11, 2), 1500, 'TWD'),
+    ]
+
+
+def test_records_deduplicate_dates():
+    payload = [{'date': '2026-11-01', 'price': 1000}, {'date': '2026-11-01', 'price': 1000}]
+    assert len(records_from_calendar_json(payload)) == 1
+
+
+def test_records_ignore_non_price_nodes():
+    assert records_from_calendar_json({'meta': {'date': 'not a date'}, 'items': []}) == []
+
+
+def test_records_descend_past_dated_containers():
+    payload = {'data': {'start_date': '2026-11-01', 'days': [
+        {'date': '2026-11-02', 'price': 100},
+        {'date': '2026-11-03', 'price': 120},
+    ]}}
+    assert records_from_calendar_json(payload) == [
+        (date(2026, 11, 2), 100, ''),
+        (date(2026, 11, 3), 120, ''),
+    ]
+
+
+def test_parse_price_formats():
+    assert parse_price('TWD 1,234') == (1234, 'TWD')
+    assert parse_price('NT$ 980') == (980, 'TWD')
+    assert parse_price('1.234.567', 'EUR') == (None, 'EUR')
+    assert parse_price('--') == (None, '')
+
+
+@pytest.fixture
+def fixture_site():
+    server, base_url = start_fixture_server(FixtureConfig(start_month='2026-11'))
+    yield base_url
+    server.shutdown()
+    server.server_close()
+
+
+def fetch_json(url):
+    with urlopen(url, timeout=10) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def test_network_mode_against_fixture_site(fixture_site):
+    """網路模式擷取到的日曆 API 回應可以直接轉成記錄，改寫月份參數即可取得其他月份"""
+    url = f"{fixture_site}/api/calendar?product=137240&month=2026-11"
+    entries = records_from_calendar_json(fetch_json(url))
+    expected = [item for item in synthetic_month('137240', '2026-11')['data']['items'] if item['is_available']]
+    assert [(entry[0].isoformat(), entry[1]) for entry in entries] == [
+        (item['date'], item['price']) for item in expected]
+    assert all(entry[2] == 'TWD' for entry in entries)
+
+    next_url = month_request_url(url, (2026, 11), (2026, 12))
+    assert next_url.endswith('month=2026-12')
+    assert {entry[0].month for entry in records_from_calendar_json(fetch_json(next_url))} == {12}
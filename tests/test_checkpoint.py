@@ -0,0 +1,37 @@
+from checkpoint import CheckpointStore
+
+URL = "https://www.kkday.com/zh-tw/product/137240"
+
+
+def test_resume_same_run(tmp_path):
+    path = str(tmp_path / 'checkpoints.db')
+    store = CheckpointStore(path, run_id='run-1')
+    rows = [{'title': 'A', 'date': '2026-11-01', 'price': 1000, 'currency': 'TWD'}]
+    store.save_month(URL, 0, 0, 'A', rows)
+    store.save_month(URL, 0, 1, 'A', [])
+    store.mark_option_done(URL, 0, 'A')
+    store.close()
+
+    # 以相同 run_id 重新開啟時續傳：已完成的月份與選項不必重做
+    resumed = CheckpointStore(path, run_id='run-1')
+    assert resumed.month_rows(URL, 0, 0) == rows
+    assert resumed.month_rows(URL, 0, 1) == []
+    assert resumed.month_rows(URL, 0, 2) is None
+    assert resumed.is_option_done(URL, 0)
+    assert not resumed.is_option_done(URL, 1)
+    assert resumed.option_rows(URL, 0) == rows
+    assert not resumed.is_url_done(URL)
+    resumed.mark_url_done(URL, 1)
+    assert resumed.is_url_done(URL)
+    resumed.close()
+
+
+def test_new_run_starts_over(tmp_path):
+    path = str(tmp_path / 'checkpoints.db')
+    store = CheckpointStore(path, run_id='run-1')
+    store.mark_url_done(URL, 10)
+    store.close()
+
+    other = CheckpointStore(path, run_id='run-2')
+    assert not other.is_url_done(URL)
+    other.close()
@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from crawl_profiles import DEFAULT_DELAYS, get_profile, load_profiles, parse_product_ids, resolve_urls
+
+
+@pytest.fixture
+def config(tmp_path):
+    path = tmp_path / 'profiles.toml'
+    path.write_text('''
+[profiles.gentle]
+extends = "default"
+workers = 2
+delays = { url = [10, 20] }
+timeouts = { page_load = 20 }
+horizons = { "137240" = "next 30 days" }
+
+[profiles.gentler]
+extends = "gentle"
+delays = { page = [5, 9] }
+timeouts = { modal = 5 }
+horizons = { "139665" = "2m" }
+
+[profiles."fixture/smoke"]
+extends = "fixture/fast"
+workers = 1
+''', encoding='utf-8')
+    return str(path)
+
+
+def test_builtin_profiles():
+    default = get_profile('default')
+    assert default.workers == 3 and default.delays == DEFAULT_DELAYS
+    fast = get_profile('fixture/fast')
+    assert all(delay == (0, 0) for delay in fast.delays.values())
+    assert not fast.human_behavior and fast.min_action_interval == 0
+
+
+def test_extends_merges_nested_settings(config):
+    profile = get_profile('gentler', config)
+    assert profile.name == 'gentler'
+    assert profile.workers == 2
+    # delays / timeouts / horizons 只覆寫指定的項目
+    assert profile.delays == {**DEFAULT_DELAYS, 'url': (10, 20), 'page': (5, 9)}
+    assert profile.timeouts == {'page_load': 20, 'modal': 5}
+    assert profile.horizons == {'137240': 'next 30 days', '139665': '2m'}
+    assert profile.multi_kwargs()['timeout_defaults'] == {'page_load': 20, 'modal': 5}
+
+
+def test_extends_builtin(config):
+    profile = get_profile('fixture/smoke', config)
+    assert profile.workers == 1
+    assert profile.base_url.startswith('http://127.0.0.1:8765/')
+    assert profile.scraper_kwargs()['timeouts'].defaults['page_load'] == 10
+
+
+def test_overrides_and_errors(config, tmp_path):
+    assert get_profile('gentle', config, workers=None, window='next 60 days').window == 'next 60 days'
+    with pytest.raises(ValueError):
+        get_profile('missing', config)
+    with pytest.raises(ValueError):
+        get_profile('gentle', config, unknown_setting=1)
+
+    loop = tmp_path / 'loop.json'
+    loop.write_text(json.dumps({'profiles': {'a': {'extends': 'b'}, 'b': {'extends': 'a'}}}), encoding='utf-8')
+    with pytest.raises(ValueError):
+        get_profile('a', str(loop))
+    assert {'default', 'fixture/fast', 'a', 'b'} <= set(load_profiles(str(loop)))
+
+
+def test_product_ids_and_urls():
+    assert parse_product_ids('137240-137242, 139665') == ['137240', '137241', '137242', '139665']
+    profile = get_profile('default')
+    assert resolve_urls(profile, ['137240', 'https://example.com/product/1', '137240']) == [
+        'https://www.kkday.com/zh-tw/product/137240', 'https://example.com/product/1']
@@ -0,0 +1,48 @@
+from datetime import date
+
+import pytest
+
+from crawl_window import CrawlWindow, month_request_url
+
+TODAY = date(2026, 10, 18)
+
+
+@pytest.mark.parametrize('spec, start, end', [
+    ('next 30 days', date(2026, 10, 18), date(2026, 11, 16)),
+    ('30d', date(2026, 10, 18), date(2026, 11, 16)),
+    (30, date(2026, 10, 18), date(2026, 11, 16)),
+    ('3m', date(2026, 10, 18), date(2027, 1, 31)),
+    ('next 2 months', date(2026, 10, 18), date(2026, 12, 31)),
+    ('2026-12-20..2027-01-05', date(2026, 12, 20), date(2027, 1, 5)),
+    ('2026-12..2027-02', date(2026, 12, 1), date(2027, 2, 28)),
+])
+def test_parse(spec, start, end):
+    window = CrawlWindow.parse(spec, today=TODAY)
+    assert (window.start, window.end) == (start, end)
+
+
+def test_parse_passthrough_and_errors():
+    window = CrawlWindow(TODAY, TODAY)
+    assert CrawlWindow.parse(window) is window
+    assert CrawlWindow.parse(None) is None
+    with pytest.raises(ValueError):
+        CrawlWindow.parse('sometime soon')
+    with pytest.raises(ValueError):
+        CrawlWindow.parse('2027-01-05..2026-12-20')
+
+
+def test_months_and_bounds():
+    window = CrawlWindow.parse('2026-12-20..2027-01-05')
+    assert window.months() == [(2026, 12), (2027, 1)]
+    assert window.is_before((2026, 11)) and window.is_after((2027, 2))
+    assert window.covers((2027, 1)) and not window.covers((2027, 2))
+    entries = [(date(2026, 12, 19), 1, 'TWD'), (date(2026, 12, 20), 2, 'TWD'), (date(2027, 1, 6), 3, 'TWD')]
+    assert window.filter(entries) == [(date(2026, 12, 20), 2, 'TWD')]
+
+
+def test_month_request_url():
+    url = "https://example.com/api?start_date=2026-11-01&end_date=2026-11-30"
+    assert month_request_url(url, (2026, 11), (2027, 2)) == (
+        "https://example.com/api?start_date=2027-02-01&end_date=2027-02-28")
+    # 月中的日期無法判斷要改成哪一天
+    assert month_request_url("https://example.com/api?date=2026-11-15", (2026, 11), (2026, 12)) is None
@@ -0,0 +1,71 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from http_fetcher import HttpProductFetcher, extract_embedded_state, options_from_state
+
+STATE = {'props': {'product': {'packages': [
+    {'pkg_name': '單程票', 'calendar': [{'date': '2026-11-01', 'price': 1200},
+                                        {'date': '2026-11-02', 'price': 1300}]},
+    {'pkg_name': '來回票', 'calendar': [{'date': '2026-11-01', 'price': 2200}]},
+    {'pkg_name': '已售完', 'calendar': []},
+]}}}
+
+PAGES = {
+    '/product/137240': (f'<html><script id="__NEXT_DATA__" type="application/json">{json.dumps(STATE)}</script>'
+                        '</html>'),
+    '/product/139665': '<html><body>需要瀏覽器才能載入</body></html>',
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        page = PAGES.get(self.path)
+        body = (page or 'not found').encode('utf-8')
+        self.send_response(200 if page else 404)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def site():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_extract_embedded_state():
+    html = ('<script type="application/json">{"a": 1}</script>'
+            '<script type="application/json">not json</script>'
+            '<script>window.__INIT_STATE__ = {"b": 2};</script>')
+    assert extract_embedded_state(html) == [{'a': 1}, {'b': 2}]
+
+
+def test_options_from_state_uses_innermost_titled_nodes():
+    options = options_from_state(STATE)
+    assert [(title, len(records)) for title, records in options] == [('單程票', 2), ('來回票', 1)]
+
+
+def test_fetch_rows_from_embedded_state(site):
+    fetcher = HttpProductFetcher(retries=0)
+    try:
+        rows = fetcher.fetch(f"{site}/product/137240")
+        assert [(row['title'], row['date'].isoformat(), row['price']) for row in rows] == [
+            ('單程票', '2026-11-01', 1200),
+            ('單程票', '2026-11-02', 1300),
+            ('來回票', '2026-11-01', 2200),
+        ]
+        # 沒有內嵌狀態或請求失敗時交給瀏覽器流程
+        assert fetcher.fetch(f"{site}/product/139665") is None
+        assert fetcher.fetch(f"{site}/product/000000") is None
+    finally:
+        fetcher.close()
@@ -0,0 +1,129 @@
+import pytest
+
+from job_queue import MemoryJobQueue, SqliteJobQueue
+
+URL = "https://www.kkday.com/zh-tw/product/137240"
+OTHER = "https://www.kkday.com/zh-tw/product/139665"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def jobs(clock):
+    return MemoryJobQueue(visibility_timeout=60, max_attempts=2, clock=clock)
+
+
+def test_lease_and_ack(jobs):
+    assert jobs.enqueue_many([(URL, None, 'next 30 days'), (OTHER, None, None)]) == 2
+    assert jobs.enqueue(URL) is False
+
+    leased = jobs.lease('w1', count=1)
+    assert [(job['url'], job['option_index'], job['window'], job['attempts']) for job in leased] == [
+        (URL, None, 'next 30 days', 1)]
+    assert jobs.lease('w2', count=5)[0]['url'] == OTHER
+    assert jobs.lease('w3') == []
+
+    # 只有持有租約的 worker 可以回報
+    assert not jobs.ack(leased[0]['job_id'], 'w2')
+    assert jobs.ack(leased[0]['job_id'], 'w1')
+    stats = jobs.stats()
+    assert (stats['done'], stats['leased'], stats['pending']) == (1, 1, 0)
+    assert jobs.outstanding('137240') == 0
+    assert jobs.outstanding('139665') == 1
+
+
+def test_nack_retries_then_fails(jobs):
+    jobs.enqueue(URL)
+    job = jobs.lease('w1')[0]
+    assert jobs.nack(job['job_id'], 'w1', 'timeout')
+    assert jobs.stats()['pending'] == 1
+
+    job = jobs.lease('w1')[0]
+    assert job['attempts'] == 2
+    jobs.nack(job['job_id'], 'w1', 'timeout')
+    assert jobs.stats()['failed'] == 1
+    assert jobs.lease('w1') == []
+
+
+def test_expired_lease_is_redelivered(jobs, clock):
+    jobs.enqueue(URL)
+    job = jobs.lease('w1')[0]
+    clock.now += 30
+    assert jobs.lease('w2') == []
+    assert jobs.extend(job['job_id'], 'w1')
+
+    # 延長後從現在起 60 秒才過期
+    clock.now += 61
+    redelivered = jobs.lease('w2')
+    assert [(j['job_id'], j['attempts']) for j in redelivered] == [(job['job_id'], 2)]
+    # 原本的 worker 已失去租約
+    assert not jobs.ack(job['job_id'], 'w1')
+
+    # 用完重試次數後過期就標記失敗
+    clock.now += 61
+    assert jobs.lease('w3') == []
+    assert jobs.stats()['failed'] == 1
+
+
+def test_requeue(jobs):
+    jobs.enqueue(URL)
+    job = jobs.lease('w1')[0]
+    jobs.ack(job['job_id'], 'w1')
+    assert jobs.enqueue(URL) is False
+    assert jobs.enqueue(URL, requeue=True) is True
+    assert jobs.lease('w1')[0]['attempts'] == 1
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_whole_product_and_option_jobs_are_exclusive(backend, tmp_path):
+    jobs = MemoryJobQueue() if backend == 'memory' else SqliteJobQueue(str(tmp_path / 'jobs.db'))
+    assert jobs.enqueue_many([(URL, 0, None), (URL, 1, None)]) == 2
+    assert jobs.enqueue(URL) is False
+    assert jobs.enqueue(URL, requeue=True) is False
+
+    for job in jobs.lease('w1', count=2):
+        jobs.ack(job['job_id'], 'w1')
+    # 各選項的工作都結束後，requeue 才能改成整個商品的工作
+    assert jobs.enqueue(URL) is False
+    assert jobs.enqueue(URL, requeue=True) is True
+    assert jobs.enqueue(URL, 2) is False
+    assert jobs.stats()['pending'] == 1
+    jobs.close()
+
+
+def test_http_queue_requires_token():
+    pytest.importorskip('requests')
+    from job_queue import HttpJobQueue, serve_queue
+
+    with pytest.raises(ValueError):
+        serve_queue(MemoryJobQueue(), port=0, host='0.0.0.0')
+
+    server = serve_queue(MemoryJobQueue(), port=0, token='secret')
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        jobs = HttpJobQueue(base_url, token='secret')
+        assert jobs.enqueue(URL, 1, 'next 30 days')
+        leased = jobs.lease('w1')
+        assert [(job['url'], job['option_index']) for job in leased] == [(URL, 1)]
+        assert jobs.outstanding('137240') == 1
+        assert jobs.ack(leased[0]['job_id'], 'w1')
+        jobs.close()
+
+        intruder = HttpJobQueue(base_url, token='wrong')
+        with pytest.raises(RuntimeError):
+            intruder.stats()
+        intruder.close()
+    finally:
+        server.shutdown()
+        server.server_close()
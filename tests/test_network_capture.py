@@ -0,0 +1,82 @@
+import base64
+import json
+
+from network_capture import CalendarNetworkCapture, PerformanceLogReader
+
+CALENDAR_URL = "https://www.kkday.com/api/product/calendar?month=2026-11"
+
+
+class FakeDriver:
+    """只實作 get_log / execute_cdp_cmd，模擬 Chrome 的 performance log"""
+
+    def __init__(self):
+        self.events = []
+        self.bodies = {}
+
+    def emit(self, method, **params):
+        self.events.append({'message': json.dumps({'message': {'method': method, 'params': params}})})
+
+    def respond(self, request_id, url, payload, mime_type='application/json', encode=False):
+        self.emit('Network.responseReceived', requestId=request_id,
+                  response={'url': url, 'mimeType': mime_type})
+        self.emit('Network.loadingFinished', requestId=request_id)
+        text = json.dumps(payload)
+        if encode:
+            self.bodies[request_id] = {'body': base64.b64encode(text.encode('utf-8')).decode('ascii'),
+                                       'base64Encoded': True}
+        else:
+            self.bodies[request_id] = {'body': text, 'base64Encoded': False}
+
+    def get_log(self, kind):
+        assert kind == 'performance'
+        events, self.events = self.events, []
+        return events
+
+    def execute_cdp_cmd(self, command, params):
+        assert command == 'Network.getResponseBody'
+        return self.bodies[params['requestId']]
+
+
+def make_capture():
+    driver = FakeDriver()
+    return driver, CalendarNetworkCapture(driver, PerformanceLogReader(driver))
+
+
+def test_collects_matching_json_responses():
+    driver, capture = make_capture()
+    driver.respond('1', CALENDAR_URL, {'items': [{'date': '2026-11-01', 'price': 1200}]})
+    driver.respond('2', CALENDAR_URL, {'items': [{'date': '2026-11-02', 'price': 1300}]}, encode=True)
+
+    records = capture.collect()
+    assert sorted((entry[0].isoformat(), entry[1]) for entry in records) == [('2026-11-01', 1200),
+                                                                             ('2026-11-02', 1300)]
+    assert [url for url, _ in capture.payloads] == [CALENDAR_URL, CALENDAR_URL]
+    # 讀過的回應不會再被收集一次
+    assert capture.collect() == []
+
+
+def test_ignores_other_responses():
+    driver, capture = make_capture()
+    payload = {'items': [{'date': '2026-11-01', 'price': 1200}]}
+    driver.respond('1', "https://www.kkday.com/api/member/profile", payload)
+    driver.respond('2', CALENDAR_URL, payload, mime_type='text/html')
+    driver.emit('Network.responseReceived', requestId='3',
+                response={'url': CALENDAR_URL, 'mimeType': 'application/json'})
+    driver.emit('Network.loadingFailed', requestId='3')
+    driver.emit('Network.loadingFinished', requestId='3')
+    assert capture.collect() == []
+
+
+def test_skips_unreadable_bodies():
+    driver, capture = make_capture()
+    driver.respond('1', CALENDAR_URL, {'items': [{'date': '2026-11-01', 'price': 1200}]})
+    driver.bodies['1'] = {'body': 'not json', 'base64Encoded': False}
+    driver.respond('2', CALENDAR_URL, {'items': [{'date': '2026-11-02', 'price': 1300}]})
+    assert [entry[0].isoformat() for entry in capture.collect()] == ['2026-11-02']
+
+
+def test_clear_discards_pending_responses():
+    driver, capture = make_capture()
+    driver.respond('1', CALENDAR_URL, {'items': [{'date': '2026-11-01', 'price': 1200}]})
+    capture.clear()
+    assert capture.wait_for_records(timeout=0) == []
@@ -0,0 +1,96 @@
+import re
+import zipfile
+from datetime import date
+
+import pytest
+
+from output_sinks import OutputStream, export_excel, option_part, read_rows
+
+ROWS = [
+    {'title': 'A', 'date': date(2026, 11, 1), 'price': 1200, 'currency': 'TWD'},
+    {'title': 'A', 'date': date(2026, 11, 2), 'price': None, 'currency': ''},
+]
+# 從 JSONL 讀回時日期是 ISO 字串
+STORED = [dict(row, date=row['date'].isoformat()) for row in ROWS]
+
+
+def test_stream_writes_partitions_and_reads_back(tmp_path):
+    stream = OutputStream(str(tmp_path), 'run-1', ('jsonl', 'csv'))
+    stream.open_product('137240')
+    stream.write('137240', ROWS[:1])
+    stream.write('137240', ROWS[1:])
+    assert stream.close_product('137240') == 2
+
+    assert stream.partition_path('137240', 'csv') == str(tmp_path / 'run=run-1' / 'product=137240' / 'part.csv')
+    assert list(stream.read_rows('137240')) == STORED
+    assert [row['price'] for row in read_rows(stream.partition_path('137240', 'csv'))] == ['1200', '']
+
+    # 重新爬取同一商品時覆寫分區
+    stream.open_product('137240')
+    stream.write('137240', ROWS[:1])
+    stream.close()
+    assert list(stream.read_rows('137240')) == STORED[:1]
+
+
+def test_option_jobs_write_their_own_partitions(tmp_path):
+    stream = OutputStream(str(tmp_path), 'run-1')
+    assert option_part(None) is None
+    first, second = option_part({1}), option_part([3, 2])
+    assert (first, second) == ('option=1', 'option=2_3')
+
+    # 同一商品的兩個選項工作同時寫出，互不覆寫也不關閉對方的分區
+    stream.open_product('137240', first)
+    stream.open_product('137240', second)
+    stream.write('137240', ROWS[:1], first)
+    stream.write('137240', ROWS[1:], second)
+    assert stream.close_product('137240', first) == 1
+    stream.write('137240', ROWS[1:], second)
+    assert stream.close_product('137240', second) == 2
+
+    assert stream.option_parts('137240') == [first, second]
+    assert list(stream.read_rows('137240', first)) == STORED[:1]
+    # 讀回整個商品時合併所有選項的子分區
+    assert list(stream.read_rows('137240')) == STORED[:1] + STORED[1:] * 2
+
+    # 整個商品重新爬取時移除選項子分區
+    stream.open_product('137240')
+    stream.write('137240', ROWS)
+    stream.close()
+    assert stream.option_parts('137240') == []
+    assert list(stream.read_rows('137240')) == STORED
+
+
+def test_stream_rejects_unknown_formats_and_closed_products(tmp_path):
+    with pytest.raises(ValueError):
+        OutputStream(str(tmp_path), formats=('xml',))
+    stream = OutputStream(str(tmp_path), 'run-1')
+    with pytest.raises(RuntimeError):
+        stream.write('137240', ROWS)
+
+
+def test_parquet_sink_buffers_row_groups(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    stream = OutputStream(str(tmp_path), 'run-1', ('parquet',))
+    stream.open_product('137240')
+    for _ in range(3):
+        stream.write('137240', ROWS)
+    stream.close()
+    table = pq.read_table(stream.partition_path('137240', 'parquet'))
+    assert table.num_rows == 6
+    assert table.column_names == ['title', 'date', 'price', 'currency']
+
+
+def test_export_excel_writes_numeric_prices(tmp_path):
+    pytest.importorskip('xlsxwriter')
+    stream = OutputStream(str(tmp_path), 'run-1', ('csv',))
+    stream.open_product('137240')
+    stream.write('137240', ROWS)
+    stream.close()
+    filename = str(tmp_path / 'kkday_137240.xlsx')
+    # 從 CSV 讀回的價格是字串
+    assert export_excel(stream.read_rows('137240'), filename) == 2
+    with zipfile.ZipFile(filename) as book:
+        sheet = book.read('xl/worksheets/sheet1.xml').decode('utf-8')
+    # 價格以數字儲存（才能套用千分位格式與排序），沒有價格的儲存格留白
+    assert re.search(r'<c r="C2"[^>]*><v>1200</v></c>', sheet)
+    assert not re.search(r'<c r="C3"[^>]*><v>', sheet)
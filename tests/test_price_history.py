@@ -0,0 +1,40 @@
+from datetime import date, datetime, timedelta
+
+from price_history import PriceHistory, RecrawlScheduler
+
+
+def rows(price):
+    return [{'title': 'A', 'date': date(2026, 11, 1), 'price': price},
+            {'title': 'A', 'date': date(2026, 12, 1), 'price': 500}]
+
+
+def test_unchanged_prices_are_deduplicated(tmp_path):
+    history = PriceHistory(str(tmp_path / 'history.db'))
+    first = history.record('1', rows(1000), datetime(2026, 10, 1))
+    assert [delta['change'] for delta in first] == ['new', 'new']
+
+    # 價格沒變：不回傳 delta，也不新增觀測，只延長 last_seen
+    assert history.record('1', rows(1000), datetime(2026, 10, 2)) == []
+    observations = history.conn.execute(
+        "SELECT travel_date, first_seen, last_seen FROM observations ORDER BY travel_date").fetchall()
+    assert observations == [('2026-11-01', '2026-10-01T00:00:00', '2026-10-02T00:00:00'),
+                            ('2026-12-01', '2026-10-01T00:00:00', '2026-10-02T00:00:00')]
+
+    changed = history.record('1', rows(1200), datetime(2026, 10, 3))
+    assert [(d['date'], d['old_price'], d['new_price'], d['change']) for d in changed] == [
+        ('2026-11-01', 1000, 1200, 'changed')]
+    assert history.conn.execute("SELECT COUNT(*) FROM observations").fetchone()[0] == 3
+    history.close()
+
+
+def test_scheduler_due_months(tmp_path):
+    history = PriceHistory(str(tmp_path / 'history.db'))
+    scheduler = RecrawlScheduler(history)
+    start = datetime(2026, 10, 1)
+    for day, price in enumerate((1000, 1000, 1200, 1000)):
+        history.record('1', rows(price), start + timedelta(days=day))
+
+    now = start + timedelta(days=4)
+    # 11 月價格常變，使用最短間隔；12 月價格穩定，尚未到期；沒有紀錄的月份一定要爬
+    assert scheduler.due_months('1', ['2026-11', '2026-12', '2027-01'], now) == ['2026-11', '2027-01']
+    history.close()
@@ -0,0 +1,108 @@
+import threading
+import time
+
+from resilience import AdaptiveTimeouts, CircuitBreaker, RetryQueue
+
+URL = "https://www.kkday.com/zh-tw/product/137240"
+OTHER = "https://www.kkday.com/zh-tw/product/139665"
+HOST = "www.kkday.com"
+
+
+def test_adaptive_timeouts_follow_observed_latency():
+    timeouts = AdaptiveTimeouts(min_samples=5, factor=2.0, minimum=1.0)
+    for _ in range(4):
+        timeouts.observe(HOST, 'calendar_table', 0.8)
+    # 樣本不足時使用預設值
+    assert timeouts.timeout(HOST, 'calendar_table') == 10
+    timeouts.observe(HOST, 'calendar_table', 0.8)
+    assert timeouts.timeout(HOST, 'calendar_table') == 1.6
+    assert timeouts.timeout("other.example", 'calendar_table') == 10
+
+    # 不低於 minimum，也不超過預設值
+    for _ in range(5):
+        timeouts.observe(HOST, 'modal', 0.1)
+        timeouts.observe(HOST, 'page_load', 60)
+    assert timeouts.timeout(HOST, 'modal') == 1.0
+    assert timeouts.timeout(HOST, 'page_load') == 30
+    assert timeouts.summary()[f"{HOST}:calendar_table"] == 1.6
+
+
+def test_retry_queue_backs_off_and_exhausts():
+    retries = RetryQueue(max_attempts=2, base_delay=60)
+    assert retries.add(URL, 0, 2, "逾時")
+    assert len(retries) == 1
+    # 還沒到期
+    assert retries.pop(wait=False) is None
+    assert not retries.add(URL, 0, 3, "逾時")
+    assert [(unit['option_index'], unit['month_index'], unit['attempts']) for unit in retries.exhausted_for(URL)] == [
+        (0, 3, 2)]
+
+
+def test_retry_queue_pops_due_units_per_url():
+    retries = RetryQueue(base_delay=0)
+    retries.add(URL, 0, 1)
+    retries.add(OTHER, 1, 0)
+    unit = retries.pop(OTHER, wait=False)
+    assert (unit['url'], unit['option_index'], unit['attempts']) == (OTHER, 1, 1)
+    assert retries.pop(OTHER, wait=False) is None
+
+    retries.drop(URL)
+    assert len(retries) == 0
+    assert [unit['month_index'] for unit in retries.exhausted_for(URL)] == [1]
+
+
+def test_retry_queue_scopes_attempts_to_run_and_option():
+    retries = RetryQueue(max_attempts=2, base_delay=60)
+    retries.add(URL, 0, 1)
+    assert not retries.add(URL, 0, 1)
+    assert retries.add(URL, 1, 0)
+    retries.add(OTHER, 0, 0)
+    assert [unit['option_index'] for unit in retries.exhausted_for(URL, {0})] == [0]
+    assert retries.exhausted_for(URL, {1}) == []
+
+    # 重新派送的工作從零開始計算，只清除它負責的選項
+    retries.begin(URL, {0})
+    assert retries.exhausted_for(URL) == []
+    assert retries.add(URL, 0, 2)
+    assert len(retries) == 3
+
+    # 選項完成時清除它的待重試與放棄的單位，其他選項不受影響
+    retries.drop(URL)
+    assert {unit['option_index'] for unit in retries.exhausted_for(URL)} == {0, 1}
+    retries.succeeded(URL, 0)
+    assert [unit['option_index'] for unit in retries.exhausted_for(URL)] == [1]
+    assert [unit['url'] for unit in retries.exhausted] == [URL]
+    assert retries.pop(OTHER, wait=False) is None
+    assert len(retries) == 1
+
+
+def test_circuit_breaker_opens_and_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.05)
+    assert not breaker.record_failure(HOST)
+    assert breaker.record_failure(HOST)
+    assert breaker.is_open(HOST)
+    assert not breaker.allow(HOST)
+    assert breaker.retry_after(HOST) > 0
+
+    time.sleep(0.06)
+    assert not breaker.is_open(HOST)
+    assert breaker.allow(HOST)
+    # 同一個試探者可以重複通過，其他執行緒在試探結果出來前仍被擋下
+    assert breaker.allow(HOST)
+    others = []
+    thread = threading.Thread(target=lambda: others.append(breaker.allow(HOST)))
+    thread.start()
+    thread.join()
+    assert others == [False]
+
+    # 試探失敗一次就重新開啟
+    assert breaker.record_failure(HOST)
+    assert not breaker.allow(HOST)
+
+    time.sleep(0.06)
+    assert breaker.allow(HOST)
+    breaker.record_success(HOST)
+    thread = threading.Thread(target=lambda: others.append(breaker.allow(HOST)))
+    thread.start()
+    thread.join()
+    assert others == [False, True]
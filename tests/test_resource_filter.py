@@ -0,0 +1,66 @@
+import re
+
+import pytest
+
+from resource_filter import ResourceFilter, ResourceStats
+
+
+def blocked(patterns, url):
+    """與 Network.setBlockedURLs 相同，只有 * 是萬用字元"""
+    return any(re.fullmatch('.*'.join(map(re.escape, p.split('*'))), url) for p in patterns)
+
+
+def test_patterns_block_versioned_assets():
+    patterns = ResourceFilter().patterns()
+    assert blocked(patterns, "https://cdn.kkday.com/images/banner.png")
+    assert blocked(patterns, "https://cdn.kkday.com/images/banner.png?v=3")
+    assert blocked(patterns, "https://cdn.kkday.com/fonts/icons.woff2?t=1700000000")
+    assert blocked(patterns, "https://www.googletagmanager.com/gtm.js?id=GTM-1")
+    assert not blocked(patterns, "https://www.kkday.com/api/product/calendar?month=2026-11")
+    assert not blocked(patterns, "https://cdn.kkday.com/js/app.js?v=3")
+
+
+def test_allowed_patterns_and_duplicates():
+    resource_filter = ResourceFilter(blocked_types=('Font',), block_trackers=False,
+                                     blocked_patterns=('*.woff', '*.css'), allowed_patterns=('*.ttf',))
+    patterns = resource_filter.patterns()
+    assert patterns.count('*.woff') == 1
+    assert '*.ttf' not in patterns and '*.ttf?*' in patterns
+    assert patterns[-1] == '*.css'
+
+
+def test_rejects_unknown_settings():
+    with pytest.raises(ValueError):
+        ResourceFilter(blocked_types=('Script',))
+    with pytest.raises(ValueError):
+        ResourceFilter(page_load_strategy='lazy')
+
+
+def test_apply_sends_blocked_urls():
+    class Driver:
+        def __init__(self):
+            self.commands = []
+
+        def execute_cdp_cmd(self, command, params):
+            self.commands.append((command, params))
+
+    driver = Driver()
+    resource_filter = ResourceFilter()
+    resource_filter.apply(driver)
+    assert driver.commands == [('Network.enable', {}),
+                               ('Network.setBlockedURLs', {'urls': resource_filter.patterns()})]
+
+
+def test_stats_estimate_blocked_bytes():
+    stats = ResourceStats()
+    stats.on_event('Network.requestWillBeSent', {'requestId': '1', 'type': 'Image'})
+    stats.on_event('Network.loadingFinished', {'requestId': '1', 'encodedDataLength': 1000})
+    stats.on_event('Network.loadingFailed', {'requestId': '2', 'type': 'Image', 'blockedReason': 'inspector'})
+    stats.on_event('Network.loadingFailed', {'requestId': '3', 'type': 'Font', 'blockedReason': 'inspector'})
+    stats.on_event('Network.loadingFailed', {'requestId': '4', 'type': 'XHR'})
+
+    summary = stats.summary()
+    assert summary['requests_loaded'] == 1 and summary['bytes_loaded'] == 1000
+    assert summary['blocked_by_type'] == {'Image': 1, 'Font': 1}
+    # 圖片以已下載的平均大小估算，字型沒有樣本時使用預設值
+    assert summary['bytes_saved_estimate'] == 1000 + 40 * 1024
@@ -0,0 +1,70 @@
+import json
+from datetime import date
+
+import pytest
+
+from output_sinks import OutputStream
+from replay import replay
+from snapshot_store import SnapshotStore, read_object
+
+
+def calendar_html(*cells):
+    tds = ''.join(f'<td class="cell-date selectable"><div class="date-num">{day}</div>'
+                  f'<div class="price">{price}</div></td>' for day, price in cells)
+    return f'<table class="date-table"><tr>{tds}</tr></table>'
+
+
+def calendar_json(*items):
+    payload = {'data': {'items': [{'date': day, 'price': price, 'currency': 'TWD'} for day, price in items]}}
+    return json.dumps([["https://www.kkday.com/api/calendar", payload]])
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SnapshotStore(str(tmp_path / 'snapshots'), run_id='run-1')
+    yield store
+    store.close()
+
+
+def test_identical_snapshots_are_stored_once(store):
+    html = calendar_html((1, 'TWD 1,200'))
+    first = store.save('137240', 0, 0, 'html', html, 'A', '2026年11月')
+    second = store.save('139665', 0, 0, 'html', html, 'B', '2026年11月')
+    assert first == second
+    assert read_object(store.root, first) == html
+    assert store.stats() == {'entries': 2, 'unique_objects': 1}
+    assert [entry['product_id'] for entry in store.entries()] == ['137240', '139665']
+    assert store.entries(product_id='139665')[0]['option_title'] == 'B'
+    assert store.run_ids() == ['run-1']
+    with pytest.raises(ValueError):
+        store.save('137240', 0, 0, 'png', html)
+
+
+def test_replay_prefers_json_and_deduplicates_dates(store, tmp_path):
+    store.save('137240', 0, 0, 'html', calendar_html((1, 'TWD 999'), (2, 'TWD 999')), 'A', '2026年11月')
+    store.save('137240', 0, 0, 'json', calendar_json(('2026-11-01', 1200), ('2026-11-02', 1300)), 'A')
+    # 下個月的 JSON 又包含了 11/2，依日期去重
+    store.save('137240', 0, 1, 'json', calendar_json(('2026-11-02', 1300), ('2026-12-01', 1400)), 'A')
+    store.save('137240', 1, 0, 'html', calendar_html((1, 'TWD 2,200'), (3, '無價格')), 'B', '2026年11月')
+
+    output = OutputStream(str(tmp_path / 'output'), 'replay-run-1')
+    products = replay(store, 'run-1', workers=1, output=output)
+    assert [(row['title'], row['date'], row['price']) for row in products['137240']] == [
+        ('A', date(2026, 11, 1), 1200),
+        ('A', date(2026, 11, 2), 1300),
+        ('A', date(2026, 12, 1), 1400),
+        ('B', date(2026, 11, 1), 2200),
+        ('B', date(2026, 11, 3), None),
+    ]
+    assert len(list(output.read_rows('137240'))) == 5
+
+
+def test_replay_applies_window_from_capture_date(store):
+    store.save('137240', 0, 0, 'json', calendar_json(('2026-11-01', 1200), ('2026-11-20', 1300)), 'A')
+    store.save('139665', 0, 0, 'json', calendar_json(('2026-11-01', 900), ('2026-12-01', 950)), 'B')
+    store.conn.execute("UPDATE snapshots SET captured_at = '2026-10-25T10:00:00'")
+
+    # "next 10 days" 從擷取當天（10/25）起算，而不是重新解析的日期
+    products = replay(store, 'run-1', workers=1, window='next 10 days', horizons={139665: '2026-12..2026-12'})
+    assert [row['date'] for row in products['137240']] == [date(2026, 11, 1)]
+    assert [row['date'] for row in products['139665']] == [date(2026, 12, 1)]
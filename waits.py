@@ -0,0 +1,87 @@
+"""條件式等待與動作節奏控制
+
+以頁面實際狀態（月份文字改變、舊表格失效、彈窗移除）取代固定 sleep；
+節奏則由 Pacer 保證相鄰動作之間的最小間隔，只補足不足的時間。
+"""
+import random
+import threading
+import time
+
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+# 一次取得月份文字與目前的日曆表格元素，作為翻頁後比對的基準
+CALENDAR_STATE_JS = """
+var month = document.querySelector('div.current-month');
+return [month ? month.textContent.trim() : '', document.querySelector('table.date-table')];
+"""
+
+
+class Pacer:
+    """相鄰動作之間至少間隔 min_interval 秒（加上 0~jitter 秒的隨機量）
+
+    若兩次動作之間已經因為等待頁面而過了足夠時間，就不再額外 sleep。
+    """
+
+    def __init__(self, min_interval=1.0, jitter=0.5):
+        self.min_interval = min_interval
+        self.jitter = jitter
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            interval = self.min_interval + random.uniform(0, self.jitter) if self.jitter else self.min_interval
+            remaining = self._last + interval - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+            self._last = time.monotonic()
+
+
+def calendar_state(driver):
+    """回傳 (月份文字, 日曆表格元素或 None)"""
+    month, table = driver.execute_script(CALENDAR_STATE_JS)
+    return month, table
+
+
+def wait_for_month_change(driver, old_month, old_table, timeout=10, poll_frequency=0.1):
+    """等到月份文字改變或舊表格從 DOM 移除，且新的表格已出現"""
+
+    def changed(d):
+        if old_table is not None:
+            try:
+                old_table.is_enabled()
+            except StaleElementReferenceException:
+                return True
+        month, table = calendar_state(d)
+        return table is not None and month != old_month
+
+    WebDriverWait(driver, timeout, poll_frequency=poll_frequency).until(changed)
+    WebDriverWait(driver, timeout, poll_frequency=poll_frequency).until(
+        EC.presence_of_element_located((By.CSS_SELECTOR, "table.date-table"))
+    )
+
+
+def wait_for_detached_or_hidden(driver, element, timeout=5, poll_frequency=0.1):
+    """等到元素從 DOM 移除或不可見，逾時回傳 False"""
+
+    def gone(_):
+        try:
+            return not element.is_displayed()
+        except StaleElementReferenceException:
+            return True
+
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=poll_frequency).until(gone)
+        return True
+    except TimeoutException:
+        return False
+
+
+def wait_for_document_ready(driver, timeout=30, poll_frequency=0.2):
+    """等到 document.readyState 為 complete"""
+    WebDriverWait(driver, timeout, poll_frequency=poll_frequency).until(
+        lambda d: d.execute_script("return document.readyState") == "complete"
+    )